@@ -0,0 +1,427 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+# pylint: disable=C0115
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import Manager
+from typing import Callable
+
+from control import ConversionControl, relay_events
+from core import convert_file, convert_outputs
+from engines import ConversionCancelled
+from jobs import (
+    CANCELLED,
+    DONE,
+    FAILED,
+    FINISHED,
+    PENDING,
+    RUNNING,
+    ConversionJob,
+    OutputTarget,
+    collect_inputs,
+    extra_targets,
+    output_path_for,
+)
+from metrics import JobMetrics, stage
+from scheduler import (
+    PRIORITY_BATCH,
+    JobScheduler,
+    estimate_cost,
+    niceness_for_weight,
+)
+from sizing import plan_profile
+
+
+def default_workers() -> int:
+    """
+    Returns the default size of the worker pool.
+
+    ffmpeg already spreads each encode over several threads, so running one
+    process per core would oversubscribe the machine. Half of the cores (at
+    least one) keeps them busy without fighting over them.
+
+    Returns:
+        int: The number of worker processes.
+    """
+    return max(1, (os.cpu_count() or 1) // 2)
+
+
+def threads_per_job(workers: int) -> int:
+    """
+    Splits the machine's cores between the workers.
+
+    Args:
+        workers (int): The number of worker processes.
+
+    Returns:
+        int: The encoder thread count for each job.
+    """
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def run_job(
+    selected_format,
+    input_path,
+    output_path,
+    profile,
+    engine,
+    threads,
+    cache,
+    resume,
+    metrics_file,
+    profile_dir,
+    filters,
+    cancel_event,
+    pause_event,
+    progress_queue=None,
+    job_id=0,
+    niceness=0,
+    targets=(),
+    target=None,
+):
+    # Executado nos processos do pool: os eventos do Manager chegam aqui como
+    # proxies e são repassados para o controle local da conversão
+    control = ConversionControl(niceness=niceness)
+    stop_relay = relay_events(control, cancel_event, pause_event)
+    metrics = JobMetrics()
+
+    def report(progress):
+        progress_queue.put((job_id, progress))
+
+    try:
+        with metrics.measure(profile_dir):
+            if targets:
+                # Saídas extras: uma única decodificação para todas
+                if target is not None and target.active:
+                    with stage(metrics, "sizing"):
+                        profile = plan_profile(
+                            input_path, selected_format, profile, target, filters
+                        )
+                main = OutputTarget(selected_format, output_path, profile, filters)
+                return convert_outputs(
+                    input_path,
+                    [main, *targets],
+                    engine,
+                    threads,
+                    on_progress=report if progress_queue is not None else None,
+                    control=control,
+                    cache=cache,
+                    metrics=metrics,
+                    target=target,
+                )[0]
+            return convert_file(
+                selected_format,
+                input_path,
+                output_path,
+                engine,
+                threads,
+                on_progress=report if progress_queue is not None else None,
+                control=control,
+                profile=profile,
+                cache=cache,
+                # O pool já ocupa os núcleos, então cada job codifica um segmento por vez
+                segments=1 if resume else None,
+                resume=resume,
+                metrics=metrics,
+                filters=filters,
+                target=target,
+            )
+    finally:
+        stop_relay.set()
+        metrics.emit(metrics_file)
+
+
+class BatchQueue:
+    """
+    Queue of conversion jobs scheduled over a pool of worker processes.
+
+    Jobs may be submitted while the queue is running. At most `workers` jobs
+    are handed to the pool at a time, so the ones still waiting stay
+    `PENDING` until a worker is free; a `scheduler.JobScheduler` chooses which
+    one runs next. Jobs can be cancelled, and the whole queue paused
+    (suspending the running encoders) and resumed.
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        engine: str | None = None,
+        on_update: Callable[[ConversionJob], None] | None = None,
+        use_cache: bool = False,
+        resume: bool = False,
+        metrics_file=None,
+        profile_dir=None,
+        policy: str = "sjf",
+        max_high_res: int = 1,
+    ) -> None:
+        """
+        Initializes the queue.
+
+        Args:
+            workers (int | None): Size of the worker pool. Defaults to
+            `default_workers()`.
+            engine (str | None): The conversion engine name (see engines.ENGINES).
+            on_update (Callable | None): Called with the job every time its status
+            changes. Runs on the thread that called `run`.
+            use_cache (bool): Whether to reuse and fill the user's output cache
+            (see output_cache.py).
+            resume (bool): Whether to checkpoint the jobs, so a batch run again
+            after a crash resumes them from their last finished segments (see
+            journal.py).
+            metrics_file (str | Path | None): JSON lines file that receives the
+            per-stage metrics of each job (see metrics.py). They are always
+            logged on the "video_manager.metrics" logger.
+            profile_dir (str | Path | None): Directory for a cProfile dump of
+            each job.
+            policy (str): Scheduling policy (see scheduler.POLICIES).
+            max_high_res (int): High resolution jobs that may run at a time.
+        """
+        self.workers = workers or default_workers()
+        self.scheduler = JobScheduler(self.workers, policy, max_high_res)
+        self.engine = engine
+        self.on_update = on_update
+        self.use_cache = use_cache
+        self.resumable = resume
+        self.metrics_file = metrics_file
+        self.profile_dir = profile_dir
+        self.jobs: list[ConversionJob] = []
+        self._pending: list[ConversionJob] = []
+        self._lock = threading.Lock()
+        self._resumed = threading.Event()
+        self._resumed.set()
+        self._pause_event = None
+
+    def submit(
+        self,
+        input_path,
+        output_path,
+        selected_format,
+        profile=None,
+        filters=None,
+        priority=PRIORITY_BATCH,
+        weight=1.0,
+        targets=(),
+        target=None,
+    ) -> ConversionJob:
+        """
+        Adds a job to the queue.
+
+        Args:
+            input_path (str): The path to the input video file.
+            output_path (str): The path where the converted video will be saved.
+            selected_format (str): The desired format for the output video.
+            profile (str | None): The encoder profile name (see profiles.py).
+            filters (FilterChain | None): Video filters (see filters.py).
+            priority (int): Jobs with a higher priority run first.
+            weight (float): Relative CPU weight of the encoder (1.0 is normal).
+            targets (Iterable[OutputTarget]): Extra outputs, encoded from the
+            same decode (see `core.convert_outputs`).
+            target (SizeTarget | None): Maximum size and/or quality of the
+            output (see sizing.py).
+
+        Returns:
+            ConversionJob: The queued job.
+        """
+        job = ConversionJob(
+            input_path,
+            output_path,
+            selected_format,
+            profile,
+            filters,
+            priority=priority,
+            weight=weight,
+            targets=list(targets),
+            target=target,
+        )
+        estimate_cost(job)
+        with self._lock:
+            self.jobs.append(job)
+            self._pending.append(job)
+        return job
+
+    def submit_many(
+        self,
+        paths,
+        output_dir,
+        selected_format,
+        profile=None,
+        filters=None,
+        also=(),
+        target=None,
+    ) -> list[ConversionJob]:
+        """
+        Adds a job for each video found in `paths` (see `collect_inputs`).
+
+        Args:
+            paths (Iterable[str]): Files and/or directories.
+            output_dir (str): The directory of the converted videos.
+            selected_format (str): The desired format for the output videos.
+            profile (str | None): The encoder profile name (see profiles.py).
+            filters (FilterChain | None): Video filters applied to every job.
+            also (Iterable[tuple]): Extra outputs of every job, encoded from the
+            same decode (see `jobs.extra_targets`).
+            target (SizeTarget | None): Maximum size and/or quality of every
+            main output, planned for each input.
+
+        Returns:
+            list[ConversionJob]: The queued jobs.
+        """
+        with self._lock:
+            taken = {path for job in self.jobs for path in job.output_paths}
+        jobs = []
+        for input_path in collect_inputs(paths):
+            output_path = output_path_for(input_path, output_dir, selected_format, taken)
+            targets = extra_targets(output_path, also, filters)
+            taken.update([output_path] + [target.output_path for target in targets])
+            jobs.append(
+                self.submit(
+                    input_path,
+                    output_path,
+                    selected_format,
+                    profile,
+                    filters,
+                    targets=targets,
+                    target=target,
+                )
+            )
+        return jobs
+
+    def clear_finished(self):
+        """
+        Forgets the jobs that are already done or failed.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self.jobs = [job for job in self.jobs if job.status not in FINISHED]
+
+    def cancel(self, job: ConversionJob):
+        """
+        Cancels a job. A pending job is dropped from the queue; a running one has
+        its encoder killed, freeing the worker for the next job.
+
+        Args:
+            job (ConversionJob): The job to cancel.
+        """
+        with self._lock:
+            if job.status == PENDING and job in self._pending:
+                self._pending.remove(job)
+            elif job.status == RUNNING and job.cancel_event is not None:
+                job.cancel_event.set()
+                return
+            else:
+                return
+        self._update(job, CANCELLED)
+
+    def cancel_all(self):
+        for job in list(self.jobs):
+            self.cancel(job)
+
+    def pause(self):
+        """
+        Suspends the running encoders and stops handing new jobs to the pool.
+        """
+        with self._lock:
+            self._resumed.clear()
+            if self._pause_event is not None:
+                self._pause_event.set()
+
+    def resume(self):
+        with self._lock:
+            self._resumed.set()
+            if self._pause_event is not None:
+                self._pause_event.clear()
+
+    @property
+    def paused(self) -> bool:
+        return not self._resumed.is_set()
+
+    def has_pending(self) -> bool:
+        with self._lock:
+            return bool(self._pending)
+
+    def run(self) -> list[ConversionJob]:
+        """
+        Runs the queued jobs until there is nothing left to do.
+
+        Returns:
+            list[ConversionJob]: All jobs of the queue, with their final status.
+        """
+        threads = threads_per_job(self.workers)
+        running = {}
+        with Manager() as manager, ProcessPoolExecutor(max_workers=self.workers) as pool:
+            with self._lock:
+                self._pause_event = manager.Event()
+                if self.paused:
+                    self._pause_event.set()
+            try:
+                while True:
+                    while not self.paused:
+                        with self._lock:
+                            job = self.scheduler.pick(self._pending, running.values())
+                            if job is None:
+                                break
+                            self._pending.remove(job)
+                            self.scheduler.started(job)
+                            job.cancel_event = manager.Event()
+                            job.status = RUNNING
+                        future = pool.submit(
+                            run_job,
+                            job.selected_format,
+                            job.input_path,
+                            job.output_path,
+                            job.profile,
+                            self.engine,
+                            threads,
+                            self.use_cache,
+                            self.resumable,
+                            self.metrics_file,
+                            self.profile_dir,
+                            job.filters,
+                            job.cancel_event,
+                            self._pause_event,
+                            None,
+                            0,
+                            niceness_for_weight(job.weight),
+                            job.targets,
+                            job.target,
+                        )
+                        running[future] = job
+                        self._update(job, RUNNING)
+                    if not running and not self.has_pending():
+                        break
+                    if not running:
+                        # Pausada ou sem job que o agendador aceite agora: o wait()
+                        # voltaria na hora com o conjunto vazio e o laço giraria
+                        if self.paused:
+                            self._resumed.wait(0.5)
+                        else:
+                            time.sleep(0.5)
+                        continue
+                    # Acorda periodicamente para despachar jobs enviados durante a
+                    # execução ou liberados por um resume
+                    done, _ = wait(running, timeout=0.5, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._finish(running.pop(future), future.exception())
+            finally:
+                with self._lock:
+                    self._pause_event = None
+        return self.jobs
+
+    def _finish(self, job: ConversionJob, error: BaseException | None):
+        job.cancel_event = None
+        if error is None:
+            self._update(job, DONE)
+        elif isinstance(error, ConversionCancelled):
+            self._update(job, CANCELLED)
+        else:
+            self._update(job, FAILED, str(error))
+
+    def _update(self, job: ConversionJob, status: str, error: str | None = None):
+        job.status = status
+        job.error = error
+        if self.on_update is not None:
+            self.on_update(job)
@@ -0,0 +1,226 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+# pylint: disable=C0115
+import json
+import os
+import platform
+import subprocess
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from engines import ConversionError, get_engine
+from metrics import ResourceSampler
+from probe import ffmpeg_binary
+from progress import ProgressTracker
+from utils import CODECS, CONFIG_DIR, get_encoders
+
+BENCHMARK_DIR = CONFIG_DIR / "benchmarks"
+BASELINE_FILE = BENCHMARK_DIR / "baseline.json"
+DEFAULT_SIZES = ((640, 360), (1280, 720))
+DEFAULT_DURATIONS = (5.0,)
+CLIP_FPS = 25
+
+
+@dataclass
+class BenchmarkResult:
+    format: str
+    codec: str
+    engine: str
+    width: int
+    height: int
+    duration: float
+    frames: int
+    wall_time: float = 0.0
+    fps: float = 0.0
+    peak_rss: int = 0
+    cpu_percent: float = 0.0
+    output_bytes: int = 0
+    error: str | None = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.format}/{self.engine}/{self.width}x{self.height}/{self.duration:g}s"
+
+
+def make_clip(directory, width: int, height: int, duration: float) -> Path:
+    """
+    Generates a synthetic test clip (moving test pattern plus a tone), reused
+    while it exists. The content is deterministic, so every run encodes the
+    same frames.
+
+    Args:
+        directory (str | Path): Where the clips are kept.
+        width (int): Frame width.
+        height (int): Frame height.
+        duration (float): Duration in seconds.
+
+    Raises:
+        ConversionError: If ffmpeg fails to generate the clip.
+
+    Returns:
+        Path: The clip, an H.264/AAC Matroska file.
+    """
+    clip = Path(directory) / f"clip_{width}x{height}_{duration:g}s.mkv"
+    if clip.is_file():
+        return clip
+    clip.parent.mkdir(parents=True, exist_ok=True)
+    size = f"size={width}x{height}:rate={CLIP_FPS}:duration={duration}"
+    command = [ffmpeg_binary(), "-y", "-v", "error"]
+    command += ["-f", "lavfi", "-i", f"testsrc2={size}"]
+    command += ["-f", "lavfi", "-i", f"sine=frequency=440:duration={duration}"]
+    command += ["-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p"]
+    command += ["-c:a", "aac", str(clip.with_suffix(".tmp.mkv"))]
+    result = subprocess.run(command, capture_output=True, text=True, check=False)
+    if result.returncode != 0:
+        raise ConversionError(result.stderr.strip() or "ffmpeg falhou")
+    clip.with_suffix(".tmp.mkv").replace(clip)
+    return clip
+
+
+def _cpu_seconds() -> float:
+    # Inclui os processos filhos já finalizados, ou seja, o ffmpeg
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def run_case(result: BenchmarkResult, clip, output_dir, profile=None) -> BenchmarkResult:
+    """
+    Converts a clip with one format and engine, filling the measurements of
+    the result. A failed conversion is recorded in `result.error`.
+
+    Args:
+        result (BenchmarkResult): The case, without measurements.
+        clip (str | Path): The input clip.
+        output_dir (str | Path): Where the output is written (and then removed).
+        profile (EncoderProfile | str | None): The encoder profile.
+
+    Returns:
+        BenchmarkResult: The same result, measured.
+    """
+    engine = get_engine(result.engine, profile=profile)
+    output = Path(output_dir) / f"bench.{result.format.lower()}"
+    cpu_before = _cpu_seconds()
+    started = time.perf_counter()
+    with ResourceSampler() as sampler:
+        try:
+            # Chama a engine direto: o remux do core mediria só a cópia dos streams.
+            # O progresso é lido como no aplicativo
+            tracker = ProgressTracker(lambda event: None, result.duration)
+            engine.convert(result.format, str(clip), str(output), tracker)
+        except ConversionError as e:
+            result.error = str(e)
+    result.wall_time = time.perf_counter() - started
+    cpu_time = _cpu_seconds() - cpu_before
+    result.fps = result.frames / result.wall_time if result.wall_time > 0 else 0.0
+    result.peak_rss = sampler.peak_rss
+    result.cpu_percent = 100 * cpu_time / result.wall_time / (os.cpu_count() or 1)
+    if output.is_file():
+        result.output_bytes = output.stat().st_size
+        output.unlink()
+    return result
+
+
+def run_benchmark(
+    formats=None,
+    engines=("ffmpeg",),
+    sizes=DEFAULT_SIZES,
+    durations=DEFAULT_DURATIONS,
+    profile=None,
+    work_dir=BENCHMARK_DIR,
+    on_result=None,
+) -> dict:
+    """
+    Runs every combination of format, engine, clip size and duration.
+
+    Args:
+        formats (Iterable[str] | None): Formats to measure. None means every
+        entry of CODECS.
+        engines (Iterable[str]): Engine names (see engines.ENGINES).
+        sizes (Iterable[tuple[int, int]]): Clip resolutions.
+        durations (Iterable[float]): Clip durations, in seconds.
+        profile (EncoderProfile | str | None): The encoder profile.
+        work_dir (str | Path): Where the clips and the outputs are written.
+        on_result (Callable[[BenchmarkResult], None] | None): Called after each case.
+
+    Returns:
+        dict: The report, with the machine description and the results.
+    """
+    formats = formats or [name for name, codec in CODECS]
+    results = []
+    for width, height in sizes:
+        for duration in durations:
+            clip = make_clip(work_dir, width, height, duration)
+            for engine in engines:
+                for selected_format in formats:
+                    result = BenchmarkResult(
+                        selected_format,
+                        get_encoders(selected_format)[0],
+                        engine,
+                        width,
+                        height,
+                        duration,
+                        round(duration * CLIP_FPS),
+                    )
+                    results.append(run_case(result, clip, work_dir, profile))
+                    if on_result is not None:
+                        on_result(result)
+    return {"machine": machine_info(), "results": [asdict(item) for item in results]}
+
+
+def machine_info() -> dict:
+    version = subprocess.run(
+        [ffmpeg_binary(), "-version"], capture_output=True, text=True, check=False
+    ).stdout.split("\n", 1)[0]
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "ffmpeg": version,
+    }
+
+
+def save_report(report: dict, path):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+def load_report(path) -> dict:
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def compare(report: dict, baseline: dict, tolerance: float = 0.10) -> list[dict]:
+    """
+    Compares the wall time of each case with the same case in a baseline.
+
+    Args:
+        report (dict): The current report (see `run_benchmark`).
+        baseline (dict): A saved report.
+        tolerance (float): Relative slowdown accepted before a case is flagged.
+
+    Returns:
+        list[dict]: One entry per case present in both reports, with the key,
+        both wall times, the ratio (current / baseline) and a `regression` flag.
+    """
+    previous = {
+        BenchmarkResult(**item).key: item
+        for item in baseline.get("results", [])
+        if not item.get("error")
+    }
+    rows = []
+    for item in report["results"]:
+        key = BenchmarkResult(**item).key
+        if item.get("error") or key not in previous or not previous[key]["wall_time"]:
+            continue
+        ratio = item["wall_time"] / previous[key]["wall_time"]
+        rows.append(
+            {
+                "case": key,
+                "baseline": previous[key]["wall_time"],
+                "current": item["wall_time"],
+                "ratio": ratio,
+                "regression": ratio > 1 + tolerance,
+            }
+        )
+    return rows
@@ -0,0 +1,661 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+import argparse
+import glob
+import logging
+import sys
+from pathlib import Path
+
+import benchmark
+import service
+import sizing
+import thumbnails
+import watch
+from batch import DONE, FAILED, BatchQueue, default_workers
+from client import ServiceError, ensure_service
+from core import convert_file, convert_outputs
+from engines import ENGINE_ALIASES, ENGINES, ConversionError
+from filters import WATERMARK_POSITIONS, FilterChain
+from jobs import OutputTarget, extra_targets
+from metrics import JobMetrics
+from profiles import default_profile_name, load_profiles
+from scheduler import POLICIES
+from utils import CODECS, SERVICE_HOST, SERVICE_PORT
+
+
+def expand_inputs(patterns) -> list[str]:
+    """
+    Expands glob patterns in the inputs. Shells like cmd.exe don't do it for us,
+    so patterns that match nothing are kept as they are.
+
+    Args:
+        patterns (list[str]): Input paths and/or glob patterns.
+
+    Returns:
+        list[str]: The expanded paths.
+    """
+    inputs = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else []
+        inputs += matches or [pattern]
+    return inputs
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="video_manager", description="Conversor de vídeos sem interface gráfica."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert = subparsers.add_parser("convert", help="Converte um ou mais vídeos")
+    convert.add_argument(
+        "inputs", nargs="+", help="Vídeos, diretórios ou padrões glob de entrada"
+    )
+    convert.add_argument(
+        "output",
+        help="Arquivo de saída (um único vídeo) ou diretório de saída (vários vídeos)",
+    )
+    convert.add_argument(
+        "--format",
+        "-f",
+        required=True,
+        choices=[name for name, codec in CODECS],
+        help="Formato de saída",
+    )
+    convert.add_argument(
+        "--also",
+        action="append",
+        type=parse_target,
+        default=[],
+        metavar="FORMATO[:PERFIL][@LARGURA]",
+        help="Saída extra codificada na mesma decodificação, ao lado da principal "
+        "(ex.: WEBM, MP4:fastest@640); pode ser repetida",
+    )
+    convert.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=default_workers(),
+        help="Número de conversões simultâneas (padrão: %(default)s)",
+    )
+    convert.add_argument(
+        "--engine", choices=[*ENGINES, *ENGINE_ALIASES], help="Engine de conversão"
+    )
+    convert.add_argument(
+        "--profile",
+        "-p",
+        choices=list(load_profiles()),
+        default=default_profile_name(),
+        help="Perfil do encoder (padrão: %(default)s)",
+    )
+    convert.add_argument(
+        "--cache",
+        action="store_true",
+        help="Reutiliza conversões anteriores do mesmo conteúdo e guarda as novas",
+    )
+    convert.add_argument(
+        "--segments",
+        type=int,
+        metavar="N",
+        help="Divide vídeos longos em N segmentos codificados em paralelo",
+    )
+    convert.add_argument(
+        "--resume",
+        action="store_true",
+        help="Registra os segmentos prontos e retoma conversões interrompidas",
+    )
+    convert.add_argument(
+        "--metrics",
+        metavar="ARQUIVO",
+        help="Acrescenta as métricas por etapa de cada conversão a um arquivo JSON lines",
+    )
+    convert.add_argument(
+        "--cprofile",
+        metavar="DIRETÓRIO",
+        help="Salva um perfil do cProfile de cada conversão neste diretório",
+    )
+    add_scheduler_arguments(convert)
+    filters = convert.add_argument_group("filtros de vídeo")
+    filters.add_argument(
+        "--width", type=int, help="Largura de saída (sem --height mantém a proporção)"
+    )
+    filters.add_argument(
+        "--height", type=int, help="Altura de saída (sem --width mantém a proporção)"
+    )
+    filters.add_argument(
+        "--crop",
+        type=parse_crop,
+        metavar="L:A:X:Y",
+        help="Recorta uma região de largura L e altura A a partir de (X, Y)",
+    )
+    filters.add_argument("--fps", type=float, help="Taxa de quadros de saída")
+    filters.add_argument(
+        "--watermark", metavar="IMAGEM", help="Imagem (PNG com transparência) sobreposta"
+    )
+    filters.add_argument(
+        "--watermark-position",
+        choices=WATERMARK_POSITIONS,
+        default="bottom-right",
+        help="Posição da marca d'água (padrão: %(default)s)",
+    )
+    filters.add_argument(
+        "--watermark-opacity",
+        type=float,
+        default=1.0,
+        help="Opacidade da marca d'água, de 0 a 1 (padrão: %(default)s)",
+    )
+    quality = convert.add_argument_group("tamanho e qualidade")
+    quality.add_argument(
+        "--target-size",
+        type=parse_file_size,
+        metavar="TAMANHO",
+        help="Tamanho máximo de cada saída principal (ex.: 25M, 1.5G, 700MiB); o "
+        "bitrate é calculado pela duração do vídeo",
+    )
+    quality.add_argument(
+        "--target-quality",
+        type=int,
+        metavar="CRF",
+        help="Qualidade (CRF) da saída; com --target-size, vale enquanto couber",
+    )
+    quality.add_argument(
+        "--two-pass",
+        action="store_true",
+        help="Analisa o vídeo antes de codificar para acertar o tamanho alvo",
+    )
+    quality.add_argument(
+        "--predict",
+        action="store_true",
+        help="Codifica trechos curtos para prever o tamanho e manter a qualidade do "
+        "perfil quando ela já couber",
+    )
+
+    serve = subparsers.add_parser(
+        "serve", help="Inicia o serviço de conversão compartilhado (API HTTP local)"
+    )
+    serve.add_argument(
+        "--host",
+        default=SERVICE_HOST,
+        help="Interface em que o serviço escuta (padrão: %(default)s)",
+    )
+    serve.add_argument(
+        "--port",
+        type=int,
+        default=SERVICE_PORT,
+        help="Porta TCP do serviço (padrão: %(default)s)",
+    )
+    serve.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=default_workers(),
+        help="Número de conversões simultâneas (padrão: %(default)s)",
+    )
+    serve.add_argument("--engine", choices=[*ENGINES, *ENGINE_ALIASES], help="Engine de conversão")
+    serve.add_argument(
+        "--cache",
+        action="store_true",
+        help="Reutiliza conversões anteriores do mesmo conteúdo e guarda as novas",
+    )
+    serve.add_argument(
+        "--metrics",
+        metavar="ARQUIVO",
+        help="Acrescenta as métricas por etapa de cada conversão a um arquivo JSON lines",
+    )
+    add_scheduler_arguments(serve)
+
+    watcher = subparsers.add_parser(
+        "watch", help="Vigia pastas e envia ao serviço os vídeos novos colocados nelas"
+    )
+    watcher.add_argument(
+        "--folder",
+        dest="folders",
+        action="append",
+        nargs=3,
+        metavar=("PASTA", "FORMATO", "SAÍDA"),
+        help="Pasta vigiada, formato de destino e pasta de saída; pode ser repetida",
+    )
+    watcher.add_argument(
+        "--config",
+        default=str(watch.WATCH_FILE),
+        help="Arquivo JSON com as pastas vigiadas (padrão: %(default)s)",
+    )
+    watcher.add_argument(
+        "--recursive", "-r", action="store_true", help="Vigia também as subpastas"
+    )
+    watcher.add_argument(
+        "--profile",
+        "-p",
+        choices=list(load_profiles()),
+        help="Perfil do encoder das pastas passadas com --folder",
+    )
+    watcher.add_argument(
+        "--settle",
+        type=float,
+        default=5.0,
+        help="Segundos sem mudanças para um arquivo ser considerado completo "
+        "(padrão: %(default)s)",
+    )
+    watcher.add_argument(
+        "--interval",
+        type=float,
+        default=2.0,
+        help="Segundos entre duas verificações (padrão: %(default)s)",
+    )
+    watcher.add_argument(
+        "--polling",
+        action="store_true",
+        help="Não usa o inotify; verifica as pastas periodicamente",
+    )
+
+    thumbs = subparsers.add_parser(
+        "thumbs", help="Gera pôster, sprite sheet e índice WebVTT de cada vídeo"
+    )
+    thumbs.add_argument(
+        "inputs", nargs="+", help="Vídeos, diretórios ou padrões glob de entrada"
+    )
+    thumbs.add_argument("output", help="Diretório das imagens")
+    thumbs.add_argument(
+        "--count",
+        "-n",
+        type=int,
+        default=thumbnails.THUMBNAIL_COUNT,
+        help="Quadros amostrados por vídeo (padrão: %(default)s)",
+    )
+    thumbs.add_argument(
+        "--width",
+        type=int,
+        default=thumbnails.THUMBNAIL_WIDTH,
+        help="Largura de cada miniatura (padrão: %(default)s)",
+    )
+    thumbs.add_argument(
+        "--columns",
+        type=int,
+        default=thumbnails.SPRITE_COLUMNS,
+        help="Miniaturas por linha do sprite sheet (padrão: %(default)s)",
+    )
+    thumbs.add_argument(
+        "--poster-width",
+        type=int,
+        default=thumbnails.POSTER_WIDTH,
+        help="Largura do pôster (padrão: %(default)s)",
+    )
+    thumbs.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        help="Vídeos processados ao mesmo tempo (padrão: um por núcleo)",
+    )
+
+    bench = subparsers.add_parser(
+        "bench", help="Mede a velocidade de conversão de cada formato e engine"
+    )
+    bench.add_argument(
+        "--format",
+        "-f",
+        dest="formats",
+        action="append",
+        choices=[name for name, codec in CODECS],
+        help="Formato a medir; pode ser repetido (padrão: todos)",
+    )
+    bench.add_argument(
+        "--engine",
+        dest="engines",
+        action="append",
+        choices=[*ENGINES, *ENGINE_ALIASES],
+        help="Engine a medir; pode ser repetida (padrão: ffmpeg)",
+    )
+    bench.add_argument(
+        "--size",
+        dest="sizes",
+        action="append",
+        type=parse_size,
+        help="Resolução dos clipes de teste, como 1280x720; pode ser repetida",
+    )
+    bench.add_argument(
+        "--duration",
+        dest="durations",
+        action="append",
+        type=float,
+        help="Duração dos clipes de teste em segundos; pode ser repetida",
+    )
+    bench.add_argument(
+        "--profile",
+        "-p",
+        choices=list(load_profiles()),
+        default=default_profile_name(),
+        help="Perfil do encoder (padrão: %(default)s)",
+    )
+    bench.add_argument("--output", "-o", help="Salva os resultados neste arquivo JSON")
+    bench.add_argument(
+        "--baseline",
+        default=str(benchmark.BASELINE_FILE),
+        help="Resultados de referência para comparação (padrão: %(default)s)",
+    )
+    bench.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Salva os resultados como a nova referência",
+    )
+    bench.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.10,
+        help="Lentidão relativa aceita antes de acusar regressão (padrão: %(default)s)",
+    )
+    return parser
+
+
+def add_scheduler_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--policy",
+        choices=POLICIES,
+        default="sjf",
+        help="Ordem dos jobs: menor primeiro (sjf), divisão justa entre usuários "
+        "(fair) ou ordem de envio (fifo) (padrão: %(default)s)",
+    )
+    parser.add_argument(
+        "--max-high-res",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Máximo de vídeos acima de 1080p convertidos ao mesmo tempo (padrão: %(default)s)",
+    )
+
+
+def parse_size(value: str) -> tuple[int, int]:
+    try:
+        width, height = (int(part) for part in value.lower().split("x"))
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"resolução inválida: {value}") from e
+    return width, height
+
+
+def parse_target(value: str) -> tuple[str, str | None, int | None]:
+    value, _, width = value.partition("@")
+    selected_format, _, profile = value.partition(":")
+    selected_format = selected_format.upper()
+    if selected_format not in (name for name, codec in CODECS):
+        raise argparse.ArgumentTypeError(f"formato desconhecido: {selected_format}")
+    if profile and profile not in load_profiles():
+        raise argparse.ArgumentTypeError(f"perfil desconhecido: {profile}")
+    try:
+        width = int(width) if width else None
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"largura inválida: {width}") from e
+    return selected_format, profile or None, width
+
+
+def parse_file_size(value: str) -> int:
+    try:
+        return sizing.parse_size(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from e
+
+
+def parse_crop(value: str) -> tuple[int, int, int, int]:
+    try:
+        width, height, x, y = (int(part) for part in value.split(":"))
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"recorte inválido: {value}") from e
+    return width, height, x, y
+
+
+def make_filters(args) -> FilterChain | None:
+    filters = FilterChain(
+        crop=args.crop,
+        width=args.width,
+        height=args.height,
+        fps=args.fps,
+        watermark=args.watermark,
+        position=args.watermark_position,
+        opacity=args.watermark_opacity,
+    )
+    return filters if filters.active else None
+
+
+def make_target(args) -> sizing.SizeTarget | None:
+    target = sizing.SizeTarget(
+        args.target_size, args.target_quality, args.two_pass, args.predict
+    )
+    return target if target.active else None
+
+
+def run_bench(args) -> int:
+    def report(result):
+        line = (
+            f"{result.key:<32} {result.wall_time:7.2f}s {result.fps:8.1f} fps "
+            f"{result.peak_rss / 1024**2:7.1f} MB {result.cpu_percent:5.0f}% CPU "
+            f"{result.output_bytes / 1024:9.0f} KB"
+        )
+        if result.error:
+            line += f" erro: {result.error}"
+        print(line, flush=True)
+
+    try:
+        results = benchmark.run_benchmark(
+            args.formats,
+            args.engines or ["ffmpeg"],
+            args.sizes or benchmark.DEFAULT_SIZES,
+            args.durations or benchmark.DEFAULT_DURATIONS,
+            args.profile,
+            on_result=report,
+        )
+    except ConversionError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+    if args.output:
+        benchmark.save_report(results, args.output)
+
+    regressions = 0
+    if Path(args.baseline).is_file():
+        rows = benchmark.compare(
+            results, benchmark.load_report(args.baseline), args.tolerance
+        )
+        for row in rows:
+            flag = " REGRESSÃO" if row["regression"] else ""
+            print(f"{row['case']:<32} {row['ratio']:6.2f}x da referência{flag}")
+        regressions = sum(row["regression"] for row in rows)
+    if args.save_baseline:
+        benchmark.save_report(results, args.baseline)
+        print(f"Referência salva em: {args.baseline}")
+    return 1 if regressions else 0
+
+
+def run_convert(args) -> int:
+    inputs = expand_inputs(args.inputs)
+    output = Path(args.output)
+    try:
+        filters = make_filters(args)
+    except ConversionError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 2
+    target = make_target(args)
+
+    if len(inputs) == 1 and Path(inputs[0]).is_file() and not output.is_dir():
+        def show_progress(progress):
+            end = "\n" if progress.done else ""
+            print(f"\r{progress.describe():<60}", end=end, file=sys.stderr, flush=True)
+
+        metrics = JobMetrics()
+        targets = extra_targets(str(output), args.also, filters)
+        outputs = [str(output)] + [target.output_path for target in targets]
+        try:
+            with metrics.measure(args.cprofile):
+                if targets:
+                    profile = sizing.plan_profile(
+                        inputs[0], args.format, args.profile, target, filters
+                    )
+                    main = OutputTarget(args.format, str(output), profile, filters)
+                    convert_outputs(
+                        inputs[0],
+                        [main, *targets],
+                        args.engine,
+                        on_progress=show_progress,
+                        cache=args.cache,
+                        metrics=metrics,
+                        target=target,
+                    )
+                else:
+                    convert_file(
+                        args.format,
+                        inputs[0],
+                        str(output),
+                        args.engine,
+                        on_progress=show_progress,
+                        profile=args.profile,
+                        cache=args.cache,
+                        segments=args.segments,
+                        resume=args.resume,
+                        metrics=metrics,
+                        filters=filters,
+                        target=target,
+                    )
+        except ConversionError as e:
+            print(f"\nErro: {e}", file=sys.stderr)
+            return 1
+        finally:
+            metrics.emit(args.metrics)
+        print(f"Salvo em: {', '.join(outputs)}")
+        return 0
+
+    if not output.is_dir():
+        print(f"Erro: {output} não é um diretório", file=sys.stderr)
+        return 2
+
+    def report(job):
+        line = f"[{job.status}] {job.input_path} -> {job.output_path}"
+        if job.error:
+            line += f": {job.error}"
+        print(line, flush=True)
+
+    queue = BatchQueue(
+        args.jobs,
+        args.engine,
+        on_update=report,
+        use_cache=args.cache,
+        resume=args.resume,
+        metrics_file=args.metrics,
+        profile_dir=args.cprofile,
+        policy=args.policy,
+        max_high_res=args.max_high_res,
+    )
+    if not queue.submit_many(
+        inputs, str(output), args.format, args.profile, filters, args.also, target
+    ):
+        print("Erro: nenhum vídeo encontrado", file=sys.stderr)
+        return 2
+    jobs = queue.run()
+    failed = sum(job.status == FAILED for job in jobs)
+    print(f"{len(jobs) - failed} de {len(jobs)} vídeos convertidos")
+    return 1 if failed else 0
+
+
+def run_serve(args) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s: %(message)s")
+    try:
+        service.run_service(
+            args.host,
+            args.port,
+            workers=args.jobs,
+            engine=args.engine,
+            use_cache=args.cache,
+            metrics_file=args.metrics,
+            policy=args.policy,
+            max_high_res=args.max_high_res,
+        )
+    except OSError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def run_thumbs(args) -> int:
+    output = Path(args.output)
+    if not output.is_dir():
+        print(f"Erro: {output} não é um diretório", file=sys.stderr)
+        return 2
+    total = failed = 0
+    results = thumbnails.generate_many(
+        expand_inputs(args.inputs),
+        str(output),
+        args.jobs,
+        count=args.count,
+        width=args.width,
+        columns=args.columns,
+        poster_width=args.poster_width,
+    )
+    for input_path, result in results:
+        total += 1
+        if isinstance(result, ConversionError):
+            failed += 1
+            print(f"[{FAILED}] {input_path}: {result}", flush=True)
+        else:
+            print(f"[{DONE}] {input_path} -> {result.sprite}", flush=True)
+    if not total:
+        print("Erro: nenhum vídeo encontrado", file=sys.stderr)
+        return 2
+    print(f"{total - failed} de {total} vídeos processados")
+    return 1 if failed else 0
+
+
+def run_watch(args) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s: %(message)s")
+    try:
+        folders = watch.load_watch_folders(args.config)
+        for path, selected_format, output_dir in args.folders or ():
+            folder = watch.WatchFolder(
+                path, selected_format.upper(), output_dir, args.profile, args.recursive
+            )
+            folders.append(folder)
+    except ValueError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 2
+    missing = [folder.path for folder in folders if not Path(folder.path).is_dir()]
+    if not folders or missing:
+        message = f"pasta não encontrada: {', '.join(missing)}" if missing else "nenhuma pasta"
+        print(f"Erro: {message}", file=sys.stderr)
+        return 2
+    try:
+        client = ensure_service()
+    except ServiceError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+
+    def submit(folder, input_path, output_path):
+        job = client.submit(input_path, output_path, folder.selected_format, folder.profile)
+        print(f"[{job.job_id}] {input_path} -> {output_path}", flush=True)
+        return job.job_id
+
+    watcher = watch.FolderWatcher(
+        folders,
+        submit,
+        settle=args.settle,
+        interval=args.interval,
+        use_inotify=not args.polling,
+        jobs=client.jobs,
+    )
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def main(argv=None) -> int:
+    args = make_parser().parse_args(argv)
+    if args.command == "convert":
+        return run_convert(args)
+    if args.command == "bench":
+        return run_bench(args)
+    if args.command == "serve":
+        return run_serve(args)
+    if args.command == "watch":
+        return run_watch(args)
+    if args.command == "thumbs":
+        return run_thumbs(args)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
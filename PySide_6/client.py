@@ -0,0 +1,250 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+# pylint: disable=C0115
+import getpass
+import http.client
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from engines import ConversionError
+from jobs import ConversionJob
+from scheduler import PRIORITY_BATCH
+from utils import SERVICE_FILE, SERVICE_HOST, SERVICE_PORT
+
+
+class ServiceError(ConversionError):
+    pass
+
+
+class ServiceUnavailable(ServiceError):
+    pass
+
+
+def service_address() -> tuple[str, int]:
+    """
+    Returns the address of the job service: the ``VIDEO_MANAGER_SERVICE``
+    environment variable (``host:port``), the address the running service
+    recorded in SERVICE_FILE, or the default one.
+
+    Returns:
+        tuple[str, int]: The host and port.
+    """
+    if value := os.environ.get("VIDEO_MANAGER_SERVICE"):
+        host, _, port = value.rpartition(":")
+        return host or SERVICE_HOST, int(port)
+    try:
+        data = json.loads(SERVICE_FILE.read_text(encoding="utf-8"))
+        return data["host"], int(data["port"])
+    except (OSError, ValueError, KeyError):
+        return SERVICE_HOST, SERVICE_PORT
+
+
+def service_token() -> str | None:
+    """
+    Returns the secret token the running service recorded in SERVICE_FILE,
+    which every request must carry.
+    """
+    try:
+        return json.loads(SERVICE_FILE.read_text(encoding="utf-8")).get("token")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class ServiceClient:
+    """
+    Client of the job service API (see service.JobService).
+    """
+
+    def __init__(self, address: tuple[str, int] | None = None, timeout: float = 10.0):
+        """
+        Initializes the client. No connection is made until a request is sent.
+
+        Args:
+            address (tuple[str, int] | None): The service host and port.
+            Defaults to `service_address()`, resolved on every request.
+            timeout (float): Timeout of the requests, in seconds. The event
+            streams wait for events indefinitely.
+        """
+        self.address = address
+        self.timeout = timeout
+
+    def is_running(self) -> bool:
+        try:
+            self.jobs()
+        except ServiceUnavailable:
+            return False
+        return True
+
+    def submit(
+        self,
+        input_path,
+        output_path,
+        selected_format,
+        profile=None,
+        filters=None,
+        resume=False,
+        priority=PRIORITY_BATCH,
+        weight=1.0,
+        targets=(),
+        target=None,
+    ) -> ConversionJob:
+        """
+        Submits a conversion job.
+
+        Args:
+            input_path (str): The path to the input video file.
+            output_path (str): The path where the converted video will be saved.
+            selected_format (str): The desired format for the output video.
+            profile (str | None): The encoder profile name (see profiles.py).
+            filters (FilterChain | None): Video filters (see filters.py).
+            resume (bool): Whether to checkpoint the job (see journal.py).
+            priority (int): Jobs with a higher priority run first.
+            weight (float): Relative CPU weight of the encoder (1.0 is normal).
+            targets (Iterable[OutputTarget]): Extra outputs, encoded from the
+            same decode (see `core.convert_outputs`).
+            target (SizeTarget | None): Maximum size and/or quality of the
+            output (see sizing.py).
+
+        Raises:
+            ServiceError: If the service rejects the job or can't be reached.
+
+        Returns:
+            ConversionJob: The queued job.
+        """
+        data = {
+            "input_path": str(Path(input_path).resolve()),
+            "output_path": str(Path(output_path).resolve()),
+            "format": selected_format,
+            "profile": profile,
+            "filters": filters.to_dict() if filters is not None else None,
+            "resume": resume,
+            "priority": priority,
+            "weight": weight,
+            "owner": getpass.getuser(),
+            "targets": [
+                dict(target.to_dict(), output_path=str(Path(target.output_path).resolve()))
+                for target in targets
+            ],
+            "target": target.to_dict() if target is not None else None,
+        }
+        return ConversionJob.from_dict(self._request("POST", "/jobs", data))
+
+    def jobs(self) -> list[ConversionJob]:
+        return [ConversionJob.from_dict(item) for item in self._request("GET", "/jobs")["jobs"]]
+
+    def job(self, job_id: int) -> ConversionJob:
+        return ConversionJob.from_dict(self._request("GET", f"/jobs/{job_id}"))
+
+    def cancel(self, job_id: int) -> ConversionJob:
+        return ConversionJob.from_dict(self._request("POST", f"/jobs/{job_id}/cancel"))
+
+    def pause(self, job_id: int) -> ConversionJob:
+        return ConversionJob.from_dict(self._request("POST", f"/jobs/{job_id}/pause"))
+
+    def resume(self, job_id: int) -> ConversionJob:
+        return ConversionJob.from_dict(self._request("POST", f"/jobs/{job_id}/resume"))
+
+    def events(self, job_ids=None):
+        """
+        Streams the job updates.
+
+        Args:
+            job_ids (Iterable[int] | None): The jobs to follow. The stream ends
+            once all of them are finished. None follows every job, forever.
+
+        Raises:
+            ServiceError: If the service can't be reached or the stream breaks.
+
+        Yields:
+            tuple[str, ConversionJob]: The event ("status" or "progress") and
+            the job, starting with the current state of each job.
+        """
+        query = "&".join(f"job={job_id}" for job_id in job_ids or ())
+        connection, response = self._open("GET", f"/events?{query}", timeout=None)
+        try:
+            while line := response.readline():
+                event = json.loads(line)
+                yield event["event"], ConversionJob.from_dict(event["job"])
+        except (OSError, http.client.HTTPException) as e:
+            raise ServiceError(f"conexão com o serviço perdida: {e}") from e
+        finally:
+            connection.close()
+
+    def _request(self, method: str, path: str, data: dict | None = None) -> dict:
+        connection, response = self._open(method, path, data, self.timeout)
+        try:
+            return json.loads(response.read())
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            raise ServiceError(f"resposta inválida do serviço: {e}") from e
+        finally:
+            connection.close()
+
+    def _open(self, method: str, path: str, data: dict | None = None, timeout=None):
+        host, port = self.address or service_address()
+        connection = http.client.HTTPConnection(host, port, timeout=timeout)
+        body = json.dumps(data).encode() if data is not None else None
+        headers = {}
+        if token := service_token():
+            headers["Authorization"] = f"Bearer {token}"
+        if method == "POST":
+            headers["Content-Type"] = "application/json"
+        try:
+            connection.request(method, path, body, headers)
+            response = connection.getresponse()
+        except OSError as e:
+            connection.close()
+            raise ServiceUnavailable(f"serviço indisponível em {host}:{port}: {e}") from e
+        if response.status >= 400:
+            try:
+                message = json.loads(response.read()).get("error")
+            except (OSError, http.client.HTTPException, ValueError, AttributeError):
+                message = None
+            connection.close()
+            raise ServiceError(message or f"{response.status} {response.reason}")
+        return connection, response
+
+
+def ensure_service(client: ServiceClient | None = None, timeout: float = 15.0) -> ServiceClient:
+    """
+    Returns a client of the job service, starting the service in the
+    background when it isn't running yet.
+
+    Args:
+        client (ServiceClient | None): The client to use. Defaults to a new one.
+        timeout (float): Seconds to wait for a new service to start.
+
+    Raises:
+        ServiceUnavailable: If the service doesn't come up in time.
+
+    Returns:
+        ServiceClient: The client.
+    """
+    client = client or ServiceClient()
+    if client.is_running():
+        return client
+    SERVICE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    host, port = client.address or service_address()
+    command = [sys.executable, str(Path(__file__).with_name("cli.py")), "serve"]
+    command += ["--host", host, "--port", str(port)]
+    # O serviço sobrevive a quem o iniciou e registra a saída em um log
+    options = {"start_new_session": True}
+    if sys.platform == "win32":
+        options = {"creationflags": subprocess.DETACHED_PROCESS}
+    with open(SERVICE_FILE.with_suffix(".log"), "ab") as log:
+        subprocess.Popen(  # pylint: disable=R1732
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=log,
+            **options,
+        )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.2)
+        if client.is_running():
+            return client
+    raise ServiceUnavailable("o serviço de conversão não iniciou")
@@ -0,0 +1,176 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+# pylint: disable=C0115
+import subprocess
+import threading
+
+import psutil
+from engines import ConversionCancelled
+
+
+class ConversionControl:
+    """
+    Lets another thread cancel, pause or resume a running conversion.
+
+    Engines that run encoder processes `attach` them, so `cancel` can kill
+    them and `pause` can suspend them. Engines that loop over frames in Python
+    also call `checkpoint` between frames, which raises once the conversion is
+    cancelled and blocks while it is paused.
+    """
+
+    def __init__(self, kill_timeout: float = 5.0, niceness: int = 0) -> None:
+        """
+        Initializes the control.
+
+        Args:
+            kill_timeout (float): Seconds the encoder has to exit after being
+            asked to terminate, before it is killed.
+            niceness (int): Niceness given to the encoder processes (0 to 19),
+            lowering their share of the CPU next to other jobs.
+        """
+        self.kill_timeout = kill_timeout
+        self.niceness = niceness
+        self._cancelled = threading.Event()
+        self._resumed = threading.Event()
+        self._resumed.set()
+        self._processes: set[subprocess.Popen] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self) -> bool:
+        return not self._resumed.is_set()
+
+    def attach(self, process: subprocess.Popen):
+        """
+        Registers an encoder process of the conversion.
+
+        If the conversion was already cancelled the process is stopped right away,
+        and if it is paused the process starts suspended.
+
+        Args:
+            process (subprocess.Popen): The encoder process.
+        """
+        with self._lock:
+            self._processes.add(process)
+            if self.niceness:
+                self._renice(process)
+            if self.cancelled:
+                self._stop(process)
+            elif self.paused:
+                self._signal(process, "suspend")
+
+    def detach(self, process: subprocess.Popen):
+        with self._lock:
+            self._processes.discard(process)
+
+    def cancel(self):
+        """
+        Cancels the conversion. The encoder is terminated, and killed if it is still
+        running after `kill_timeout` seconds.
+        """
+        with self._lock:
+            self._cancelled.set()
+            self._resumed.set()
+            for process in self._processes:
+                self._stop(process)
+
+    def pause(self):
+        """
+        Suspends the encoder processes, freeing their CPU until `resume` is called.
+        """
+        with self._lock:
+            if self.cancelled or self.paused:
+                return
+            self._resumed.clear()
+            for process in self._processes:
+                self._signal(process, "suspend")
+
+    def resume(self):
+        with self._lock:
+            if not self.paused:
+                return
+            self._resumed.set()
+            for process in self._processes:
+                self._signal(process, "resume")
+
+    def checkpoint(self):
+        """
+        Raises if the conversion was cancelled and blocks while it is paused.
+
+        Raises:
+            ConversionCancelled: If the conversion was cancelled.
+        """
+        self._resumed.wait()
+        if self.cancelled:
+            raise ConversionCancelled("Conversão cancelada")
+
+    def _stop(self, process: subprocess.Popen):
+        if process.poll() is not None:
+            return
+        # Um processo suspenso não trata o SIGTERM até voltar a rodar
+        self._signal(process, "resume")
+        process.terminate()
+        timer = threading.Timer(self.kill_timeout, self._kill, args=(process,))
+        timer.daemon = True
+        timer.start()
+
+    def _kill(self, process: subprocess.Popen):
+        if process.poll() is None:
+            process.kill()
+
+    def _renice(self, process: subprocess.Popen):
+        try:
+            if psutil.WINDOWS:
+                # O Windows só tem classes de prioridade
+                level = psutil.BELOW_NORMAL_PRIORITY_CLASS
+                if self.niceness >= 10:
+                    level = psutil.IDLE_PRIORITY_CLASS
+                psutil.Process(process.pid).nice(level)
+            else:
+                psutil.Process(process.pid).nice(self.niceness)
+        except psutil.Error:
+            pass
+
+    def _signal(self, process: subprocess.Popen, action: str):
+        try:
+            getattr(psutil.Process(process.pid), action)()
+        except psutil.Error:
+            pass
+
+
+def relay_events(control: ConversionControl, cancel_event, pause_event, interval=0.2):
+    """
+    Mirrors events shared with another process (e.g. `multiprocessing.Manager`
+    events) onto a local control, from a daemon thread.
+
+    Args:
+        control (ConversionControl): The control of the local conversion.
+        cancel_event: Set by the other process to cancel the conversion.
+        pause_event: Set while the other process wants the conversion paused.
+        interval (float): Polling interval, in seconds.
+
+    Returns:
+        threading.Event: Set it to stop relaying once the conversion is over.
+    """
+    stopped = threading.Event()
+
+    def relay():
+        while not stopped.wait(interval):
+            try:
+                if cancel_event.is_set():
+                    control.cancel()
+                    return
+                if pause_event.is_set():
+                    control.pause()
+                else:
+                    control.resume()
+            except (OSError, EOFError):
+                # O processo dono dos eventos terminou
+                return
+
+    threading.Thread(target=relay, daemon=True).start()
+    return stopped
@@ -2,14 +2,23 @@
 # pylint: disable=W0612
 # pylint: disable=C0116
 # pylint: disable=C0115
-import shutil
-import tempfile
+import threading
+from pathlib import Path
 from typing import TYPE_CHECKING
 
+from jobs import (
+    CANCELLED,
+    DONE,
+    FAILED,
+    FINISHED,
+    ConversionJob,
+    collect_inputs,
+    output_path_for,
+)
 from messages import MsgBox
-from moviepy.editor import VideoFileClip
 from PySide6.QtCore import QThread, Signal
-from utils import CODECS
+from scheduler import BACKGROUND_WEIGHT, PRIORITY_INTERACTIVE
+from utils import get_codec
 
 if TYPE_CHECKING:
     from main_window import MainWindow
@@ -30,7 +39,8 @@ class Converter:
         Convert a video file to the specified format and save it to the output path.
 
         This function takes an input video file, converts it to the specified video format
-        using the chosen codec, and saves the converted video to the output path.
+        using the chosen codec (through `core.convert_file`), and saves the converted video
+        to the output path.
 
         Args:
             input_path (str): The path to the input video file.
@@ -44,22 +54,15 @@ class Converter:
             None
         """
         msg = MsgBox(self.window)
-        print(input_path)
         if not input_path:
             return
-        try:
-            temp_output = tempfile.NamedTemporaryFile(
-                suffix=f".{selected_format.lower()}", delete=False
-            )
-
-            codec = self.convert(selected_format)
-            video_clip = VideoFileClip(input_path)
-            video_clip.write_videofile(temp_output.name, codec=codec)
+        if not output_path:
+            msg.show_error("Conversão cancelada")
+            return
+        from core import convert_file  # pylint: disable=C0415
 
-            if not output_path:
-                msg.show_error("Conversão cancelada")
-                return
-            shutil.copy(temp_output.name, output_path)
+        try:
+            convert_file(selected_format, input_path, output_path)
 
             msg.show_info(f"Conversão concluída.\nSalvo em: {output_path}")
 
@@ -76,53 +79,91 @@ class Converter:
         Returns:
             str: The corresponding codec for the selected format.
         """
-        for extension in CODECS:
-            if selected_format == extension[0]:
-                return extension[1]
+        return get_codec(selected_format)
 
 
 class ConverterThread(QThread):
     finished = Signal(str)
     error = Signal(str)
+    cancelled = Signal()
+    progress = Signal(object)
 
-    def __init__(
-        self, window: "MainWindow", selected_format, input_path, output_path
-    ) -> None:
+    def __init__(self, selected_format, input_path, output_path, profile=None) -> None:
         """
         Initializes the class instance with the provided parameters.
 
+        The thread doesn't touch any widget: the outcome is reported only through
+        the `finished` and `error` signals, handled on the GUI thread.
+
         Args:
-            window (MainWindow): The main window instance.
             selected_format: The selected format.
             input_path: The input path.
             output_path: The output path.
+            profile: The encoder profile name. None means the default profile.
 
         Returns:
             None
         """
         super().__init__()
-        self.window = window
+        self.profile = profile
         self.selected_format = selected_format
         self.input_path = input_path
         self.output_path = output_path
-        self.msg = MsgBox(self.window)
+        # O cliente do serviço só é importado ao converter (ver startup.py)
+        self.client = None
+        self.job: ConversionJob | None = None
+        self._cancel_requested = False
+
+    def cancel(self):
+        """
+        Cancels the conversion. The encoder is killed within a few seconds and the
+        partial output is removed; the `cancelled` signal is emitted afterwards.
+
+        Returns:
+            None
+        """
+        self._cancel_requested = True
+        self._send("cancel")
+
+    def pause(self):
+        """
+        Suspends the encoder, freeing the CPU until `resume` is called.
+
+        Returns:
+            None
+        """
+        self._send("pause")
+
+    def resume(self):
+        self._send("resume")
+
+    def _send(self, action: str):
+        if self.job is None:
+            return
+        from client import ServiceError  # pylint: disable=C0415
+
+        try:
+            getattr(self.client, action)(self.job.job_id)
+        except ServiceError:
+            pass
 
     def run(self):
         """
         Runs the conversion process.
 
         This function performs the following steps:
-        1. Creates a temporary output file with a suffix based on the selected format.
-        2. Retrieves the codec for the selected format.
-        3. Loads the video clip from the input path.
-        4. Writes the video clip to the temporary output file using the specified codec.
-        5. If an output path is not provided, displays an error message and emits a signal
-        indicating the conversion cancellation.
-        6. Copies the temporary output file to the specified output path.
-        7. Displays a success message indicating the conversion completion and the output path.
-        8. Emits a signal indicating the completion of the conversion process.
-        9. If an exception occurs during the conversion process, displays an error message with the
-        exception details and emits a signal indicating the error.
+        1. If an output path is not provided, emits a signal indicating the conversion
+        cancellation.
+        2. Submits the conversion to the shared job service (see service.py), starting the
+        service when it isn't running. The service runs `core.convert_file` in its worker pool,
+        which remuxes the streams when they are already compatible with the selected format and
+        re-encodes them otherwise, and checkpoints long videos so converting them again after a
+        crash resumes the work. Its `progress.Progress` events are emitted through the
+        `progress` signal meanwhile.
+        3. Emits a signal indicating the completion of the conversion process.
+        4. If the conversion is cancelled through `cancel`, emits the `cancelled` signal.
+        5. If the conversion fails, or the service can't be reached, emits a signal with the
+        error details.
 
         Parameters:
             None
@@ -130,24 +171,37 @@ class ConverterThread(QThread):
         Returns:
             None
         """
+        if not self.output_path:
+            self.error.emit("Conversão cancelada")
+            return
+        from client import ServiceError, ensure_service  # pylint: disable=C0415
+
         try:
-            temp_output = tempfile.NamedTemporaryFile(
-                suffix=f".{self.selected_format.lower()}", delete=False
+            self.client = ensure_service(self.client)
+            self.job = self.client.submit(
+                self.input_path,
+                self.output_path,
+                self.selected_format,
+                self.profile,
+                resume=True,
+                # Passa à frente dos lotes em segundo plano
+                priority=PRIORITY_INTERACTIVE,
             )
-
-            codec = self.convert_format(self.selected_format)
-            video_clip = VideoFileClip(self.input_path)
-            video_clip.write_videofile(temp_output.name, codec=codec)
-
-            if not self.output_path:
-                self.msg.show_error("Conversão cancelada")
-                self.error.emit("Conversão cancelada")
-                return
-
-            shutil.copy(temp_output.name, self.output_path)
-            self.finished.emit(self.output_path)
-        except Exception as e:
+            if self._cancel_requested:
+                self._send("cancel")
+            for event, job in self.client.events([self.job.job_id]):
+                self.job = job
+                if event == "progress":
+                    self.progress.emit(job.progress)
+        except ServiceError as e:
             self.error.emit(str(e))
+            return
+        if self.job.status == DONE:
+            self.finished.emit(self.output_path)
+        elif self.job.status == CANCELLED:
+            self.cancelled.emit()
+        else:
+            self.error.emit(self.job.error or "Conversão interrompida")
 
     def convert_format(self, format: str):
         """
@@ -159,6 +213,159 @@ class ConverterThread(QThread):
         Returns:
             str: The corresponding codec.
         """
-        for codec in CODECS:
-            if format == codec[0]:
-                return codec[1]
+        return get_codec(format)
+
+
+class BatchConverterThread(QThread):
+    job_updated = Signal(object)
+    jobs_submitted = Signal(list)
+    submit_failed = Signal(str)
+
+    def __init__(self) -> None:
+        """
+        Initializes the thread with no jobs.
+
+        The jobs run in the shared job service (see service.py), together with
+        the jobs of other windows and scripts; its worker pool is sized once
+        for the whole machine. They run as background work, with a lower CPU
+        weight, behind the conversions started by `ConverterThread`.
+
+        Returns:
+            None
+        """
+        super().__init__()
+        self.client = None
+        self.jobs: list[ConversionJob] = []
+        self._lock = threading.Lock()
+        self._submit_lock = threading.Lock()
+
+    def submit(self, input_paths, output_path, selected_format, profile=None):
+        """
+        Queues the conversion of one or more inputs, without blocking the
+        caller: scanning the inputs, starting the service and submitting the
+        jobs (each one probed by the service) happen in a worker thread. The
+        outcome is emitted through `jobs_submitted`, with the queued jobs
+        (empty if no video was found), or `submit_failed`.
+
+        A single file converted to an output that isn't a directory keeps the
+        chosen output path. Otherwise each video found in `input_paths` is saved
+        inside the `output_path` directory.
+
+        Args:
+            input_paths (list[str]): Files and/or directories to convert.
+            output_path (str): The output file or directory.
+            selected_format (str): The desired format for the converted videos.
+            profile (str | None): The encoder profile name.
+
+        Returns:
+            None
+        """
+        worker = threading.Thread(
+            target=self._submit,
+            args=(input_paths, output_path, selected_format, profile),
+            daemon=True,
+        )
+        worker.start()
+
+    def _submit(self, input_paths, output_path, selected_format, profile):
+        from client import ServiceError, ensure_service  # pylint: disable=C0415
+
+        # Um envio por vez, para os nomes de saída não colidirem
+        with self._submit_lock:
+            if (
+                len(input_paths) == 1
+                and Path(input_paths[0]).is_file()
+                and not Path(output_path).is_dir()
+            ):
+                targets = [(input_paths[0], output_path)]
+            else:
+                with self._lock:
+                    taken = {job.output_path for job in self.jobs}
+                targets = []
+                for input_path in collect_inputs(input_paths):
+                    target = output_path_for(input_path, output_path, selected_format, taken)
+                    taken.add(target)
+                    targets.append((input_path, target))
+            jobs = []
+            try:
+                if targets:
+                    self.client = ensure_service(self.client)
+                for input_path, target in targets:
+                    job = self.client.submit(
+                        input_path, target, selected_format, profile, weight=BACKGROUND_WEIGHT
+                    )
+                    with self._lock:
+                        self.jobs.append(job)
+                    jobs.append(job)
+            except ServiceError as e:
+                if jobs:
+                    self.jobs_submitted.emit(jobs)
+                self.submit_failed.emit(str(e))
+                return
+            self.jobs_submitted.emit(jobs)
+
+    def has_pending(self) -> bool:
+        with self._lock:
+            return any(job.status not in FINISHED for job in self.jobs)
+
+    def clear_finished(self):
+        with self._lock:
+            self.jobs = [job for job in self.jobs if job.status not in FINISHED]
+
+    def cancel(self):
+        """
+        Cancels every job of the batch, pending or running.
+
+        Returns:
+            None
+        """
+        self._send("cancel")
+
+    def pause(self):
+        self._send("pause")
+
+    def resume(self):
+        self._send("resume")
+
+    def _send(self, action: str):
+        with self._lock:
+            jobs = [job for job in self.jobs if job.status not in FINISHED]
+        if not jobs or self.client is None:
+            return
+        from client import ServiceError  # pylint: disable=C0415
+
+        for job in jobs:
+            try:
+                getattr(self.client, action)(job.job_id)
+            except ServiceError:
+                pass
+
+    def run(self):
+        """
+        Follows the jobs in the service until all of them are finished, emitting
+        `job_updated` every time a job changes status. Jobs submitted meanwhile
+        are followed as well.
+
+        Returns:
+            None
+        """
+        from client import ServiceError  # pylint: disable=C0415
+
+        while True:
+            with self._lock:
+                jobs = {job.job_id: job for job in self.jobs if job.status not in FINISHED}
+            if not jobs:
+                return
+            try:
+                for event, update in self.client.events(jobs):
+                    job = jobs[update.job_id]
+                    changed = update.status != job.status
+                    job.status, job.error = update.status, update.error
+                    job.paused, job.progress = update.paused, update.progress
+                    if changed:
+                        self.job_updated.emit(job)
+            except ServiceError as e:
+                for job in jobs.values():
+                    if job.status not in FINISHED:
+                        job.status, job.error = FAILED, str(e)
+                        self.job_updated.emit(job)
@@ -0,0 +1,574 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+import logging
+import os
+import queue
+import secrets
+import sqlite3
+import threading
+from dataclasses import replace
+from pathlib import Path
+
+from engines import ConversionEngine, ConversionError, FFmpegEngine, get_engine
+from journal import JobJournal
+from metrics import stage
+from output_cache import OutputCache
+from probe import can_stream_copy, probe
+from profiles import get_profile
+from progress import ProgressTracker
+from segments import SegmentedEncoder
+from sizing import SIZE_RETRIES, plan_profile, refit_profile
+from utils import get_codec
+
+logger = logging.getLogger("video_manager.core")
+
+
+def fit_size(
+    encode, selected_format, input_path, output_path, profile, target=None, metrics=None
+):
+    """
+    Runs `encode(profile, retry)`, which writes `output_path`, and checks the
+    output against the size target: an output that exceeded it is encoded
+    again with a lower bitrate (see `sizing.refit_profile`), up to
+    SIZE_RETRIES times or until it stops shrinking, instead of being delivered
+    oversized.
+
+    Args:
+        encode (Callable[[EncoderProfile, bool], None]): Encodes the output
+        with a profile; `retry` is False only on the first call.
+        selected_format (str): The format of the output.
+        input_path (str): The path to the input video file.
+        output_path (str | Path): The path the output is written to.
+        profile (EncoderProfile | str | None): The planned encoder profile.
+        target (SizeTarget | None): The target. Without a size, the output is
+        encoded once and not checked.
+        metrics (JobMetrics | None): Receives the time spent in each stage.
+
+    Raises:
+        ConversionCancelled: If the conversion is cancelled.
+        ConversionError: If the conversion fails or the output still exceeds
+        the size.
+    """
+    encode(profile, False)
+    if target is None or target.size is None:
+        return
+    previous = None
+    for retry in range(SIZE_RETRIES + 1):
+        size = Path(output_path).stat().st_size
+        if size <= target.size:
+            return
+        # O encoder chegou ao limite do quantizador: menos bitrate não adianta
+        if retry == SIZE_RETRIES or (previous is not None and size >= previous):
+            raise ConversionError(
+                f"A saída tem {size} bytes e não coube em {target.size} "
+                f"após {retry} recodificações"
+            )
+        previous = size
+        with stage(metrics, "sizing"):
+            profile = refit_profile(input_path, selected_format, profile, target, size)
+        encode(profile, True)
+
+
+def convert_video(
+    selected_format,
+    input_path,
+    output_path,
+    engine=None,
+    threads=None,
+    on_progress=None,
+    control=None,
+    profile=None,
+    segments=None,
+    journal=None,
+    metrics=None,
+    filters=None,
+):
+    """
+    Converts a video file to the selected format.
+
+    When the input streams are already compatible with the selected format they
+    are remuxed with stream copy, unless the profile asks for a specific
+    bitrate or disables it. Otherwise the video is re-encoded by the given
+    engine (or the best available one) with the settings of the profile.
+
+    Args:
+        selected_format (str): The desired format for the output video.
+        input_path (str): The path to the input video file.
+        output_path (str): The path where the converted video will be saved.
+        engine (str | ConversionEngine | None): The engine to use.
+        threads (int | None): Encoder thread count, when `engine` isn't an instance.
+        on_progress (Callable[[Progress], None] | None): Receives throttled
+        `progress.Progress` events while the video is written.
+        control (ConversionControl | None): Lets another thread cancel, pause or
+        resume the conversion.
+        profile (EncoderProfile | str | None): The encoder profile, when `engine`
+        isn't an instance. None means the user's default profile.
+        segments (int | None): When set, long videos re-encoded by ffmpeg are
+        split into this many segments encoded in parallel (see
+        `segments.SegmentedEncoder`).
+        journal (JobJournal | None): When set, the video is encoded in segments
+        committed to the journal, so an interrupted conversion can resume.
+        metrics (JobMetrics | None): Receives the time spent in each stage.
+        filters (FilterChain | None): Video filters (scale, crop, frame rate,
+        watermark). Active filters always re-encode, without segments.
+
+    Raises:
+        ConversionCancelled: If the conversion is cancelled.
+        ConversionError: If the conversion fails.
+
+    Returns:
+        None
+    """
+    if not isinstance(engine, ConversionEngine):
+        engine = get_engine(engine, threads, profile)
+    with stage(metrics, "probe"):
+        info = probe(input_path)
+    tracker = None
+    if on_progress is not None:
+        duration = info.duration if info is not None else None
+        tracker = ProgressTracker(on_progress, duration, output_path)
+    native = FFmpegEngine()
+    streams = info.streams if info is not None else None
+    filtered = filters is not None and filters.active
+    if filtered and info is not None and info.width and info.height:
+        filters.validate(info.width, info.height)
+    if (
+        engine.profile.allows_stream_copy
+        and not filtered
+        and native.is_available()
+        and can_stream_copy(streams, selected_format)
+    ):
+        if metrics is not None:
+            metrics.engine = f"{native.name} (remux)"
+        with stage(metrics, "remux"):
+            native.remux(selected_format, input_path, output_path, tracker, control)
+        return
+    if metrics is not None:
+        metrics.engine = engine.name
+    if (
+        (segments or journal is not None)
+        and not filtered
+        and isinstance(engine, FFmpegEngine)
+    ):
+        encoder = SegmentedEncoder(engine, segments)
+        encoder.convert(
+            selected_format,
+            input_path,
+            output_path,
+            info,
+            tracker,
+            control,
+            journal,
+            metrics,
+        )
+        return
+    with stage(metrics, "encode"):
+        engine.convert(
+            selected_format, input_path, output_path, tracker, control, filters
+        )
+
+
+def partial_path(output_path) -> Path:
+    """
+    Returns a hidden, unique path next to the output, used while it is encoded.
+
+    Keeping it in the destination directory (instead of the system temp dir)
+    lets the finished file be renamed into place without copying it. The
+    extension is kept, since the encoders pick settings from it.
+
+    Args:
+        output_path (str): The path where the converted video will be saved.
+
+    Returns:
+        Path: The partial output path.
+    """
+    output = Path(output_path)
+    return output.with_name(f".{output.stem}.{secrets.token_hex(4)}.part{output.suffix}")
+
+
+def convert_file(
+    selected_format,
+    input_path,
+    output_path,
+    engine=None,
+    threads=None,
+    on_progress=None,
+    control=None,
+    profile=None,
+    cache=None,
+    segments=None,
+    resume=False,
+    metrics=None,
+    filters=None,
+    target=None,
+) -> str:
+    """
+    Validates the arguments and converts a video file.
+
+    The video is encoded into a partial file in the destination directory and
+    atomically renamed to the output path on success. On failure, cancellation
+    or interruption the partial file is removed, so the output path never holds a
+    truncated video.
+
+    With an output cache, a previous conversion of the same content with the
+    same format and profile is reused instead of encoding again, and new
+    outputs are added to the cache.
+
+    A resumable conversion keeps its finished segments in a journal next to
+    the output (see `journal.JobJournal`), so running it again after a crash
+    only encodes what was missing.
+
+    With a size or quality target, the profile is adjusted to the input before
+    anything else (see `sizing.plan_profile`), so the cache and the journal
+    key on the settings that are actually used. An output that still exceeds
+    the size is encoded again with a lower bitrate (see `fit_size`).
+
+    Args:
+        selected_format (str): The desired format for the output video.
+        input_path (str): The path to the input video file.
+        output_path (str): The path where the converted video will be saved.
+        engine (str | ConversionEngine | None): The engine to use.
+        threads (int | None): Encoder thread count.
+        on_progress (Callable[[Progress], None] | None): Receives progress events.
+        control (ConversionControl | None): Cancels, pauses or resumes the conversion.
+        profile (EncoderProfile | str | None): The encoder profile.
+        cache (OutputCache | bool | None): The output cache. True uses the
+        user's cache in CONFIG_DIR; None or False disables it.
+        segments (int | None): Number of segments encoded in parallel.
+        resume (bool): Whether to checkpoint the conversion in a journal and
+        resume from it.
+        metrics (JobMetrics | None): Receives the time spent in each stage. Wrap
+        the call in `metrics.measure()` to also record the totals.
+        filters (FilterChain | None): Video filters applied while converting.
+        target (SizeTarget | None): Maximum size and/or quality of the output.
+
+    Raises:
+        ConversionCancelled: If the conversion is cancelled.
+        ConversionError: If the arguments are invalid or the conversion fails.
+
+    Returns:
+        str: The output path.
+    """
+    if get_codec(selected_format) is None:
+        raise ConversionError(f"Formato desconhecido: {selected_format}")
+    if not Path(input_path).is_file():
+        raise ConversionError(f"Arquivo não encontrado: {input_path}")
+    if not Path(output_path).parent.is_dir():
+        raise ConversionError(f"Diretório não encontrado: {Path(output_path).parent}")
+
+    if metrics is not None:
+        metrics.input_path = metrics.input_path or str(input_path)
+        metrics.output_path = metrics.output_path or str(output_path)
+        metrics.selected_format = selected_format
+
+    if target is not None and target.active:
+        with stage(metrics, "sizing"):
+            profile = plan_profile(input_path, selected_format, profile, target, filters)
+
+    cache_key = journal = None
+    if cache or resume:
+        try:
+            encoder_profile = get_profile(profile)
+        except KeyError as e:
+            raise ConversionError(f"Perfil desconhecido: {profile}") from e
+    if cache:
+        cache = OutputCache() if cache is True else cache
+        with stage(metrics, "cache_key"):
+            cache_key = cache.key_for(
+                input_path, selected_format, encoder_profile, filters
+            )
+    if resume:
+        journal = JobJournal.for_job(
+            input_path, output_path, selected_format, encoder_profile
+        )
+
+    temp_output = partial_path(output_path)
+    try:
+        hit = False
+        if cache_key is not None:
+            with stage(metrics, "cache_fetch"):
+                hit = cache.fetch(cache_key, temp_output)
+        if hit:
+            if metrics is not None:
+                metrics.engine = "cache"
+            os.replace(temp_output, output_path)
+            return output_path
+
+        def encode(encoder_profile, retry):
+            # O diário vale para o perfil planejado, não para o recalculado
+            convert_video(
+                selected_format,
+                input_path,
+                str(temp_output),
+                engine,
+                threads,
+                on_progress,
+                control,
+                encoder_profile,
+                segments,
+                None if retry else journal,
+                metrics,
+                filters,
+            )
+
+        fit_size(encode, selected_format, input_path, temp_output, profile, target, metrics)
+        if cache_key is not None:
+            with stage(metrics, "cache_store"):
+                _store(cache, cache_key, temp_output)
+        with stage(metrics, "finalize"):
+            os.replace(temp_output, output_path)
+    except BaseException:
+        temp_output.unlink(missing_ok=True)
+        raise
+    return output_path
+
+
+def convert_outputs(
+    input_path,
+    targets,
+    engine=None,
+    threads=None,
+    on_progress=None,
+    control=None,
+    cache=None,
+    metrics=None,
+    target=None,
+) -> list[str]:
+    """
+    Converts a video file into several outputs (formats, profiles, filters)
+    decoding it only once.
+
+    The outputs are encoded by a single ffmpeg process (see
+    `engines.FFmpegEngine.convert_many`); outputs that can take the input
+    streams as they are get them copied, and outputs found in the cache are
+    fetched instead. Like `convert_file`, every output is written to a partial
+    file and renamed into place only when all of them succeed.
+
+    The Python frame path has no multi-output mode: with another engine, or
+    without ffmpeg, the outputs are converted one after another.
+
+    A size target applies to the first output, whose profile must already be
+    planned for it (see `sizing.plan_profile`): if it still exceeds the size,
+    it alone is encoded again (see `fit_size`).
+
+    Args:
+        input_path (str): The path to the input video file.
+        targets (list[OutputTarget]): The outputs.
+        engine (str | ConversionEngine | None): The engine to use.
+        threads (int | None): Encoder thread count.
+        on_progress (Callable[[Progress], None] | None): Receives progress events.
+        control (ConversionControl | None): Cancels, pauses or resumes the conversion.
+        cache (OutputCache | bool | None): The output cache.
+        metrics (JobMetrics | None): Receives the time spent in each stage.
+        target (SizeTarget | None): Maximum size of the first output.
+
+    Raises:
+        ConversionCancelled: If the conversion is cancelled.
+        ConversionError: If the arguments are invalid or the conversion fails.
+
+    Returns:
+        list[str]: The output paths.
+    """
+    if not Path(input_path).is_file():
+        raise ConversionError(f"Arquivo não encontrado: {input_path}")
+    paths = [str(Path(output.output_path).resolve()) for output in targets]
+    if len(set(paths)) != len(paths):
+        raise ConversionError("Duas saídas usam o mesmo arquivo")
+    if str(Path(input_path).resolve()) in paths:
+        raise ConversionError(f"Uma saída sobrescreveria a entrada: {input_path}")
+    profiles = []
+    for output in targets:
+        if get_codec(output.selected_format) is None:
+            raise ConversionError(f"Formato desconhecido: {output.selected_format}")
+        if not Path(output.output_path).parent.is_dir():
+            raise ConversionError(
+                f"Diretório não encontrado: {Path(output.output_path).parent}"
+            )
+        try:
+            profiles.append(get_profile(output.profile))
+        except KeyError as e:
+            raise ConversionError(f"Perfil desconhecido: {output.profile}") from e
+
+    if not isinstance(engine, ConversionEngine):
+        engine = get_engine(engine, threads)
+    if not isinstance(engine, FFmpegEngine) or not engine.is_available():
+        for index, output in enumerate(targets):
+            convert_file(
+                output.selected_format,
+                input_path,
+                output.output_path,
+                engine.name,
+                threads,
+                on_progress,
+                control,
+                output.profile,
+                cache,
+                metrics=metrics,
+                filters=output.filters,
+                target=target if index == 0 else None,
+            )
+        return [output.output_path for output in targets]
+
+    if metrics is not None:
+        metrics.input_path = metrics.input_path or str(input_path)
+        metrics.output_path = metrics.output_path or str(targets[0].output_path)
+        metrics.selected_format = "+".join(output.selected_format for output in targets)
+        metrics.engine = f"{engine.name} (multi)"
+    keys = [None] * len(targets)
+    if cache:
+        cache = OutputCache() if cache is True else cache
+        with stage(metrics, "cache_key"):
+            keys = [
+                cache.key_for(input_path, output.selected_format, profile, output.filters)
+                for output, profile in zip(targets, profiles)
+            ]
+
+    temp_outputs = [partial_path(output.output_path) for output in targets]
+    try:
+        pending = []
+        for index, key in enumerate(keys):
+            if key is not None:
+                with stage(metrics, "cache_fetch"):
+                    if cache.fetch(key, temp_outputs[index]):
+                        continue
+            pending.append(index)
+        if pending:
+            with stage(metrics, "probe"):
+                info = probe(input_path)
+            if info is not None and info.width and info.height:
+                for index in pending:
+                    if targets[index].filters is not None:
+                        targets[index].filters.validate(info.width, info.height)
+            streams = info.streams if info is not None else None
+            tracker = None
+            if on_progress is not None:
+                duration = info.duration if info is not None else None
+                tracker = ProgressTracker(on_progress, duration, str(temp_outputs[pending[0]]))
+            batch = [
+                replace(targets[index], output_path=str(temp_outputs[index]))
+                for index in pending
+            ]
+            copy = {
+                position
+                for position, index in enumerate(pending)
+                if profiles[index].allows_stream_copy
+                and not (targets[index].filters is not None and targets[index].filters.active)
+                and can_stream_copy(streams, targets[index].selected_format)
+            }
+            main = targets[0]
+
+            def encode(profile, retry):
+                if not retry:
+                    with stage(metrics, "encode"):
+                        engine.convert_many(input_path, batch, tracker, control, copy)
+                    return
+                with stage(metrics, "encode"):
+                    convert_video(
+                        main.selected_format,
+                        input_path,
+                        str(temp_outputs[0]),
+                        engine.name,
+                        threads,
+                        control=control,
+                        profile=profile,
+                        filters=main.filters,
+                    )
+
+            # A saída principal veio do cache se não está pendente
+            fit_size(
+                encode,
+                main.selected_format,
+                input_path,
+                temp_outputs[0],
+                profiles[0],
+                target if pending[0] == 0 else None,
+                metrics,
+            )
+            for index in pending:
+                if keys[index] is not None:
+                    with stage(metrics, "cache_store"):
+                        _store(cache, keys[index], temp_outputs[index])
+        with stage(metrics, "finalize"):
+            for output, temp_output in zip(targets, temp_outputs):
+                os.replace(temp_output, output.output_path)
+    except BaseException:
+        for temp_output in temp_outputs:
+            temp_output.unlink(missing_ok=True)
+        raise
+    return [output.output_path for output in targets]
+
+
+def iter_conversion(
+    selected_format,
+    input_path,
+    output_path,
+    engine=None,
+    threads=None,
+    control=None,
+    profile=None,
+    cache=None,
+    filters=None,
+):
+    """
+    Converts a video file in a background thread, yielding its progress.
+
+    Example:
+        for event in iter_conversion("MP4", "in.mkv", "out.mp4"):
+            print(event.describe())
+
+    Args:
+        selected_format (str): The desired format for the output video.
+        input_path (str): The path to the input video file.
+        output_path (str): The path where the converted video will be saved.
+        engine (str | ConversionEngine | None): The engine to use.
+        threads (int | None): Encoder thread count.
+        control (ConversionControl | None): Cancels, pauses or resumes the conversion.
+        profile (EncoderProfile | str | None): The encoder profile.
+        cache (OutputCache | bool | None): The output cache.
+        filters (FilterChain | None): Video filters (see filters.py).
+
+    Raises:
+        ConversionError: If the conversion fails (raised by the iterator).
+
+    Yields:
+        Progress: The progress events, the last one with `done` set.
+    """
+    events = queue.Queue()
+    finished = object()
+    errors = []
+
+    def worker():
+        try:
+            convert_file(
+                selected_format,
+                input_path,
+                output_path,
+                engine,
+                threads,
+                events.put,
+                control,
+                profile,
+                cache,
+                filters=filters,
+            )
+        except Exception as e:  # pylint: disable=W0718
+            errors.append(e)
+        finally:
+            events.put(finished)
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    while (event := events.get()) is not finished:
+        yield event
+    thread.join()
+    if errors:
+        raise errors[0]
+
+
+def _store(cache: OutputCache, key: str, output_path):
+    # O cache só economiza conversões futuras: sem espaço ou com o índice
+    # travado, a saída desta conversão continua valendo
+    try:
+        cache.store(key, output_path)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning("Saída não guardada no cache: %s", e)
@@ -0,0 +1,677 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+# pylint: disable=C0115
+import importlib.util
+import io
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import deque
+from dataclasses import replace
+from pathlib import Path
+
+from probe import ffmpeg_binary, probe
+from profiles import TWO_PASS_CODECS, EncoderProfile, get_profile
+from filters import FilterChain, align_filter
+from progress import ProgressTracker, parse_ffmpeg_progress
+from utils import MUXERS, get_encoders
+
+
+# Múltiplo exigido nas dimensões do quadro por cada encoder; os de 4:2:0
+# pedem dimensões pares
+SIZE_ALIGNMENT = {"h263p": 4}
+
+
+def size_alignment(selected_format) -> int:
+    """
+    Returns the multiple the frame width and height must have for the encoder
+    of a format.
+    """
+    return SIZE_ALIGNMENT.get(get_encoders(selected_format)[0], 2)
+
+
+class ConversionError(RuntimeError):
+    pass
+
+
+class ConversionCancelled(ConversionError):
+    pass
+
+
+class ConversionEngine:
+    name = ""
+
+    def __init__(
+        self, threads: int | None = None, profile: EncoderProfile | str | None = None
+    ) -> None:
+        """
+        Initializes the engine.
+
+        Args:
+            threads (int | None): Encoder thread count. None lets the encoder
+            decide, which usually means one thread per core. The profile's own
+            thread count, when set, takes precedence.
+            profile (EncoderProfile | str | None): The encoder profile, or its
+            name. None means the user's default profile.
+        """
+        self.threads = threads
+        try:
+            self.profile = get_profile(profile)
+        except KeyError as e:
+            raise ConversionError(f"Perfil desconhecido: {profile}") from e
+
+    def is_available(self) -> bool:
+        """
+        Checks whether the engine can run on this machine.
+
+        Returns:
+            bool: True if the engine's dependencies are installed.
+        """
+        raise NotImplementedError
+
+    def convert(
+        self,
+        selected_format,
+        input_path,
+        output_path,
+        progress: ProgressTracker | None = None,
+        control=None,
+        filters=None,
+    ):
+        """
+        Re-encodes the input video into the selected format.
+
+        Args:
+            selected_format (str): The desired format for the output video.
+            input_path (str): The path to the input video file.
+            output_path (str): The path where the converted video will be saved.
+            progress (ProgressTracker | None): Receives the encoder's progress.
+            control (ConversionControl | None): Lets another thread cancel, pause
+            or resume the conversion.
+            filters (FilterChain | None): Video filters applied while encoding.
+
+        Raises:
+            ConversionCancelled: If the conversion is cancelled.
+            ConversionError: If the conversion fails.
+
+        Returns:
+            None
+        """
+        raise NotImplementedError
+
+
+class FFmpegEngine(ConversionEngine):
+    """
+    Runs a single ffmpeg process that decodes and encodes the video natively,
+    without passing the frames through Python.
+    """
+
+    name = "ffmpeg"
+
+    def is_available(self) -> bool:
+        binary = ffmpeg_binary()
+        return Path(binary).is_file() or shutil.which(binary) is not None
+
+    def build_command(
+        self, selected_format, input_path, output_path, filters=None
+    ) -> list[str]:
+        """
+        Builds the ffmpeg command line for a conversion.
+
+        Args:
+            selected_format (str): The desired format for the output video.
+            input_path (str): The path to the input video file.
+            output_path (str): The path where the converted video will be saved.
+            filters (FilterChain | None): Video filters, compiled into a single
+            filter graph.
+
+        Returns:
+            list[str]: The command, ready for `subprocess.run`.
+        """
+        command = [ffmpeg_binary(), "-y", "-v", "error", "-i", input_path]
+        if filters is not None and filters.active:
+            if filters.watermark:
+                command += ["-i", filters.watermark]
+            graph = filters.ffmpeg_graph(align=size_alignment(selected_format))
+            command += ["-filter_complex", graph, "-map", "[v]", "-map", "0:a?"]
+            command += self.video_args(selected_format, graph=True)
+        else:
+            command += ["-map", "0:V?", "-map", "0:a?"]
+            command += self.video_args(selected_format)
+        command += self.audio_args(selected_format)
+        command += self.muxer_args(selected_format, output_path)
+        return command
+
+    def video_args(
+        self, selected_format, threads: int | None = None, graph: bool = False
+    ) -> list[str]:
+        """
+        Returns the video encoder arguments: codec, profile settings and threads.
+
+        The frame size is rounded down to what the encoder accepts (see
+        `size_alignment`) with a ``-vf`` filter, which ffmpeg doesn't allow on
+        the outputs of a ``-filter_complex`` graph: such a graph must round the
+        size itself (see `FilterChain.ffmpeg_graph`).
+
+        Args:
+            selected_format (str): The desired format for the output video.
+            threads (int | None): Overrides the engine's thread count.
+            graph (bool): Whether the video comes out of a ``-filter_complex``
+            graph.
+
+        Returns:
+            list[str]: The arguments.
+        """
+        codec, _ = get_encoders(selected_format)
+        args = ["-c:v", codec] + self.profile.video_args(codec)
+        threads = threads or self.threads
+        if threads and not self.profile.threads:
+            args += ["-threads", str(threads)]
+        if not graph:
+            args += ["-vf", align_filter(size_alignment(selected_format))]
+        if codec == "libx264":
+            # 4:2:0 toca em qualquer player, mas exige dimensões pares: por isso
+            # o tamanho é arredondado acima, como o moviepy fazia ao recusar o
+            # yuv420p em quadros ímpares
+            args += ["-pix_fmt", "yuv420p"]
+        elif codec.startswith("libvpx"):
+            # Sem isso a marca d'água (overlay) entrega yuva420p, que o libvpx
+            # recusa com o auto_alt_ref ligado
+            args += ["-pix_fmt", "yuv420p"]
+        return args
+
+    def audio_args(self, selected_format) -> list[str]:
+        """
+        Returns the audio encoder arguments: codec and profile settings.
+
+        Args:
+            selected_format (str): The desired format for the output video.
+
+        Returns:
+            list[str]: The arguments.
+        """
+        _, codec = get_encoders(selected_format)
+        return ["-c:a", codec] + self.profile.audio_args()
+
+    def convert(
+        self,
+        selected_format,
+        input_path,
+        output_path,
+        progress=None,
+        control=None,
+        filters=None,
+    ):
+        if (
+            self.profile.bitrate is not None
+            and self.profile.passes > 1
+            and get_encoders(selected_format)[0] in TWO_PASS_CODECS
+        ):
+            self.convert_two_pass(
+                selected_format, input_path, output_path, progress, control, filters
+            )
+            return
+        command = self.build_command(selected_format, input_path, output_path, filters)
+        self.run_command(command, progress, control)
+
+    def convert_two_pass(
+        self,
+        selected_format,
+        input_path,
+        output_path,
+        progress=None,
+        control=None,
+        filters=None,
+    ):
+        """
+        Converts a video in two passes: the first one only analyses the video
+        into a log, which the second one reads to distribute the bitrate of the
+        profile, hitting the average (and so the file size) much closer than a
+        single pass.
+
+        Only the codecs in TWO_PASS_CODECS are converted in two passes by
+        `convert`: the MPEG-style encoders of libavcodec lose frames against
+        the log in constant frame rate containers and crash on bitrates below
+        their quantizer limit.
+
+        Args:
+            selected_format (str): The desired format for the output video.
+            input_path (str): The path to the input video file.
+            output_path (str): The path where the converted video will be saved.
+            progress (ProgressTracker | None): Receives ffmpeg's progress during
+            the second pass.
+            control (ConversionControl | None): Cancels, pauses or resumes ffmpeg.
+            filters (FilterChain | None): Video filters.
+
+        Raises:
+            ConversionCancelled: If the conversion is cancelled.
+            ConversionError: If ffmpeg fails.
+
+        Returns:
+            None
+        """
+        encoder = self
+        if self.profile.deadline == "realtime":
+            # O libvpx em tempo real não grava as estatísticas da primeira passada
+            encoder = FFmpegEngine(self.threads, replace(self.profile, deadline="good"))
+        command = encoder.build_command(selected_format, input_path, output_path, filters)
+        muxer = len(command) - len(encoder.muxer_args(selected_format, output_path))
+        with tempfile.TemporaryDirectory(prefix="passlog-") as directory:
+            passlog = ["-passlogfile", str(Path(directory) / "pass")]
+            # A primeira passada grava no mesmo muxer da segunda: o muxer "null"
+            # trata os timestamps de outro jeito e o libx264 aborta a segunda
+            # passada com um log de MB-tree incompleto
+            analysis = command[:muxer] + ["-pass", "1"] + passlog + ["-an"]
+            analysis += encoder.muxer_args(selected_format, str(Path(directory) / "pass1"))
+            self.run_command(analysis, None, control)
+            final = command[:muxer] + ["-pass", "2"] + passlog + command[muxer:]
+            self.run_command(final, progress, control)
+
+    def convert_many(
+        self, input_path, targets, progress=None, control=None, copy=()
+    ):
+        """
+        Converts the input into several outputs with a single ffmpeg process,
+        so the input is read and decoded once however many outputs there are.
+        The decoded video is split between the outputs, each one with its own
+        filters, encoder and profile.
+
+        Args:
+            input_path (str): The path to the input video file.
+            targets (list[OutputTarget]): The outputs.
+            progress (ProgressTracker | None): Receives ffmpeg's progress.
+            control (ConversionControl | None): Lets another thread cancel, pause
+            or resume the conversion.
+            copy (Collection[int]): Indexes of the targets whose streams are
+            copied instead of re-encoded (see `remux`).
+
+        Raises:
+            ConversionCancelled: If the conversion is cancelled.
+            ConversionError: If the conversion fails.
+
+        Returns:
+            None
+        """
+        command = self.build_multi_command(input_path, targets, copy)
+        self.run_command(command, progress, control)
+
+    def build_multi_command(self, input_path, targets, copy=()) -> list[str]:
+        """
+        Builds the ffmpeg command line of `convert_many`.
+
+        Returns:
+            list[str]: The command, ready for `subprocess.run`.
+        """
+        command = [ffmpeg_binary(), "-y", "-v", "error", "-i", input_path]
+        encoded = [index for index in range(len(targets)) if index not in copy]
+        graph, labels = [], {}
+        if len(encoded) > 1:
+            # Um único decodificador alimenta todas as saídas recodificadas
+            splits = "".join(f"[s{index}]" for index in encoded)
+            graph.append(f"[0:V:0]split={len(encoded)}{splits}")
+        for index in encoded:
+            filters = targets[index].filters
+            source = f"s{index}" if len(encoded) > 1 else "0:V:0"
+            if filters is None or not filters.active:
+                if len(encoded) == 1:
+                    continue
+                # As saídas do split só passam por filtros do grafo
+                filters = FilterChain()
+            watermark_input = 0
+            if filters.watermark:
+                watermark_input = command.count("-i")
+                command += ["-i", filters.watermark]
+            align = size_alignment(targets[index].selected_format)
+            graph.append(filters.ffmpeg_graph(watermark_input, source, f"v{index}", align))
+            labels[index] = f"[v{index}]"
+        if graph:
+            command += ["-filter_complex", ";".join(graph)]
+        for index, target in enumerate(targets):
+            encoder = FFmpegEngine(self.threads, target.profile or self.profile)
+            if index in copy:
+                command += ["-map", "0:V?", "-map", "0:a?", "-c", "copy"]
+            else:
+                command += ["-map", labels.get(index, "0:V?"), "-map", "0:a?"]
+                command += encoder.video_args(target.selected_format, graph=index in labels)
+                command += encoder.audio_args(target.selected_format)
+            command += encoder.muxer_args(target.selected_format, target.output_path)
+        return command
+
+    def remux(
+        self, selected_format, input_path, output_path, progress=None, control=None
+    ):
+        """
+        Copies the video and audio streams of the input into the container of the
+        selected format, without decoding or re-encoding them.
+
+        Args:
+            selected_format (str): The desired format for the output video.
+            input_path (str): The path to the input video file.
+            output_path (str): The path where the remuxed video will be saved.
+            progress (ProgressTracker | None): Receives ffmpeg's progress.
+            control (ConversionControl | None): Lets another thread cancel, pause
+            or resume the remux.
+
+        Raises:
+            ConversionCancelled: If the remux is cancelled.
+            ConversionError: If ffmpeg fails to remux the file.
+
+        Returns:
+            None
+        """
+        command = [ffmpeg_binary(), "-y", "-v", "error", "-i", input_path]
+        command += ["-map", "0:V?", "-map", "0:a?", "-c", "copy"]
+        command += self.muxer_args(selected_format, output_path)
+        self.run_command(command, progress, control)
+
+    def muxer_args(self, selected_format, output_path) -> list[str]:
+        """
+        Returns the output arguments: container options, muxer and output path.
+
+        Args:
+            selected_format (str): The desired format for the output video.
+            output_path (str): The path where the video will be saved.
+
+        Returns:
+            list[str]: The arguments, to close the command line.
+        """
+        args = []
+        if MUXERS[selected_format] in ("mp4", "mov"):
+            args += ["-movflags", "+faststart"]
+        return args + ["-f", MUXERS[selected_format], output_path]
+
+    def run_command(self, command: list[str], progress=None, control=None, feed=None):
+        """
+        Runs an ffmpeg command line, whose last item must be the output.
+
+        Args:
+            command (list[str]): The command.
+            progress (ProgressTracker | None): Receives ffmpeg's progress.
+            control (ConversionControl | None): Cancels, pauses or resumes ffmpeg.
+            feed (Callable[[BinaryIO], None] | None): Writes ffmpeg's input
+            (``-i pipe:0``) to the given stream, from another thread.
+
+        Raises:
+            ConversionCancelled: If the command is cancelled.
+            ConversionError: If ffmpeg fails, or `feed` raises it.
+
+        Returns:
+            None
+        """
+        stdout = subprocess.DEVNULL
+        if progress is not None:
+            command = command[:-1] + ["-progress", "pipe:1", "-nostats", command[-1]]
+            stdout = subprocess.PIPE
+        if control is not None:
+            control.checkpoint()
+
+        # O stderr é drenado em outra thread para o ffmpeg nunca travar com o
+        # pipe cheio enquanto o progresso é lido do stdout
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE if feed is not None else subprocess.DEVNULL,
+            stdout=stdout,
+            stderr=subprocess.PIPE,
+        )
+        if control is not None:
+            control.attach(process)
+        feed_errors = []
+        try:
+            errors = deque(maxlen=20)
+            reader = threading.Thread(
+                target=errors.extend,
+                args=(io.TextIOWrapper(process.stderr, errors="replace"),),
+                daemon=True,
+            )
+            reader.start()
+            if feed is not None:
+                feeder = threading.Thread(
+                    target=self._feed, args=(feed, process, feed_errors), daemon=True
+                )
+                feeder.start()
+            if progress is not None:
+                stopped = (lambda: control.cancelled) if control is not None else None
+                lines = io.TextIOWrapper(process.stdout, errors="replace")
+                parse_ffmpeg_progress(lines, progress, stopped)
+            returncode = process.wait()
+            reader.join()
+            if feed is not None:
+                feeder.join()
+        finally:
+            if control is not None:
+                control.detach(process)
+            if process.poll() is None:
+                process.kill()
+        if control is not None and control.cancelled:
+            raise ConversionCancelled("Conversão cancelada")
+        if feed_errors:
+            raise feed_errors[0]
+        self._check(returncode, errors)
+
+    def _feed(self, feed, process: subprocess.Popen, feed_errors: list):
+        try:
+            feed(process.stdin)
+        except (BrokenPipeError, ConnectionResetError):
+            # O ffmpeg saiu antes de ler tudo; o erro dele é reportado pelo _check
+            pass
+        except Exception as e:  # pylint: disable=W0718
+            feed_errors.append(e)
+            process.kill()
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    def _check(self, returncode: int, errors):
+        if returncode != 0:
+            lines = [line.strip() for line in errors if line.strip()]
+            raise ConversionError(lines[-1] if lines else "ffmpeg falhou")
+
+
+class PythonEngine(ConversionEngine):
+    """
+    Passes the frames through Python: ffmpeg decodes them into a bounded pool
+    of reused NumPy buffers (see `frames.FrameReader`) and a second ffmpeg
+    process encodes them from a pipe, taking the audio straight from the input.
+    Slower than `FFmpegEngine`, kept as a fallback and as the place for
+    per-frame processing in Python.
+
+    It replaced moviepy's ``VideoFileClip.write_videofile``, which allocated a
+    new array per frame and buffered the whole audio track; the old name is
+    still accepted (see ENGINE_ALIASES).
+    """
+
+    name = "python"
+
+    def __init__(self, threads=None, profile=None, buffers: int | None = None) -> None:
+        """
+        Initializes the engine.
+
+        Args:
+            threads (int | None): Encoder thread count.
+            profile (EncoderProfile | str | None): The encoder profile.
+            buffers (int | None): Frames buffered between the decoder and the
+            encoder. Defaults to frames.FRAME_BUFFERS.
+        """
+        super().__init__(threads, profile)
+        self.buffers = buffers
+
+    def is_available(self) -> bool:
+        # o ffmpeg continua decodificando e codificando os quadros
+        binary = ffmpeg_binary()
+        if not (Path(binary).is_file() or shutil.which(binary) is not None):
+            return False
+        return importlib.util.find_spec("numpy") is not None
+
+    def convert(
+        self,
+        selected_format,
+        input_path,
+        output_path,
+        progress=None,
+        control=None,
+        filters=None,
+    ):
+        # pylint: disable=C0415
+        from frames import FILTER_BATCH, FRAME_BUFFERS, FrameReader
+
+        info = probe(input_path)
+        if info is None or not info.width or not info.height or not info.fps:
+            raise ConversionError(f"Não foi possível ler o vídeo: {input_path}")
+        budget = self.buffers or FRAME_BUFFERS
+        size, rate, frame_filter = (info.width, info.height), info.rate, None
+        batch = 1
+        if filters is not None and filters.active:
+            # Os filtros trabalham em lotes; o total de frames em memória continua
+            # perto de `buffers`
+            batch = FILTER_BATCH
+            frame_filter = filters.compile(info.width, info.height, info.fps, batch)
+            size = frame_filter.output_size
+            rate = f"{filters.fps:g}" if filters.fps else info.rate
+        reader = FrameReader(
+            input_path, info.width, info.height, info.rate, max(2, budget // batch)
+        )
+
+        def feed(stdin):
+            for frames in reader.batches(batch, control):
+                if control is not None:
+                    control.checkpoint()
+                if frame_filter is not None:
+                    frames = frame_filter.apply(frames)
+                stdin.write(frames.data)
+
+        self.encode(
+            selected_format, input_path, output_path, size, rate, feed, progress, control
+        )
+
+    def encode(
+        self,
+        selected_format,
+        input_path,
+        output_path,
+        size,
+        rate,
+        feed,
+        progress=None,
+        control=None,
+    ):
+        """
+        Encodes raw RGB frames written by `feed` to ffmpeg's stdin, taking the
+        audio straight from the input.
+
+        Args:
+            selected_format (str): The desired format for the output video.
+            input_path (str): The path to the input video file.
+            output_path (str): The path where the converted video will be saved.
+            size (tuple[int, int]): Frame width and height.
+            rate (str): Frame rate, for ffmpeg's ``-r``.
+            feed (Callable[[BinaryIO], None]): Writes the frames.
+            progress (ProgressTracker | None): Receives the encoder's progress.
+            control (ConversionControl | None): Cancels, pauses or resumes it.
+        """
+        encoder = FFmpegEngine(self.threads, self.profile)
+        command = [ffmpeg_binary(), "-y", "-v", "error"]
+        command += ["-f", "rawvideo", "-pix_fmt", "rgb24"]
+        command += ["-s", "{}x{}".format(*size), "-r", rate]
+        command += ["-i", "pipe:0", "-i", input_path, "-map", "0:v", "-map", "1:a?"]
+        command += encoder.video_args(selected_format) + encoder.audio_args(selected_format)
+        command += encoder.muxer_args(selected_format, output_path)
+        encoder.run_command(command, progress, control, feed)
+
+
+class SharedMemoryEngine(PythonEngine):
+    """
+    The Python frame path of `PythonEngine` with its stages in separate
+    processes: one decodes, one runs the filters and the encoder is fed from
+    the conversion's own process. The frames move between them through shared
+    memory ring buffers (see `transport.FramePipeline`), never pickled, so
+    the filters don't compete with the decoder for the GIL.
+    """
+
+    name = "python-shm"
+
+    def is_available(self) -> bool:
+        return super().is_available() and importlib.util.find_spec(
+            "multiprocessing.shared_memory"
+        ) is not None
+
+    def convert(
+        self,
+        selected_format,
+        input_path,
+        output_path,
+        progress=None,
+        control=None,
+        filters=None,
+    ):
+        from transport import FramePipeline  # pylint: disable=C0415
+
+        info = probe(input_path)
+        if info is None or not info.width or not info.height or not info.fps:
+            raise ConversionError(f"Não foi possível ler o vídeo: {input_path}")
+        pipeline = FramePipeline(input_path, info, filters, self.buffers)
+
+        def feed(stdin):
+            for frames in pipeline.batches(control):
+                if control is not None:
+                    control.checkpoint()
+                # Escreve direto da memória compartilhada para o pipe
+                stdin.write(frames.data)
+
+        self.encode(
+            selected_format,
+            input_path,
+            output_path,
+            pipeline.output_size,
+            pipeline.output_rate,
+            feed,
+            progress,
+            control,
+        )
+
+
+ENGINES = {
+    FFmpegEngine.name: FFmpegEngine,
+    PythonEngine.name: PythonEngine,
+    SharedMemoryEngine.name: SharedMemoryEngine,
+}
+
+# nomes antigos, mantidos para configurações e scripts salvos
+ENGINE_ALIASES = {
+    "moviepy": PythonEngine.name,
+    "moviepy-shm": SharedMemoryEngine.name,
+}
+
+
+def get_engine(
+    name: str | None = None, threads: int | None = None, profile=None
+) -> ConversionEngine:
+    """
+    Returns a conversion engine instance.
+
+    Args:
+        name (str | None): The name of the engine (a key of ENGINES or
+        ENGINE_ALIASES). When None,
+        the first available engine is returned, preferring ffmpeg.
+        threads (int | None): Encoder thread count passed to the engine.
+        profile (EncoderProfile | str | None): Encoder profile passed to the engine.
+
+    Raises:
+        ConversionError: If the engine doesn't exist or none is available.
+
+    Returns:
+        ConversionEngine: The engine instance.
+    """
+    if name is not None:
+        name = ENGINE_ALIASES.get(name, name)
+        if name not in ENGINES:
+            raise ConversionError(f"Engine desconhecida: {name}")
+        return ENGINES[name](threads, profile)
+    for engine_class in ENGINES.values():
+        engine = engine_class(threads, profile)
+        if engine.is_available():
+            return engine
+    raise ConversionError("Nenhuma engine de conversão disponível")
+
@@ -0,0 +1,191 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+# pylint: disable=C0115
+from dataclasses import asdict, dataclass, fields
+
+WATERMARK_POSITIONS = ("top-left", "top-right", "bottom-left", "bottom-right", "center")
+
+
+def align_filter(align: int) -> str:
+    """
+    Returns the ffmpeg filter that rounds the frame size down to a multiple of
+    `align`, losing at most ``align - 1`` pixels of each dimension. Frames that
+    already fit pass through unchanged.
+    """
+    return f"scale=trunc(iw/{align})*{align}:trunc(ih/{align})*{align}"
+
+
+@dataclass
+class FilterChain:
+    """
+    Video filters applied while converting, in this order: crop, scale, frame
+    rate change and watermark overlay.
+
+    The chain compiles to a single ffmpeg filter graph for the native engine
+    (`ffmpeg_graph`), or to a `frames.FrameFilter` that processes batches of frames
+    with vectorized NumPy operations in the Python frame path (`compile`).
+
+    Its values are checked on creation, and the crop against the input size
+    once it is known (see `validate`).
+    """
+
+    crop: tuple[int, int, int, int] | None = None
+    width: int | None = None
+    height: int | None = None
+    fps: float | None = None
+    watermark: str | None = None
+    position: str = "bottom-right"
+    opacity: float = 1.0
+    margin: int = 10
+
+    def __post_init__(self):
+        self.validate()
+
+    @property
+    def active(self) -> bool:
+        return any((self.crop, self.width, self.height, self.fps, self.watermark))
+
+    def validate(self, width: int | None = None, height: int | None = None):
+        """
+        Checks the values of the chain and, given the input frame size, that
+        the crop fits in it.
+
+        Args:
+            width (int | None): Input frame width.
+            height (int | None): Input frame height.
+
+        Raises:
+            ConversionError: If a value is invalid.
+        """
+        # Importado aqui: engines importa este módulo
+        from engines import ConversionError  # pylint: disable=C0415
+
+        if self.crop is not None:
+            if len(self.crop) != 4:
+                raise ConversionError(f"Recorte inválido: {self.crop}")
+            crop_width, crop_height, x, y = self.crop
+            if crop_width <= 0 or crop_height <= 0 or x < 0 or y < 0:
+                raise ConversionError(f"Recorte inválido: {self.crop}")
+            if width is not None and height is not None and (
+                x + crop_width > width or y + crop_height > height
+            ):
+                raise ConversionError(
+                    f"O recorte {crop_width}x{crop_height}+{x}+{y} "
+                    f"sai do quadro de {width}x{height}"
+                )
+        for name, value in (
+            ("largura", self.width),
+            ("altura", self.height),
+            ("taxa de quadros", self.fps),
+        ):
+            if value is not None and value <= 0:
+                raise ConversionError(f"{name.capitalize()} inválida: {value}")
+        if not 0 <= self.opacity <= 1:
+            raise ConversionError(f"Opacidade fora de 0 a 1: {self.opacity}")
+        if self.position not in WATERMARK_POSITIONS:
+            raise ConversionError(f"Posição da marca d'água desconhecida: {self.position}")
+        if self.margin < 0:
+            raise ConversionError(f"Margem negativa: {self.margin}")
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FilterChain":
+        known = {item.name for item in fields(cls)}
+        data = {key: value for key, value in data.items() if key in known}
+        if data.get("crop") is not None:
+            data["crop"] = tuple(data["crop"])
+        return cls(**data)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def output_size(self, width: int, height: int) -> tuple[int, int]:
+        """
+        Computes the frame size after cropping and scaling. A missing width or
+        height keeps the aspect ratio, rounded to an even number as the common
+        4:2:0 encoders require.
+
+        Args:
+            width (int): Input frame width.
+            height (int): Input frame height.
+
+        Returns:
+            tuple[int, int]: The output width and height.
+        """
+        if self.crop is not None:
+            width, height = self.crop[0], self.crop[1]
+        if self.width and self.height:
+            return self.width, self.height
+        if self.width:
+            return self.width, max(2, round(height * self.width / width / 2) * 2)
+        if self.height:
+            return max(2, round(width * self.height / height / 2) * 2), self.height
+        return width, height
+
+    def ffmpeg_graph(
+        self,
+        watermark_input: int = 1,
+        source: str = "0:V:0",
+        label: str = "v",
+        align: int = 1,
+    ) -> str:
+        """
+        Builds the ``-filter_complex`` graph of the chain, by default reading the
+        first video stream of input 0 and writing the ``[v]`` label.
+
+        Args:
+            watermark_input (int): Index of the input that holds the watermark image.
+            source (str): The label the chain reads, e.g. an output of ``split``.
+            label (str): The label the chain writes. Its intermediate labels are
+            prefixed with it, so several chains fit in one graph.
+            align (int): Rounds the output size down to a multiple of it, as
+            the encoder requires (see `align_filter`). 1 keeps the size.
+
+        Returns:
+            str: The filter graph.
+        """
+        steps = []
+        if self.crop is not None:
+            steps.append("crop={}:{}:{}:{}".format(*self.crop))
+        if self.width or self.height:
+            # -2 mantém a proporção com uma dimensão par, como em `output_size`
+            steps.append(f"scale={self.width or -2}:{self.height or -2}")
+        if self.fps:
+            steps.append(f"fps={self.fps:g}")
+        chain = ",".join(steps) or "null"
+        aligned = f",{align_filter(align)}" if align > 1 else ""
+        if not self.watermark:
+            return f"[{source}]{chain}{aligned}[{label}]"
+        x, y = _overlay_position(self.position, self.margin)
+        mark = "format=rgba"
+        if self.opacity < 1:
+            mark += f",colorchannelmixer=aa={self.opacity:g}"
+        return (
+            f"[{source}]{chain}[{label}base];[{watermark_input}:v]{mark}[{label}mark];"
+            f"[{label}base][{label}mark]overlay={x}:{y}:format=auto{aligned}[{label}]"
+        )
+
+    def compile(self, width: int, height: int, fps: float, batch: int):
+        """
+        Prepares the chain for frames of a given size and rate.
+
+        Args:
+            width (int): Input frame width.
+            height (int): Input frame height.
+            fps (float): Input frame rate.
+            batch (int): Maximum number of frames per batch.
+
+        Returns:
+            FrameFilter: The compiled filter.
+        """
+        from frames import FrameFilter  # pylint: disable=C0415
+
+        return FrameFilter(self, width, height, fps, batch)
+
+
+def _overlay_position(position: str, margin: int) -> tuple[str, str]:
+    horizontal = {"left": str(margin), "right": f"main_w-overlay_w-{margin}"}
+    vertical = {"top": str(margin), "bottom": f"main_h-overlay_h-{margin}"}
+    if position == "center":
+        return "(main_w-overlay_w)/2", "(main_h-overlay_h)/2"
+    row, column = position.split("-")
+    return horizontal[column], vertical[row]
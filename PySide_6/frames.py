@@ -0,0 +1,283 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+# pylint: disable=C0115
+import queue
+import subprocess
+import threading
+from collections import deque
+
+import numpy as np
+from engines import ConversionError
+from filters import FilterChain
+from probe import ffmpeg_binary
+
+FRAME_BUFFERS = 8
+FILTER_BATCH = 4
+
+
+class FrameReader:
+    """
+    Streams the decoded frames of a video through a fixed pool of buffers.
+
+    ffmpeg decodes the video into raw RGB frames on a pipe, and a background
+    thread reads them straight into one of `buffers` preallocated NumPy
+    arrays, one frame or one batch of frames per buffer. The generators yield
+    those arrays: a frame (or batch) is only valid until the next one is
+    requested, when its buffer goes back to the pool. Decoding blocks while
+    every buffer is in use, so memory stays bounded by the pool size whatever
+    the length or resolution of the video.
+    """
+
+    def __init__(
+        self, input_path, width: int, height: int, rate: str, buffers: int = FRAME_BUFFERS
+    ) -> None:
+        """
+        Initializes the reader. Nothing runs until it is iterated.
+
+        Args:
+            input_path (str): The path to the input video file.
+            width (int): Frame width.
+            height (int): Frame height.
+            rate (str): Frame rate the frames are decoded at, for ffmpeg's ``-r``.
+            buffers (int): Number of preallocated frame buffers (at least 2).
+        """
+        self.input_path = input_path
+        self.shape = (height, width, 3)
+        self.rate = rate
+        self.buffers = max(2, buffers)
+
+    def command(self) -> list[str]:
+        command = [ffmpeg_binary(), "-v", "error", "-i", self.input_path]
+        command += ["-map", "0:V:0", "-an", "-sn", "-r", self.rate]
+        command += ["-f", "rawvideo", "-pix_fmt", "rgb24", "-"]
+        return command
+
+    def frames(self, control=None):
+        """
+        Decodes the video, yielding its frames.
+
+        Args:
+            control (ConversionControl | None): The decoder process is attached
+            to it, so it is paused, resumed and killed with the conversion.
+
+        Raises:
+            ConversionError: If ffmpeg fails to decode the video.
+
+        Yields:
+            numpy.ndarray: The frames, as (height, width, 3) uint8 arrays that are
+            reused once the next frame is requested.
+        """
+        for batch in self.batches(1, control):
+            yield batch[0]
+
+    def batches(self, size: int, control=None):
+        """
+        Decodes the video, yielding batches of consecutive frames.
+
+        Args:
+            size (int): Frames per batch. The last batch may be shorter.
+            control (ConversionControl | None): See `frames`.
+
+        Raises:
+            ConversionError: If ffmpeg fails to decode the video.
+
+        Yields:
+            numpy.ndarray: (frames, height, width, 3) uint8 arrays, reused once the
+            next batch is requested.
+        """
+        free = queue.Queue()
+        for _ in range(self.buffers):
+            free.put(np.empty((size,) + self.shape, dtype=np.uint8))
+        filled = queue.Queue()
+        stopped = threading.Event()
+        errors = deque(maxlen=20)
+
+        with subprocess.Popen(
+            self.command(),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0,
+        ) as process:
+            if control is not None:
+                control.attach(process)
+            stderr = threading.Thread(
+                target=lambda: errors.extend(process.stderr), daemon=True
+            )
+            stderr.start()
+            reader = threading.Thread(
+                target=self._read, args=(process.stdout, free, filled, stopped), daemon=True
+            )
+            reader.start()
+            previous = None
+            try:
+                while (item := filled.get()) is not None:
+                    if previous is not None:
+                        free.put(previous)
+                    buffer, count = item
+                    yield buffer[:count]
+                    previous = buffer
+                returncode = process.wait()
+                stderr.join()
+                if returncode != 0 and not (control is not None and control.cancelled):
+                    lines = [line.decode(errors="replace").strip() for line in errors]
+                    lines = [line for line in lines if line]
+                    raise ConversionError(lines[-1] if lines else "ffmpeg falhou")
+            finally:
+                stopped.set()
+                if process.poll() is None:
+                    process.kill()
+                reader.join()
+                if control is not None:
+                    control.detach(process)
+
+    def _read(self, stdout, free: queue.Queue, filled: queue.Queue, stopped: threading.Event):
+        try:
+            while not stopped.is_set():
+                try:
+                    buffer = free.get(timeout=0.2)
+                except queue.Empty:
+                    continue
+                count = _read_into(stdout, memoryview(buffer).cast("B")) // buffer[0].nbytes
+                if count:
+                    filled.put((buffer, count))
+                if count < len(buffer):
+                    break
+        finally:
+            filled.put(None)
+
+
+def _read_into(stream, view: memoryview) -> int:
+    # Lê até encher o buffer ou o pipe acabar; um frame incompleto no fim é descartado
+    offset = 0
+    while offset < len(view):
+        count = stream.readinto(view[offset:])
+        if not count:
+            break
+        offset += count
+    return offset
+
+
+class FrameFilter:
+    """
+    A `filters.FilterChain` compiled for frames of a known size and rate.
+
+    Every step works on whole (frames, height, width, 3) batches: the frame
+    rate change is an index selection, the crop a view, the scale a bilinear
+    interpolation with precomputed indices and 8-bit fixed-point weights, and
+    the watermark an alpha blend of the covered region. The scaled frames are
+    written into a preallocated output batch.
+    """
+
+    def __init__(self, chain: FilterChain, width: int, height: int, fps: float, batch: int):
+        """
+        Compiles `chain` for batches of up to `batch` frames of `width` x
+        `height` pixels at `fps`.
+
+        Raises:
+            ConversionError: If the crop doesn't fit in the frames.
+        """
+        chain.validate(width, height)
+        self.chain = chain
+        self.input_size = (width, height)
+        self.output_size = chain.output_size(width, height)
+        self.ratio = chain.fps / fps if chain.fps else 1.0
+        self.output_fps = chain.fps or fps
+        self._index = 0
+
+        crop = chain.crop or (width, height, 0, 0)
+        self._crop = (slice(crop[3], crop[3] + crop[1]), slice(crop[2], crop[2] + crop[0]))
+        out_width, out_height = self.output_size
+        self._rows = _bilinear_weights(crop[1], out_height)
+        self._columns = _bilinear_weights(crop[0], out_width)
+        self._scaled = (crop[0], crop[1]) != (out_width, out_height)
+
+        capacity = int(batch * max(self.ratio, 1.0)) + 1
+        self._output = np.empty((capacity, out_height, out_width, 3), dtype=np.uint8)
+        self._mark = self._load_watermark() if chain.watermark else None
+
+    def apply(self, frames, output=None):
+        """
+        Filters a batch of consecutive frames.
+
+        Args:
+            frames (numpy.ndarray): A (n, height, width, 3) uint8 batch.
+            output (numpy.ndarray | None): Where to write the filtered frames,
+            with room for as many frames as the filter's own buffer (e.g. a
+            slot of a `transport.FrameRing`). None uses that buffer.
+
+        Returns:
+            numpy.ndarray: The filtered batch, which may have a different number
+            of frames when the rate changes. It is only valid until the next call.
+        """
+        count = len(frames)
+        if self.ratio != 1.0:
+            # Quantos frames de saída cada frame de entrada gera (0, 1 ou mais)
+            positions = np.floor(np.arange(self._index, self._index + count + 1) * self.ratio)
+            repeats = np.diff(positions).astype(np.intp)
+            frames = frames[np.repeat(np.arange(count), repeats)]
+        self._index += count
+
+        frames = frames[:, self._crop[0], self._crop[1]]
+        output = (self._output if output is None else output)[: len(frames)]
+        if self._scaled:
+            self._scale(frames, output)
+        else:
+            output[...] = frames
+        if self._mark is not None:
+            self._blend(output)
+        return output
+
+    def _scale(self, frames, output):
+        y0, y1, wy = self._rows
+        x0, x1, wx = self._columns
+        # Interpolação em ponto fixo de 8 bits: cabe em uint16 sem estourar
+        top = frames[:, y0].astype(np.uint16)
+        top *= 256 - wy[:, None, None]
+        top += frames[:, y1] * wy[:, None, None]
+        top >>= 8
+        left = top[:, :, x0]
+        left *= 256 - wx[:, None]
+        left += top[:, :, x1] * wx[:, None]
+        left >>= 8
+        output[...] = left
+
+    def _blend(self, output):
+        rgb, alpha, (x, y) = self._mark
+        region = output[:, y : y + rgb.shape[0], x : x + rgb.shape[1]]
+        blended = region * (256 - alpha).astype(np.uint16)
+        blended += rgb
+        blended >>= 8
+        region[...] = blended
+
+    def _load_watermark(self):
+        from PIL import Image  # pylint: disable=C0415
+
+        out_width, out_height = self.output_size
+        margin = self.chain.margin
+        with Image.open(self.chain.watermark) as image:
+            mark = np.asarray(image.convert("RGBA"))
+        mark = mark[: out_height, : out_width]
+        height, width = mark.shape[:2]
+        column = {"left": margin, "right": out_width - width - margin}
+        row = {"top": margin, "bottom": out_height - height - margin}
+        if self.chain.position == "center":
+            x, y = (out_width - width) // 2, (out_height - height) // 2
+        else:
+            vertical, horizontal = self.chain.position.split("-")
+            x, y = column[horizontal], row[vertical]
+        x = min(max(x, 0), out_width - width)
+        y = min(max(y, 0), out_height - height)
+        alpha = mark[:, :, 3:].astype(np.uint16) * round(self.chain.opacity * 256) // 255
+        rgb = mark[:, :, :3].astype(np.uint16) * alpha
+        return rgb, alpha, (x, y)
+
+
+def _bilinear_weights(source: int, target: int):
+    # Centros dos pixels de saída mapeados na entrada, como o ffmpeg e o Pillow fazem
+    centers = (np.arange(target) + 0.5) * source / target - 0.5
+    centers = np.clip(centers, 0, source - 1)
+    lower = np.floor(centers).astype(np.intp)
+    upper = np.minimum(lower + 1, source - 1)
+    weights = np.round((centers - lower) * 256).astype(np.uint16)
+    return lower, upper, weights
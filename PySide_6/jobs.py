@@ -0,0 +1,216 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+# pylint: disable=C0115
+import getpass
+import time
+from dataclasses import asdict, dataclass, field, replace
+from pathlib import Path
+from typing import Any
+
+from filters import FilterChain
+from progress import Progress
+from scheduler import PRIORITY_BATCH
+from sizing import SizeTarget
+from utils import VIDEO_EXTENSIONS
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+@dataclass
+class OutputTarget:
+    """
+    One of the outputs of a multi-output conversion (see
+    `core.convert_outputs`): its format, path, encoder profile and filters.
+    """
+
+    selected_format: str
+    output_path: str
+    profile: str | None = None
+    filters: FilterChain | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            "format": self.selected_format,
+            "output_path": self.output_path,
+            "profile": self.profile,
+            "filters": self.filters.to_dict() if self.filters is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "OutputTarget":
+        filters = data.get("filters")
+        return cls(
+            data["format"],
+            data["output_path"],
+            data.get("profile"),
+            FilterChain.from_dict(filters) if filters else None,
+        )
+
+
+@dataclass(eq=False)
+class ConversionJob:
+    input_path: str
+    output_path: str
+    selected_format: str
+    profile: str | None = None
+    filters: FilterChain | None = None
+    status: str = PENDING
+    error: str | None = None
+    cancel_event: Any = field(default=None, repr=False)
+    job_id: int = 0
+    paused: bool = False
+    progress: Progress | None = field(default=None, repr=False)
+    priority: int = PRIORITY_BATCH
+    weight: float = 1.0
+    owner: str = field(default_factory=getpass.getuser)
+    duration: float | None = None
+    pixels: int | None = None
+    submitted_at: float = field(default_factory=time.time)
+    # Saídas extras, codificadas na mesma decodificação da saída principal
+    targets: list[OutputTarget] = field(default_factory=list)
+    # Tamanho máximo e/ou qualidade da saída principal (ver sizing.py)
+    target: SizeTarget | None = None
+
+    @property
+    def output_paths(self) -> list[str]:
+        return [self.output_path] + [target.output_path for target in self.targets]
+
+    def to_dict(self) -> dict:
+        """
+        Returns the job as plain JSON data, as exchanged with the job service
+        (see service.py).
+        """
+        return {
+            "id": self.job_id,
+            "input_path": self.input_path,
+            "output_path": self.output_path,
+            "format": self.selected_format,
+            "profile": self.profile,
+            "filters": self.filters.to_dict() if self.filters is not None else None,
+            "status": self.status,
+            "error": self.error,
+            "paused": self.paused,
+            "progress": asdict(self.progress) if self.progress is not None else None,
+            "priority": self.priority,
+            "weight": self.weight,
+            "owner": self.owner,
+            "duration": self.duration,
+            "pixels": self.pixels,
+            "submitted_at": self.submitted_at,
+            "targets": [target.to_dict() for target in self.targets],
+            "target": self.target.to_dict() if self.target is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ConversionJob":
+        filters = data.get("filters")
+        progress = data.get("progress")
+        target = data.get("target")
+        return cls(
+            data["input_path"],
+            data["output_path"],
+            data["format"],
+            data.get("profile"),
+            FilterChain.from_dict(filters) if filters is not None else None,
+            data.get("status", PENDING),
+            data.get("error"),
+            job_id=data.get("id", 0),
+            paused=data.get("paused", False),
+            progress=Progress(**progress) if progress is not None else None,
+            priority=data.get("priority", PRIORITY_BATCH),
+            weight=data.get("weight", 1.0),
+            owner=data.get("owner") or getpass.getuser(),
+            duration=data.get("duration"),
+            pixels=data.get("pixels"),
+            submitted_at=data.get("submitted_at") or time.time(),
+            targets=[OutputTarget.from_dict(item) for item in data.get("targets") or ()],
+            target=SizeTarget.from_dict(target) if target else None,
+        )
+
+
+def collect_inputs(paths) -> list[str]:
+    """
+    Expands a list of files and directories into the video files to convert.
+
+    Directories are scanned (not recursively) for files with one of the
+    VIDEO_EXTENSIONS.
+
+    Args:
+        paths (Iterable[str]): Files and/or directories.
+
+    Returns:
+        list[str]: The video files, in a stable order.
+    """
+    inputs = []
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            inputs += sorted(
+                str(child)
+                for child in path.iterdir()
+                if child.is_file() and child.suffix.lower() in VIDEO_EXTENSIONS
+            )
+        elif path.is_file():
+            inputs.append(str(path))
+    return inputs
+
+
+def output_path_for(input_path, output_dir, selected_format, taken=()) -> str:
+    """
+    Builds the output path of an input inside the output directory.
+
+    A numeric suffix is added when the name would overwrite the input itself or
+    a path already in `taken`.
+
+    Args:
+        input_path (str): The path to the input video file.
+        output_dir (str): The directory of the converted videos.
+        selected_format (str): The desired format for the output video.
+        taken (Collection[str]): Output paths already used by other jobs.
+
+    Returns:
+        str: The output path.
+    """
+    stem = Path(input_path).stem
+    extension = selected_format.lower()
+    output = Path(output_dir) / f"{stem}.{extension}"
+    counter = 1
+    while str(output) in taken or output.resolve() == Path(input_path).resolve():
+        output = Path(output_dir) / f"{stem}_{counter}.{extension}"
+        counter += 1
+    return str(output)
+
+
+def extra_targets(output_path, specs, filters=None) -> list[OutputTarget]:
+    """
+    Builds the extra outputs of a job, saved next to its main output: for
+    ``out.mp4``, a WEBM target becomes ``out.webm`` and a 640 pixels wide MP4
+    preview becomes ``out_640.mp4``.
+
+    Args:
+        output_path (str): The main output of the job.
+        specs (Iterable[tuple[str, str | None, int | None]]): The format,
+        profile and width (None keeps the main output's size) of each extra
+        output.
+        filters (FilterChain | None): The filters of the main output, also
+        applied to the extra outputs.
+
+    Returns:
+        list[OutputTarget]: The targets.
+    """
+    output = Path(output_path)
+    targets = []
+    for selected_format, profile, width in specs:
+        target_filters = filters
+        suffix = ""
+        if width:
+            target_filters = replace(filters or FilterChain(), width=width, height=None)
+            suffix = f"_{width}"
+        path = output.with_name(f"{output.stem}{suffix}.{selected_format.lower()}")
+        targets.append(OutputTarget(selected_format, str(path), profile, target_filters))
+    return targets
@@ -0,0 +1,125 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+# pylint: disable=C0115
+import json
+import os
+import shutil
+import threading
+from dataclasses import asdict
+from pathlib import Path
+
+from profiles import EncoderProfile
+
+JOURNAL_FILE = "journal.json"
+
+
+class JobJournal:
+    """
+    Persistent record of the segments of a conversion that are already encoded.
+
+    The journal lives in a hidden directory next to the output, together with
+    the encoded segments. A segment only counts as done once its file was
+    renamed into place and the journal rewritten (both atomically), so after
+    a crash a new process resumes from the segments that were committed and
+    re-encodes only the ones that were in flight. The journal is reset when
+    the input, the settings or the segment plan change.
+    """
+
+    def __init__(self, directory, settings: dict) -> None:
+        """
+        Initializes the journal. Nothing is written until `open` is called.
+
+        Args:
+            directory (str | Path): Where the journal and the segments are kept.
+            settings (dict): Identifies the conversion; a journal written with
+            different settings is discarded.
+        """
+        self.directory = Path(directory)
+        self.settings = settings
+        self._plan = {}
+        self._done: set[int] = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_job(
+        cls, input_path, output_path, selected_format, profile: EncoderProfile
+    ) -> "JobJournal":
+        """
+        Returns the journal of a conversion, keyed by its output path.
+
+        Args:
+            input_path (str): The path to the input video file.
+            output_path (str): The path where the converted video will be saved.
+            selected_format (str): The desired format for the output video.
+            profile (EncoderProfile): The encoder profile.
+
+        Returns:
+            JobJournal: The journal.
+        """
+        output = Path(output_path)
+        stat = Path(input_path).stat()
+        settings = {
+            "input": str(Path(input_path).resolve()),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "format": selected_format,
+            "profile": {k: v for k, v in asdict(profile).items() if k != "name"},
+        }
+        return cls(output.with_name(f".{output.name}.resume"), settings)
+
+    def open(self, ranges: list[tuple[int, int]]) -> int:
+        """
+        Loads the journal, or starts a new one when it doesn't match the job.
+
+        Args:
+            ranges (list[tuple[int, int]]): The segment plan.
+
+        Returns:
+            int: The number of segments already done.
+        """
+        expected = {"settings": self.settings, "ranges": [list(item) for item in ranges]}
+        try:
+            data = json.loads((self.directory / JOURNAL_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            data = {}
+        if {key: data.get(key) for key in expected} != expected:
+            self.discard()
+            data = {}
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._plan = expected
+        self._done = {
+            index
+            for index in data.get("done", [])
+            if isinstance(index, int) and self.segment_path(index).is_file()
+        }
+        self._write()
+        return len(self._done)
+
+    def segment_path(self, index: int) -> Path:
+        return self.directory / f"segment_{index:04d}.nut"
+
+    def is_done(self, index: int) -> bool:
+        return index in self._done
+
+    def commit(self, index: int, encoded_path):
+        """
+        Moves an encoded segment into place and records it as done.
+
+        Args:
+            index (int): The segment index.
+            encoded_path (str | Path): The finished segment file.
+        """
+        os.replace(encoded_path, self.segment_path(index))
+        with self._lock:
+            self._done.add(index)
+            self._write()
+
+    def discard(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self._done = set()
+
+    def _write(self):
+        data = {**self._plan, "done": sorted(self._done)}
+        temp = self.directory / f"{JOURNAL_FILE}.tmp"
+        temp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        os.replace(temp, self.directory / JOURNAL_FILE)
@@ -0,0 +1,164 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+# pylint: disable=C0115
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import psutil
+from engines import ConversionCancelled
+
+logger = logging.getLogger("video_manager.metrics")
+
+
+class ResourceSampler:
+    """
+    Samples the resident memory of this process and its children (the encoder
+    processes) from a background thread, keeping the peak.
+    """
+
+    def __init__(self, interval: float = 0.05) -> None:
+        self.interval = interval
+        self.peak_rss = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> "ResourceSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        process = psutil.Process()
+        while True:
+            rss = 0
+            for item in [process] + process.children(recursive=True):
+                try:
+                    rss += item.memory_info().rss
+                except psutil.Error:
+                    pass
+            self.peak_rss = max(self.peak_rss, rss)
+            if self._stopped.wait(self.interval):
+                return
+
+
+@dataclass
+class JobMetrics:
+    """
+    Per-stage timings and resource usage of one conversion.
+
+    The conversion path wraps each of its stages (cache lookup, probe, remux or
+    encode, concat, verification, cache store, final rename) in `stage`, so a
+    slow job shows where the time went. Stages inside a single ffmpeg process
+    (decoding, filtering, encoding, muxing) run concurrently there and are
+    reported together as the encode stage.
+    """
+
+    input_path: str = ""
+    output_path: str = ""
+    selected_format: str = ""
+    engine: str = ""
+    status: str = "running"
+    error: str | None = None
+    stages: dict[str, float] = field(default_factory=dict)
+    total: float = 0.0
+    input_bytes: int = 0
+    output_bytes: int = 0
+    peak_rss: int = 0
+    profile_dump: str | None = None
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Times a stage. A stage entered more than once accumulates its time.
+
+        Args:
+            name (str): The stage name.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    @contextmanager
+    def measure(self, profile_dir=None):
+        """
+        Measures the whole job: total time, peak memory and file sizes, and the
+        outcome. Optionally runs it under cProfile.
+
+        Args:
+            profile_dir (str | Path | None): When set, a cProfile dump of the
+            job (of the calling thread) is written to this directory.
+        """
+        profiler = cProfile.Profile() if profile_dir else None
+        started = time.perf_counter()
+        with ResourceSampler(interval=0.2) as sampler:
+            if profiler is not None:
+                profiler.enable()
+            try:
+                yield self
+                self.status = "done"
+            except BaseException as e:
+                self.status = "cancelled" if isinstance(e, ConversionCancelled) else "failed"
+                self.error = str(e) or type(e).__name__
+                raise
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                self.total = time.perf_counter() - started
+                self.peak_rss = sampler.peak_rss
+                self.input_bytes = _size(self.input_path)
+                self.output_bytes = _size(self.output_path)
+                if profiler is not None:
+                    self.profile_dump = str(self._dump(profiler, profile_dir))
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), sort_keys=True)
+
+    def emit(self, path=None):
+        """
+        Logs the record on the "video_manager.metrics" logger and, optionally,
+        appends it as a JSON line to a file.
+
+        Args:
+            path (str | Path | None): The JSON lines file.
+        """
+        record = self.to_json()
+        logger.info(record)
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as file:
+                file.write(record + "\n")
+
+    def _dump(self, profiler: cProfile.Profile, profile_dir) -> Path:
+        directory = Path(profile_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        dump = directory / f"{Path(self.input_path).stem}-{stamp}-{os.getpid()}.prof"
+        profiler.dump_stats(dump)
+        return dump
+
+
+def stage(metrics: JobMetrics | None, name: str):
+    """
+    Returns `metrics.stage(name)`, or a no-op context without metrics.
+    """
+    return metrics.stage(name) if metrics is not None else nullcontext()
+
+
+def _size(path) -> int:
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return 0
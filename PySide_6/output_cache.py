@@ -0,0 +1,234 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+# pylint: disable=C0115
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from contextlib import closing
+from dataclasses import asdict
+from pathlib import Path
+
+from profiles import EncoderProfile
+from utils import CONFIG_DIR, get_encoders
+
+OUTPUT_CACHE_DIR = CONFIG_DIR / "output_cache"
+HASH_CHUNK_SIZE = 16 * 1024 * 1024
+# ioctl do Linux que clona um arquivo por cópia na escrita (btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+
+def content_hash(input_path, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """
+    Hashes the content of a file with BLAKE2b.
+
+    The file is memory-mapped and fed to the hash in chunks, so even
+    multi-GB inputs are hashed without reading them into Python buffers.
+
+    Args:
+        input_path (str): The path to the file.
+        chunk_size (int): Bytes hashed per step.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(input_path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            return digest.hexdigest()
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                for start in range(0, size, chunk_size):
+                    digest.update(view[start : start + chunk_size])
+            finally:
+                view.release()
+    return digest.hexdigest()
+
+
+class OutputCache:
+    """
+    Content-addressed cache of converted videos.
+
+    The key combines the hash of the input content with the format, codec and
+    encoder profile, so the same source converted with the same settings is
+    served from the cache instead of being encoded again. Outputs are copied
+    in and out (see `_clone_or_copy`), never hardlinked, so editing an output
+    in place doesn't change the cached one. The total size is capped, evicting the least
+    recently used outputs first. Input hashes are memoized by path, size and
+    mtime, so unchanged files are hashed only once.
+    """
+
+    def __init__(self, directory=OUTPUT_CACHE_DIR, max_bytes: int = 20 * 1024**3) -> None:
+        """
+        Initializes the cache, creating its directory and index if needed.
+
+        Args:
+            directory (str | Path): Where the cached outputs are kept.
+            max_bytes (int): Maximum total size of the cached outputs.
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, file TEXT, size INTEGER, last_used REAL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS hashes ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, digest TEXT)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.directory / "index.sqlite3", timeout=30)
+
+    def input_hash(self, input_path) -> str:
+        """
+        Returns the content hash of an input, reusing the memoized one while the
+        file keeps the same size and mtime.
+
+        Args:
+            input_path (str): The path to the input video file.
+
+        Returns:
+            str: The hex digest.
+        """
+        path = Path(input_path).resolve()
+        stat = path.stat()
+        with closing(self._connect()) as connection, connection:
+            row = connection.execute(
+                "SELECT digest FROM hashes WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (str(path), stat.st_size, stat.st_mtime_ns),
+            ).fetchone()
+        if row is not None:
+            return row[0]
+        digest = content_hash(path)
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)",
+                (str(path), stat.st_size, stat.st_mtime_ns, digest),
+            )
+        return digest
+
+    def key_for(
+        self, input_path, selected_format, profile: EncoderProfile, filters=None
+    ) -> str:
+        """
+        Builds the cache key of a conversion.
+
+        Args:
+            input_path (str): The path to the input video file.
+            selected_format (str): The desired format for the output video.
+            profile (EncoderProfile): The encoder profile.
+            filters (FilterChain | None): The video filters.
+
+        Returns:
+            str: The key.
+        """
+        settings = {
+            "input": self.input_hash(input_path),
+            "format": selected_format,
+            "codec": get_encoders(selected_format),
+            "profile": {k: v for k, v in asdict(profile).items() if k != "name"},
+        }
+        if filters is not None and filters.active:
+            settings["filters"] = filters.to_dict()
+            if filters.watermark:
+                settings["watermark"] = self.input_hash(filters.watermark)
+        encoded = json.dumps(settings, sort_keys=True).encode()
+        return hashlib.blake2b(encoded, digest_size=20).hexdigest()
+
+    def fetch(self, key: str, output_path) -> bool:
+        """
+        Places the cached output of a key at `output_path`, if there is one.
+
+        Args:
+            key (str): The cache key.
+            output_path (str): Where to place the output. Must not exist yet.
+
+        Returns:
+            bool: True on a hit.
+        """
+        with closing(self._connect()) as connection, connection:
+            row = connection.execute(
+                "SELECT file FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return False
+            cached = self.directory / row[0]
+            try:
+                _clone_or_copy(cached, output_path)
+            except OSError:
+                connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return False
+            connection.execute(
+                "UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+        return True
+
+    def store(self, key: str, output_path):
+        """
+        Adds a freshly converted output to the cache and evicts old entries past
+        the size cap.
+
+        Args:
+            key (str): The cache key.
+            output_path (str): The converted video.
+
+        Raises:
+            OSError: If the output can't be copied into the cache.
+            sqlite3.Error: If the index can't be updated.
+        """
+        name = f"{key[:2]}/{key}{Path(output_path).suffix}"
+        cached = self.directory / name
+        cached.parent.mkdir(exist_ok=True)
+        cached.unlink(missing_ok=True)
+        try:
+            _clone_or_copy(output_path, cached)
+        except OSError:
+            cached.unlink(missing_ok=True)
+            raise
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                (key, name, cached.stat().st_size, time.time()),
+            )
+            self._evict(connection)
+
+    def clear(self):
+        with closing(self._connect()) as connection, connection:
+            for (name,) in connection.execute("SELECT file FROM entries").fetchall():
+                (self.directory / name).unlink(missing_ok=True)
+            connection.execute("DELETE FROM entries")
+
+    def _evict(self, connection: sqlite3.Connection):
+        rows = connection.execute(
+            "SELECT key, file, size FROM entries ORDER BY last_used DESC"
+        ).fetchall()
+        total = 0
+        for key, name, size in rows:
+            total += size
+            if total > self.max_bytes:
+                (self.directory / name).unlink(missing_ok=True)
+                connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+
+def _clone_or_copy(source, destination):
+    # Um reflink custa tanto quanto um hardlink, mas os dois arquivos deixam de
+    # compartilhar os blocos assim que um deles é alterado
+    if sys.platform.startswith("linux"):
+        import fcntl  # pylint: disable=C0415
+
+        with open(source, "rb") as reader, open(destination, "wb") as writer:
+            try:
+                fcntl.ioctl(writer.fileno(), FICLONE, reader.fileno())
+                return
+            except OSError:
+                pass
+    shutil.copyfile(source, destination)
@@ -0,0 +1,487 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+import json
+import re
+import shutil
+import sqlite3
+import subprocess
+import time
+from contextlib import closing
+from dataclasses import asdict, dataclass, field
+from fractions import Fraction
+from pathlib import Path
+
+from utils import CONFIG_DIR, STREAM_COPY_CODECS
+
+PROBE_CACHE_FILE = CONFIG_DIR / "probe_cache.sqlite3"
+
+
+def ffmpeg_binary() -> str:
+    """
+    Returns the path of the ffmpeg executable.
+
+    Uses the binary shipped with imageio-ffmpeg (the same one moviepy uses),
+    falling back to the ``ffmpeg`` found in the PATH.
+
+    Returns:
+        str: The ffmpeg executable.
+    """
+    try:
+        import imageio_ffmpeg  # pylint: disable=C0415
+
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        return shutil.which("ffmpeg") or "ffmpeg"
+
+
+def ffprobe_binary() -> str | None:
+    """
+    Returns the path of the ffprobe executable, if one is available.
+
+    Looks in the PATH first and then next to the ffmpeg executable.
+
+    Returns:
+        str | None: The ffprobe executable or None when it can't be found.
+    """
+    found = shutil.which("ffprobe")
+    if found:
+        return found
+    ffmpeg = Path(ffmpeg_binary())
+    sibling = ffmpeg.with_name(ffmpeg.name.replace("ffmpeg", "ffprobe"))
+    if sibling != ffmpeg and sibling.is_file():
+        return str(sibling)
+    return None
+
+
+@dataclass
+class MediaInfo:
+    """
+    Metadata of a media file, as reported by ffprobe (or ffmpeg).
+
+    `streams` keeps the stream entries in ffprobe's format (``codec_type``,
+    ``codec_name``, ``disposition``...), which `can_stream_copy` reads.
+    """
+
+    duration: float | None = None
+    width: int | None = None
+    height: int | None = None
+    fps: float | None = None
+    video_codec: str | None = None
+    audio_codec: str | None = None
+    bit_rate: int | None = None
+    streams: list[dict] = field(default_factory=list)
+
+    @property
+    def frame_count(self) -> int | None:
+        if self.duration is None or not self.fps:
+            return None
+        return round(self.duration * self.fps)
+
+    @property
+    def rate(self) -> str | None:
+        """
+        The frame rate as an exact fraction for ffmpeg's ``-r`` (e.g. 30000/1001).
+        """
+        if not self.fps:
+            return None
+        return str(Fraction(self.fps).limit_denominator(1001))
+
+    @property
+    def pixels(self) -> int:
+        return (self.width or 0) * (self.height or 0)
+
+    @classmethod
+    def from_ffprobe(cls, report: dict) -> "MediaInfo":
+        """
+        Builds the record from the JSON report of ``ffprobe -show_streams
+        -show_format``.
+
+        Args:
+            report (dict): The ffprobe report.
+
+        Returns:
+            MediaInfo: The metadata.
+        """
+        streams = report.get("streams", [])
+        info = cls(
+            duration=_to_float(report.get("format", {}).get("duration")),
+            bit_rate=_to_int(report.get("format", {}).get("bit_rate")),
+            streams=[_slim_stream(stream) for stream in streams],
+        )
+        for stream in streams:
+            if stream.get("codec_type") == "video" and info.video_codec is None:
+                if stream.get("disposition", {}).get("attached_pic"):
+                    continue
+                info.video_codec = stream.get("codec_name")
+                info.width = _to_int(stream.get("width"))
+                info.height = _to_int(stream.get("height"))
+                info.fps = _to_fraction(stream.get("avg_frame_rate"))
+            elif stream.get("codec_type") == "audio" and info.audio_codec is None:
+                info.audio_codec = stream.get("codec_name")
+        return info
+
+
+DURATION_REGEX = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+BITRATE_REGEX = re.compile(r"Duration: .*bitrate: (\d+) kb/s")
+STREAM_REGEX = re.compile(r"Stream #\d+:\d+.*?: (Video|Audio|Subtitle|Data): (\w+)(.*)")
+SIZE_REGEX = re.compile(r", (\d{2,5})x(\d{2,5})")
+FPS_REGEX = re.compile(r", (\d+(?:\.\d+)?) (?:fps|tbr)")
+
+
+def _slim_stream(stream: dict) -> dict:
+    # Só o que o cache precisa guardar de cada fluxo
+    slim = {key: stream.get(key) for key in ("index", "codec_type", "codec_name")}
+    if stream.get("disposition", {}).get("attached_pic"):
+        slim["disposition"] = {"attached_pic": 1}
+    return slim
+
+
+def _to_int(value) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_fraction(value) -> float | None:
+    try:
+        numerator, _, denominator = str(value).partition("/")
+        result = float(numerator) / float(denominator or 1)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    return result or None
+
+
+def _probe_ffprobe(input_path: str) -> MediaInfo | None:
+    ffprobe = ffprobe_binary()
+    if ffprobe is None:
+        return None
+    command = [
+        ffprobe,
+        "-v",
+        "error",
+        "-print_format",
+        "json",
+        "-show_streams",
+        "-show_format",
+        input_path,
+    ]
+    try:
+        result = subprocess.run(
+            command, capture_output=True, text=True, check=True, timeout=60
+        )
+        return MediaInfo.from_ffprobe(json.loads(result.stdout))
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return None
+
+
+def _probe_ffmpeg(input_path: str) -> MediaInfo | None:
+    # O imageio-ffmpeg não traz o ffprobe; nesse caso lemos o cabeçalho que o
+    # "ffmpeg -i" escreve no stderr, como o próprio moviepy faz
+    try:
+        result = subprocess.run(
+            [ffmpeg_binary(), "-hide_banner", "-i", input_path],
+            capture_output=True,
+            text=True,
+            errors="replace",
+            check=False,
+            timeout=60,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    info = MediaInfo()
+    for line in result.stderr.splitlines():
+        if match := DURATION_REGEX.search(line):
+            hours, minutes, seconds = match.groups()
+            info.duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+            if bitrate := BITRATE_REGEX.search(line):
+                info.bit_rate = int(bitrate.group(1)) * 1000
+        match = STREAM_REGEX.search(line)
+        if match is None:
+            continue
+        codec_type, codec_name, details = match.groups()
+        stream = {
+            "index": len(info.streams),
+            "codec_type": codec_type.lower(),
+            "codec_name": codec_name,
+        }
+        if "(attached pic)" in details:
+            stream["disposition"] = {"attached_pic": 1}
+        elif codec_type == "Video" and info.video_codec is None:
+            info.video_codec = codec_name
+            if size := SIZE_REGEX.search(details):
+                info.width, info.height = int(size.group(1)), int(size.group(2))
+            if fps := FPS_REGEX.search(details):
+                info.fps = float(fps.group(1))
+        elif codec_type == "Audio" and info.audio_codec is None:
+            info.audio_codec = codec_name
+        info.streams.append(stream)
+    return info if info.streams else None
+
+
+def probe_media(input_path: str) -> MediaInfo | None:
+    """
+    Inspects the streams and container of a media file, without the cache.
+
+    Uses ffprobe when available and falls back to parsing ``ffmpeg -i``.
+
+    Args:
+        input_path (str): The path to the media file.
+
+    Returns:
+        MediaInfo | None: The metadata, or None if the file can't be read.
+    """
+    return _probe_ffprobe(input_path) or _probe_ffmpeg(input_path)
+
+
+def keyframe_times(input_path: str) -> list[float] | None:
+    """
+    Lists the timestamps of the video keyframes. Only the keyframes are
+    decoded, so it is much faster than a full decode.
+
+    Args:
+        input_path (str): The path to the media file.
+
+    Returns:
+        list[float] | None: The timestamps in seconds, or None without ffprobe.
+    """
+    ffprobe = ffprobe_binary()
+    if ffprobe is None:
+        return None
+    command = [
+        ffprobe,
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-skip_frame",
+        "nokey",
+        "-show_entries",
+        "frame=pts_time",
+        "-of",
+        "csv=p=0",
+        input_path,
+    ]
+    try:
+        result = subprocess.run(
+            command, capture_output=True, text=True, check=True, timeout=600
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    times = (_to_float(line.strip().rstrip(",")) for line in result.stdout.splitlines())
+    return sorted(time for time in times if time is not None)
+
+
+def count_frames(input_path: str) -> int | None:
+    """
+    Counts the frames of the first video stream by demuxing it to the
+    framecrc muxer (one line per packet), without decoding. Empty packets,
+    which some containers use to repeat the previous frame, are not counted.
+
+    Args:
+        input_path (str): The path to the media file.
+
+    Returns:
+        int | None: The frame count, or None if ffmpeg fails.
+    """
+    command = [ffmpeg_binary(), "-v", "error", "-i", input_path]
+    command += ["-map", "0:V:0", "-c", "copy", "-f", "framecrc", "-"]
+    try:
+        with subprocess.Popen(
+            command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        ) as process:
+            frames = sum(
+                1
+                for line in process.stdout
+                if not line.startswith("#") and _to_int(line.split(",")[4]) != 0
+            )
+    except OSError:
+        return None
+    return frames if process.returncode == 0 else None
+
+
+class ProbeCache:
+    """
+    On-disk cache of `MediaInfo` records, stored in SQLite so the worker
+    processes of a batch can share it.
+
+    Entries are keyed by the absolute path and are only valid while the file
+    keeps the same size and modification time. The least recently used
+    entries are evicted once there are more than `max_entries`.
+    """
+
+    def __init__(self, path=PROBE_CACHE_FILE, max_entries: int = 10000) -> None:
+        """
+        Initializes the cache, creating its database if needed.
+
+        Args:
+            path (str | Path): The SQLite database file.
+            max_entries (int): Maximum number of records kept.
+        """
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS probes ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+                "data TEXT, last_used REAL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS probes_last_used ON probes (last_used)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, input_path) -> MediaInfo | None:
+        """
+        Returns the cached record of a file, if it is still valid.
+
+        Args:
+            input_path (str): The path to the media file.
+
+        Returns:
+            MediaInfo | None: The record, or None on a miss.
+        """
+        key, stat = _identity(input_path)
+        if stat is None:
+            return None
+        with closing(self._connect()) as connection, connection:
+            row = connection.execute(
+                "SELECT data FROM probes WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (key, stat.st_size, stat.st_mtime_ns),
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE probes SET last_used = ? WHERE path = ?", (time.time(), key)
+            )
+        data = json.loads(row[0])
+        return MediaInfo(**data)
+
+    def put(self, input_path, info: MediaInfo):
+        """
+        Stores the record of a file, replacing an outdated one.
+
+        Args:
+            input_path (str): The path to the media file.
+            info (MediaInfo): Its metadata.
+        """
+        key, stat = _identity(input_path)
+        if stat is None:
+            return
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?)",
+                (
+                    key,
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    json.dumps(asdict(info)),
+                    time.time(),
+                ),
+            )
+            connection.execute(
+                "DELETE FROM probes WHERE path IN (SELECT path FROM probes "
+                "ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def invalidate(self, input_path):
+        key, _ = _identity(input_path)
+        with closing(self._connect()) as connection, connection:
+            connection.execute("DELETE FROM probes WHERE path = ?", (key,))
+
+    def clear(self):
+        with closing(self._connect()) as connection, connection:
+            connection.execute("DELETE FROM probes")
+
+
+def _identity(input_path):
+    path = Path(input_path).resolve()
+    try:
+        return str(path), path.stat()
+    except OSError:
+        return str(path), None
+
+
+_default_cache: ProbeCache | None = None
+
+
+def probe(input_path: str, cache: ProbeCache | None = None) -> MediaInfo | None:
+    """
+    Returns the metadata of a media file, probing it only on a cache miss.
+
+    Args:
+        input_path (str): The path to the media file.
+        cache (ProbeCache | None): The cache to use. Defaults to the user's
+        cache in CONFIG_DIR.
+
+    Returns:
+        MediaInfo | None: The metadata, or None if the file can't be read.
+    """
+    global _default_cache  # pylint: disable=W0603
+    # O cache só economiza tempo: sem ele (CONFIG_DIR inacessível, banco
+    # corrompido) o arquivo é analisado de novo
+    if cache is None:
+        if _default_cache is None:
+            try:
+                _default_cache = ProbeCache()
+            except (OSError, sqlite3.Error):
+                return probe_media(input_path)
+        cache = _default_cache
+    try:
+        info = cache.get(input_path)
+    except (OSError, sqlite3.Error):
+        return probe_media(input_path)
+    if info is None:
+        info = probe_media(input_path)
+        if info is not None:
+            try:
+                cache.put(input_path, info)
+            except (OSError, sqlite3.Error):
+                pass
+    return info
+
+
+def can_stream_copy(streams: list[dict] | None, selected_format: str) -> bool:
+    """
+    Checks whether the streams can be remuxed into the selected format without
+    re-encoding.
+
+    Every video and audio stream must use a codec accepted by the target
+    container, and there must be at least one video stream. Other streams
+    (subtitles, data) are ignored, since the remux doesn't map them.
+
+    Args:
+        streams (list[dict] | None): The streams of a `MediaInfo`.
+        selected_format (str): The desired output format (a key of CODECS).
+
+    Returns:
+        bool: True if a stream copy is enough, False otherwise.
+    """
+    if not streams or selected_format not in STREAM_COPY_CODECS:
+        return False
+    video_codecs, audio_codecs = STREAM_COPY_CODECS[selected_format]
+    has_video = False
+    for stream in streams:
+        codec_type = stream.get("codec_type")
+        codec_name = stream.get("codec_name")
+        if codec_type == "video":
+            # Capas (attached_pic) não são fluxos de vídeo de verdade
+            if stream.get("disposition", {}).get("attached_pic"):
+                continue
+            if codec_name not in video_codecs:
+                return False
+            has_video = True
+        elif codec_type == "audio" and codec_name not in audio_codecs:
+            return False
+    return has_video
@@ -0,0 +1,202 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+# pylint: disable=C0115
+import json
+from dataclasses import asdict, dataclass, fields
+
+from utils import CONFIG_DIR
+
+PROFILES_FILE = CONFIG_DIR / "profiles.json"
+
+X264_CODECS = ("libx264", "libx265")
+VPX_CODECS = ("libvpx", "libvpx-vp9")
+# Codecs com uma segunda passada confiável no ffmpeg
+TWO_PASS_CODECS = X264_CODECS + VPX_CODECS
+
+
+@dataclass
+class EncoderProfile:
+    """
+    Encoder settings that trade speed for size and quality.
+
+    Each codec family reads only the fields it understands: x264/x265 use
+    `preset` and `crf`, libvpx uses `deadline`, `cpu_used` and `crf`, and
+    the older MPEG-style codecs use `qscale`. A `bitrate` overrides the
+    quality settings of every codec, and with `passes` set to 2 the ffmpeg
+    engine analyses the video first to spend that bitrate where it is needed
+    (only for the TWO_PASS_CODECS; the others ignore it).
+    `maxrate` and `bufsize` cap its peaks (the rate control buffer).
+
+    Inputs whose streams fit the output format are remuxed instead of encoded,
+    unless the profile sets a bitrate or turns `stream_copy` off.
+    """
+
+    name: str
+    preset: str = "medium"
+    crf: int = 23
+    deadline: str = "good"
+    cpu_used: int = 4
+    qscale: int = 5
+    bitrate: str | None = None
+    maxrate: str | None = None
+    bufsize: str | None = None
+    passes: int = 1
+    threads: int | None = None
+    audio_bitrate: str | None = "128k"
+    stream_copy: bool = True
+
+    @property
+    def allows_stream_copy(self) -> bool:
+        return self.bitrate is None and self.stream_copy
+
+    def ffmpeg_args(self, codec: str) -> list[str]:
+        """
+        Returns the encoder arguments of the profile for ffmpeg's command line.
+
+        Args:
+            codec (str): The video codec (second item of a CODECS entry).
+
+        Returns:
+            list[str]: The arguments, to be placed after ``-c:v codec``.
+        """
+        return self.video_args(codec) + self.audio_args()
+
+    def video_args(self, codec: str) -> list[str]:
+        """
+        Returns only the video encoder arguments of the profile (see `ffmpeg_args`).
+
+        Args:
+            codec (str): The video codec (second item of a CODECS entry).
+
+        Returns:
+            list[str]: The arguments.
+        """
+        args = []
+        if codec in X264_CODECS:
+            args += ["-preset", self.preset]
+            if self.bitrate is None:
+                args += ["-crf", str(self.crf)]
+        elif codec in VPX_CODECS:
+            args += ["-deadline", self.deadline, "-cpu-used", str(self.cpu_used)]
+            if self.bitrate is None:
+                # O VP8 só respeita o CRF com um teto de bitrate; o VP9 aceita 0
+                ceiling = "10M" if codec == "libvpx" else "0"
+                args += ["-crf", str(self.crf), "-b:v", ceiling]
+        elif self.bitrate is None:
+            args += ["-q:v", str(self.qscale)]
+        if self.bitrate is not None:
+            args += ["-b:v", self.bitrate]
+        if self.maxrate is not None:
+            args += ["-maxrate", self.maxrate, "-bufsize", self.bufsize or self.maxrate]
+        if self.threads:
+            args += ["-threads", str(self.threads)]
+        return args
+
+    def audio_args(self) -> list[str]:
+        return ["-b:a", self.audio_bitrate] if self.audio_bitrate else []
+
+
+BUILTIN_PROFILES = {
+    "fastest": EncoderProfile(
+        "fastest",
+        preset="ultrafast",
+        crf=28,
+        deadline="realtime",
+        cpu_used=8,
+        qscale=8,
+        audio_bitrate="96k",
+    ),
+    "balanced": EncoderProfile("balanced"),
+    "archive": EncoderProfile(
+        "archive",
+        preset="slow",
+        crf=18,
+        deadline="good",
+        cpu_used=1,
+        qscale=2,
+        audio_bitrate="192k",
+    ),
+}
+DEFAULT_PROFILE = "balanced"
+
+
+def _read_file() -> dict:
+    try:
+        return json.loads(PROFILES_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_file(data: dict):
+    PROFILES_FILE.parent.mkdir(parents=True, exist_ok=True)
+    temp = PROFILES_FILE.with_suffix(".tmp")
+    temp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    temp.replace(PROFILES_FILE)
+
+
+def load_profiles() -> dict[str, EncoderProfile]:
+    """
+    Returns the built-in profiles plus the ones saved by the user, which may
+    override a built-in profile with the same name.
+
+    Returns:
+        dict[str, EncoderProfile]: The profiles by name.
+    """
+    profiles = dict(BUILTIN_PROFILES)
+    known = {item.name for item in fields(EncoderProfile)}
+    for data in _read_file().get("profiles", []):
+        try:
+            profile = EncoderProfile(**{k: v for k, v in data.items() if k in known})
+        except TypeError:
+            continue
+        profiles[profile.name] = profile
+    return profiles
+
+
+def get_profile(profile=None) -> EncoderProfile:
+    """
+    Resolves a profile by name.
+
+    Args:
+        profile (str | EncoderProfile | None): The profile or its name. None
+        means the default profile chosen by the user.
+
+    Raises:
+        KeyError: If there is no profile with that name.
+
+    Returns:
+        EncoderProfile: The profile.
+    """
+    if isinstance(profile, EncoderProfile):
+        return profile
+    return load_profiles()[profile or default_profile_name()]
+
+
+def save_profile(profile: EncoderProfile):
+    """
+    Saves (or replaces) a user profile.
+
+    Args:
+        profile (EncoderProfile): The profile to save.
+    """
+    data = _read_file()
+    saved = [item for item in data.get("profiles", []) if item.get("name") != profile.name]
+    data["profiles"] = saved + [asdict(profile)]
+    _write_file(data)
+
+
+def default_profile_name() -> str:
+    name = _read_file().get("default", DEFAULT_PROFILE)
+    return name if name in load_profiles() else DEFAULT_PROFILE
+
+
+def set_default_profile(name: str):
+    """
+    Remembers the profile used when none is given.
+
+    Args:
+        name (str): The profile name.
+    """
+    data = _read_file()
+    data["default"] = name
+    _write_file(data)
@@ -0,0 +1,181 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+# pylint: disable=C0115
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+
+@dataclass
+class Progress:
+    frames: int = 0
+    percent: float | None = None
+    fps: float | None = None
+    speed: float | None = None
+    eta: float | None = None
+    output_bytes: int = 0
+    elapsed: float = 0.0
+    done: bool = False
+
+    def describe(self) -> str:
+        """
+        Formats the event for the status bar or the terminal.
+
+        Returns:
+            str: Something like "42% | 120 fps | 3.1x | ETA 01:23".
+        """
+        if self.percent is not None:
+            parts = [f"{self.percent:.0f}%"]
+        else:
+            parts = [f"{self.frames} frames"]
+        if self.fps:
+            parts.append(f"{self.fps:.0f} fps")
+        if self.speed:
+            parts.append(f"{self.speed:.1f}x")
+        if self.eta is not None:
+            minutes, seconds = divmod(int(self.eta), 60)
+            parts.append(f"ETA {minutes:02d}:{seconds:02d}")
+        return " | ".join(parts)
+
+
+class ProgressTracker:
+    """
+    Turns the raw counters reported by an engine into `Progress` events.
+
+    Events are throttled to one every `interval` seconds, so a fast encoder
+    calling `update` for every frame never waits on the consumer (a Qt signal,
+    a terminal). The final event, with `done` set, is always delivered.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[Progress], None],
+        duration: float | None = None,
+        output_path: str | None = None,
+        interval: float = 0.5,
+    ) -> None:
+        """
+        Initializes the tracker.
+
+        Args:
+            callback (Callable[[Progress], None]): Receives the events.
+            duration (float | None): Duration of the input, in seconds. Without
+            it the percentage and the ETA are unknown.
+            output_path (str | None): File being written, used for the output size
+            when the engine doesn't report it.
+            interval (float): Minimum time, in seconds, between two events.
+        """
+        self.callback = callback
+        self.duration = duration
+        self.output_path = output_path
+        self.interval = interval
+        self.started = time.monotonic()
+        self._last_emit = 0.0
+        self._frames = 0
+
+    def update(
+        self,
+        frames: int = 0,
+        out_time: float | None = None,
+        output_bytes: int | None = None,
+        speed: float | None = None,
+        done: bool = False,
+    ):
+        """
+        Reports the engine's counters. Cheap to call when the event is throttled.
+
+        Args:
+            frames (int): Frames encoded so far.
+            out_time (float | None): Media time, in seconds, encoded so far.
+            output_bytes (int | None): Size of the output so far.
+            speed (float | None): Encode speed as a multiple of real time.
+            done (bool): Whether the encode has finished.
+        """
+        frames = self._frames = frames or self._frames
+        now = time.monotonic()
+        if not done and now - self._last_emit < self.interval:
+            return
+        self._last_emit = now
+        elapsed = now - self.started
+
+        percent = eta = None
+        if done:
+            percent, eta = 100.0, 0.0
+        elif self.duration and out_time is not None:
+            fraction = min(max(out_time / self.duration, 0.0), 1.0)
+            percent = fraction * 100
+            if fraction > 0:
+                eta = elapsed * (1 - fraction) / fraction
+        if speed is None and out_time is not None and elapsed > 0:
+            speed = out_time / elapsed
+        if output_bytes is None:
+            output_bytes = self._output_size()
+
+        self.callback(
+            Progress(
+                frames=frames,
+                percent=percent,
+                fps=frames / elapsed if elapsed > 0 else None,
+                speed=speed,
+                eta=eta,
+                output_bytes=output_bytes,
+                elapsed=elapsed,
+                done=done,
+            )
+        )
+
+    def _output_size(self) -> int:
+        if self.output_path is None:
+            return 0
+        try:
+            return os.path.getsize(self.output_path)
+        except OSError:
+            return 0
+
+
+def parse_ffmpeg_progress(
+    lines, tracker: ProgressTracker, stopped: Callable[[], bool] | None = None
+):
+    """
+    Feeds the tracker with the ``-progress`` output of ffmpeg.
+
+    ffmpeg writes blocks of ``key=value`` lines, each one ending with
+    ``progress=continue`` (or ``progress=end`` for the last one).
+
+    Args:
+        lines (Iterable[str]): The lines of the progress stream.
+        tracker (ProgressTracker): The tracker to update.
+        stopped (Callable[[], bool] | None): Once it returns True the remaining
+        lines are drained without reporting, so a killed encoder doesn't
+        produce a final "done" event.
+    """
+    block = {}
+    for line in lines:
+        key, _, value = line.strip().partition("=")
+        if key != "progress":
+            block[key] = value
+            continue
+        if stopped is not None and stopped():
+            continue
+        tracker.update(
+            frames=_to_number(block.get("frame"), int) or 0,
+            out_time=_out_time(block),
+            output_bytes=_to_number(block.get("total_size"), int),
+            speed=_to_number(block.get("speed", "").rstrip("x"), float),
+            done=value == "end",
+        )
+        block = {}
+
+
+def _out_time(block: dict) -> float | None:
+    # out_time_us é o campo correto; out_time_ms também vem em microssegundos
+    micros = _to_number(block.get("out_time_us") or block.get("out_time_ms"), int)
+    return micros / 1_000_000 if micros is not None and micros >= 0 else None
+
+
+def _to_number(value, kind):
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,179 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+# pylint: disable=C0115
+import math
+import time
+from collections import defaultdict
+
+PRIORITY_BATCH = 0
+PRIORITY_INTERACTIVE = 10
+BACKGROUND_WEIGHT = 0.5
+POLICIES = ("sjf", "fair", "fifo")
+# Acima disso (1080p) um job conta como alta resolução
+HIGH_RES_PIXELS = 1920 * 1080
+# Custo (segundos x pixels) assumido quando a entrada não pôde ser analisada
+DEFAULT_COST = 60.0 * 1280 * 720
+# Cada AGING_SECONDS de espera dividem o custo efetivo de um job, o que
+# adianta os grandes, mas não os livra de uma fila que nunca esvazia
+AGING_SECONDS = 600.0
+# Espera máxima: depois dela o job passa à frente dos outros, por ordem de envio
+MAX_WAIT_SECONDS = 3600.0
+
+
+def estimate_cost(job) -> None:
+    """
+    Fills the duration and the frame size of a job from its input, used to
+    estimate how much work it is. Inputs that can't be probed keep them unset.
+
+    Args:
+        job (ConversionJob): The job.
+    """
+    # Importado aqui: o probe traz o sqlite3 e o subprocess para quem só
+    # precisa das constantes deste módulo, como a interface gráfica
+    from probe import probe  # pylint: disable=C0415
+
+    info = probe(job.input_path)
+    if info is not None:
+        job.duration = info.duration
+        job.pixels = info.pixels or None
+
+
+def job_cost(job) -> float:
+    """
+    Returns the estimated work of a job: its duration times its frame size.
+    """
+    if not job.duration or not job.pixels:
+        return DEFAULT_COST
+    return job.duration * job.pixels
+
+
+def niceness_for_weight(weight: float) -> int:
+    """
+    Converts a relative CPU weight (1.0 is a normal job) into a process
+    niceness. The kernel gives each niceness step about 1.25 times less CPU
+    than the previous one. Weights above 1 would need privileges to raise the
+    priority, so they count as normal.
+
+    Args:
+        weight (float): The CPU weight.
+
+    Returns:
+        int: The niceness, from 0 to 19.
+    """
+    if weight >= 1:
+        return 0
+    return min(19, round(-math.log(max(weight, 1e-3), 1.25)))
+
+
+class JobScheduler:
+    """
+    Chooses the next job to run among the pending ones.
+
+    Jobs with a higher `priority` always go first. Among jobs of the same
+    priority the policy decides:
+
+    - "sjf" (shortest job first) runs the job with the least estimated work
+      (duration times frame size), so short clips don't wait behind a huge
+      file. The estimate of a waiting job shrinks as it ages, so large jobs
+      still run eventually;
+    - "fair" shares the workers between the job owners (users or clients),
+      running next the job of the owner that was served the least work;
+    - "fifo" keeps the submission order.
+
+    A job that waited MAX_WAIT_SECONDS goes ahead of every other (the oldest
+    first), whatever its priority and the policy, so a steady stream of
+    short or higher priority jobs can't starve it. Interactive jobs still have
+    their reserved slots.
+
+    At most `workers` jobs run at a time, plus `reserved` extra slots that
+    only interactive jobs (priority of at least PRIORITY_INTERACTIVE) may use,
+    so a conversion started from the window doesn't wait for a batch to
+    finish. High resolution jobs are limited to `max_high_res` at a time, which
+    bounds the memory of the decoders and frame buffers.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        policy: str = "sjf",
+        max_high_res: int = 1,
+        high_res_pixels: int = HIGH_RES_PIXELS,
+        reserved: int = 0,
+    ) -> None:
+        """
+        Initializes the scheduler.
+
+        Args:
+            workers (int): Jobs that may run at a time.
+            policy (str): One of POLICIES.
+            max_high_res (int): High resolution jobs that may run at a time.
+            high_res_pixels (int): Frame size above which a job is high resolution.
+            reserved (int): Extra slots for interactive jobs.
+
+        Raises:
+            ValueError: If the policy is unknown.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"política desconhecida: {policy}")
+        self.workers = workers
+        self.policy = policy
+        self.max_high_res = max(1, max_high_res)
+        self.high_res_pixels = high_res_pixels
+        self.reserved = reserved
+        self._served: dict[str, float] = defaultdict(float)
+
+    @property
+    def capacity(self) -> int:
+        """
+        The most jobs that may ever run at a time, to size the worker pool.
+        """
+        return self.workers + self.reserved
+
+    def is_high_res(self, job) -> bool:
+        return (job.pixels or 0) > self.high_res_pixels
+
+    def pick(self, pending, running):
+        """
+        Chooses the next job to start.
+
+        Args:
+            pending (Iterable[ConversionJob]): The jobs waiting to run. Paused
+            jobs are skipped.
+            running (Collection[ConversionJob]): The jobs running now.
+
+        Returns:
+            ConversionJob | None: The job to start, or None if no job can start
+            now.
+        """
+        candidates = [job for job in pending if not job.paused and self._fits(job, running)]
+        if not candidates:
+            return None
+        now = time.time()
+
+        def key(job):
+            waited = max(now - job.submitted_at, 0.0)
+            if waited >= MAX_WAIT_SECONDS:
+                return (0, 0, job.submitted_at)
+            if self.policy == "sjf":
+                return (1, -job.priority, job_cost(job) / (1 + waited / AGING_SECONDS))
+            if self.policy == "fair":
+                return (1, -job.priority, self._served[job.owner], job.submitted_at)
+            return (1, -job.priority, job.submitted_at)
+
+        return min(candidates, key=key)
+
+    def started(self, job):
+        """
+        Records that a job started, charging its work to its owner.
+        """
+        self._served[job.owner] += job_cost(job)
+
+    def _fits(self, job, running) -> bool:
+        slots = self.workers
+        if job.priority >= PRIORITY_INTERACTIVE:
+            slots += self.reserved
+        if len(running) >= slots:
+            return False
+        if self.is_high_res(job):
+            return sum(self.is_high_res(other) for other in running) < self.max_high_res
+        return True
@@ -0,0 +1,307 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+import math
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from control import ConversionControl
+from engines import ConversionCancelled, ConversionError, FFmpegEngine
+from journal import JobJournal
+from metrics import JobMetrics, stage
+from probe import MediaInfo, count_frames, ffmpeg_binary, keyframe_times, probe_media
+from progress import ProgressTracker
+
+MIN_SEGMENT_SECONDS = 10.0
+CHECKPOINT_SECONDS = 60.0
+
+
+def plan_segments(
+    info: MediaInfo, segments: int, keyframes: list[float] | None = None
+) -> list[tuple[int, int]]:
+    """
+    Splits the frames of a video into consecutive ranges of similar length.
+
+    The cut points are moved to the nearest keyframe when the keyframes are
+    known, so each segment starts decoding right where it begins, and are always
+    aligned to whole frames. Segments shorter than MIN_SEGMENT_SECONDS are
+    merged with their neighbours.
+
+    Args:
+        info (MediaInfo): The probed input. Must have a duration and a frame rate.
+        segments (int): The desired number of segments.
+        keyframes (list[float] | None): Keyframe timestamps, in seconds.
+
+    Returns:
+        list[tuple[int, int]]: The (first frame, frame count) of each segment.
+    """
+    total = info.frame_count
+    segments = max(1, min(segments, int(info.duration // MIN_SEGMENT_SECONDS)))
+    cuts = {0, total}
+    offset = keyframes[0] if keyframes else 0.0
+    for index in range(1, segments):
+        target = info.duration * index / segments
+        if keyframes:
+            target = min(keyframes, key=lambda time: abs(time - offset - target)) - offset
+        cuts.add(min(max(round(target * info.fps), 0), total))
+
+    bounds = sorted(cuts)
+    ranges = []
+    min_frames = MIN_SEGMENT_SECONDS * info.fps / 2
+    for start, end in zip(bounds, bounds[1:]):
+        if ranges and (end - start < min_frames or ranges[-1][1] < min_frames):
+            start = ranges.pop()[0]
+        ranges.append((start, end - start))
+    return ranges
+
+
+class SegmentedEncoder:
+    """
+    Encodes a video as several independent segments in parallel, then joins
+    them without re-encoding.
+
+    The video is split at keyframes (or whole frames when they are unknown) and
+    each segment is encoded by its own ffmpeg process with a share of the
+    cores, which keeps every core busy even with encoders that scale poorly
+    with threads. The segments are concatenated with stream copy and the
+    audio, encoded once from the input, is muxed with them. The result is
+    checked against the input duration and frame count.
+
+    With a `JobJournal` the video is split into segments of about
+    CHECKPOINT_SECONDS, still encoded `segments` at a time, and each finished
+    segment is committed to the journal, so an interrupted conversion resumes
+    from the last committed segments.
+    """
+
+    def __init__(self, engine: FFmpegEngine, segments: int | None = None) -> None:
+        """
+        Initializes the encoder.
+
+        Args:
+            engine (FFmpegEngine): Provides the codec, profile and muxer settings.
+            segments (int | None): Number of segments encoded at the same time.
+            None uses one per core.
+        """
+        self.engine = engine
+        self.segments = segments or os.cpu_count() or 1
+
+    def plan(
+        self, input_path, info: MediaInfo, checkpoints: bool = False
+    ) -> list[tuple[int, int]]:
+        """
+        Plans the segments of an input (see `plan_segments`).
+
+        Args:
+            input_path (str): The path to the input video file.
+            info (MediaInfo): The probed input.
+            checkpoints (bool): Whether to split at least every CHECKPOINT_SECONDS.
+
+        Returns:
+            list[tuple[int, int]]: The (first frame, frame count) of each segment.
+        """
+        if info is None or not info.duration or not info.fps:
+            return []
+        count = self.segments
+        if checkpoints:
+            count = max(count, math.ceil(info.duration / CHECKPOINT_SECONDS))
+        if info.duration < 2 * MIN_SEGMENT_SECONDS or count < 2:
+            return [(0, info.frame_count)]
+        return plan_segments(info, count, keyframe_times(input_path))
+
+    def convert(
+        self,
+        selected_format,
+        input_path,
+        output_path,
+        info: MediaInfo,
+        progress: ProgressTracker | None = None,
+        control: ConversionControl | None = None,
+        journal: JobJournal | None = None,
+        metrics: JobMetrics | None = None,
+    ):
+        """
+        Converts the input with segment-parallel encoding.
+
+        Args:
+            selected_format (str): The desired format for the output video.
+            input_path (str): The path to the input video file.
+            output_path (str): The path where the converted video will be saved.
+            info (MediaInfo): The probed input.
+            progress (ProgressTracker | None): Receives the combined progress.
+            control (ConversionControl | None): Cancels, pauses or resumes all the
+            segment encoders. It is cancelled when one of them fails.
+            journal (JobJournal | None): Keeps the finished segments across
+            crashes. It is discarded once the output is written, the
+            conversion is cancelled or the segments fail to join.
+            metrics (JobMetrics | None): Receives the time spent planning,
+            encoding, joining and verifying.
+
+        Raises:
+            ConversionCancelled: If the conversion is cancelled.
+            ConversionError: If a segment fails or the output doesn't match the input.
+
+        Returns:
+            None
+        """
+        with stage(metrics, "plan"):
+            ranges = self.plan(input_path, info, checkpoints=journal is not None)
+        if len(ranges) < 2:
+            with stage(metrics, "encode"):
+                self.engine.convert(
+                    selected_format, input_path, output_path, progress, control
+                )
+            return
+        control = control or ConversionControl()
+        if journal is None:
+            directory = Path(output_path).parent
+            with tempfile.TemporaryDirectory(dir=directory, prefix=".segments-") as work:
+                paths = [Path(work) / f"segment_{index:04d}.nut" for index in range(len(ranges))]
+                with stage(metrics, "encode"):
+                    self._encode_all(
+                        selected_format, input_path, info, ranges, paths, progress, control
+                    )
+                self._join(
+                    selected_format, input_path, output_path, info, paths, control, metrics
+                )
+        else:
+            journal.open(ranges)
+            paths = [journal.segment_path(index) for index in range(len(ranges))]
+            try:
+                with stage(metrics, "encode"):
+                    self._encode_all(
+                        selected_format,
+                        input_path,
+                        info,
+                        ranges,
+                        paths,
+                        progress,
+                        control,
+                        journal,
+                    )
+            except ConversionCancelled:
+                journal.discard()
+                raise
+            try:
+                self._join(
+                    selected_format, input_path, output_path, info, paths, control, metrics
+                )
+            except ConversionError:
+                # Segmentos que não se juntam (ou não batem com a entrada)
+                # falhariam de novo ao retomar: a próxima vez recomeça do zero
+                journal.discard()
+                raise
+            journal.discard()
+        if progress is not None:
+            progress.update(frames=info.frame_count, done=True)
+
+    def _join(
+        self, selected_format, input_path, output_path, info, paths, control, metrics=None
+    ):
+        listing = paths[0].parent / "segments.txt"
+        listing.write_text(
+            "".join(f"file '{path.name}'\n" for path in paths), encoding="utf-8"
+        )
+        command = [ffmpeg_binary(), "-y", "-v", "error"]
+        command += ["-f", "concat", "-safe", "0", "-i", str(listing)]
+        command += ["-i", input_path, "-map", "0:v", "-map", "1:a?", "-c:v", "copy"]
+        # Mantém a base de tempo do vídeo; sem isso o AVI, que é CFR, ganha
+        # frames vazios entre os copiados
+        command += ["-r", info.rate]
+        command += self.engine.audio_args(selected_format)
+        command += self.engine.muxer_args(selected_format, output_path)
+        with stage(metrics, "concat"):
+            self.engine.run_command(command, control=control)
+        with stage(metrics, "verify"):
+            self.verify(input_path, output_path, info)
+
+    def _encode_all(
+        self, selected_format, input_path, info, ranges, paths, progress, control, journal=None
+    ):
+        workers = min(self.segments, len(ranges))
+        threads = self.engine.threads or max(1, (os.cpu_count() or 1) // workers)
+        done = [(0, 0.0)] * len(ranges)
+        lock = threading.Lock()
+        pending = []
+        for index, (_, count) in enumerate(ranges):
+            if journal is not None and journal.is_done(index):
+                # Segmentos retomados contam no percentual, mas não no fps
+                done[index] = (0, count / info.fps)
+            else:
+                pending.append(index)
+
+        def report(index):
+            def callback(event):
+                with lock:
+                    done[index] = (event.frames, event.frames / info.fps)
+                    if progress is not None:
+                        progress.update(
+                            frames=sum(frames for frames, _ in done),
+                            out_time=sum(seconds for _, seconds in done),
+                        )
+
+            return ProgressTracker(callback, interval=0)
+
+        def encode(index):
+            start, count = ranges[index]
+            command = [ffmpeg_binary(), "-y", "-v", "error"]
+            # A busca precisa descarta os frames antes do instante pedido. Os
+            # timestamps podem começar um pouco depois de zero, então a busca
+            # fica logo antes do frame, e não meio frame antes
+            seek = max(start - 0.01, 0) / info.fps
+            command += ["-ss", f"{seek:.6f}", "-i", input_path]
+            command += ["-map", "0:V:0", "-an", "-sn", "-fps_mode", "passthrough"]
+            if index < len(ranges) - 1:
+                # O último segmento vai até o fim, pois a duração do contêiner
+                # pode arredondar para um frame a mais
+                command += ["-frames:v", str(count)]
+            command += self.engine.video_args(selected_format, threads)
+            target = paths[index]
+            if journal is not None:
+                target = target.with_name(f"{target.name}.part")
+            command += ["-f", "nut", str(target)]
+            try:
+                self.engine.run_command(command, report(index), control)
+            except ConversionError:
+                # Um segmento que falhou interrompe os outros
+                control.cancel()
+                raise
+            if journal is not None:
+                journal.commit(index, target)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(encode, index) for index in pending]
+        errors = [future.exception() for future in futures if future.exception()]
+        failures = [e for e in errors if not isinstance(e, ConversionCancelled)]
+        if failures:
+            raise failures[0]
+        if errors:
+            raise errors[0]
+
+    def verify(self, input_path, output_path, info: MediaInfo):
+        """
+        Checks that the joined output has the duration and frame count of the input.
+
+        Args:
+            input_path (str): The path to the input video file.
+            output_path (str): The converted video.
+            info (MediaInfo): The probed input.
+
+        Raises:
+            ConversionError: If they don't match.
+        """
+        result = probe_media(output_path)
+        tolerance = max(0.1, 2 / info.fps)
+        if result is None or result.duration is None:
+            raise ConversionError("Não foi possível verificar o vídeo convertido")
+        if abs(result.duration - info.duration) > tolerance:
+            raise ConversionError(
+                f"Duração do vídeo convertido ({result.duration:.2f}s) difere "
+                f"da original ({info.duration:.2f}s)"
+            )
+        expected, frames = count_frames(input_path), count_frames(output_path)
+        if expected is not None and frames is not None and abs(frames - expected) > 1:
+            raise ConversionError(
+                f"O vídeo convertido tem {frames} frames, o original tem {expected}"
+            )
@@ -0,0 +1,517 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+# pylint: disable=C0115
+import asyncio
+import json
+import logging
+import os
+import secrets
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from itertools import count
+from multiprocessing import Manager
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from batch import default_workers, run_job, threads_per_job
+from engines import ConversionCancelled, ConversionError
+from filters import FilterChain
+from jobs import (
+    CANCELLED,
+    DONE,
+    FAILED,
+    FINISHED,
+    PENDING,
+    RUNNING,
+    ConversionJob,
+    OutputTarget,
+)
+from probe import probe
+from scheduler import JobScheduler, estimate_cost, niceness_for_weight
+from sizing import SizeTarget
+from utils import CODECS, SERVICE_FILE, SERVICE_HOST, SERVICE_PORT
+
+MAX_BODY = 1024 * 1024
+
+logger = logging.getLogger("video_manager.service")
+
+
+class HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class JobService:
+    """
+    Long-running conversion service shared by every client of the machine.
+
+    The service owns a single pool of worker processes, so the jobs submitted
+    by all the GUI instances and scripts share one scheduler (see
+    scheduler.JobScheduler) and never run more than `workers` encoders at a
+    time, plus one slot kept for interactive jobs. It is controlled through a
+    small HTTP/JSON API, bound to the loopback interface by default:
+
+    - ``GET /jobs`` lists the jobs and ``GET /jobs/<id>`` returns one of them;
+    - ``POST /jobs`` submits a job, with a JSON body holding ``input_path``,
+      ``output_path``, ``format`` and, optionally, ``profile``, ``filters``
+      (see filters.FilterChain), ``resume``, ``priority``, ``weight`` (CPU
+      weight, 1.0 is normal), ``owner`` (for the fair-share policy),
+      ``targets`` (extra outputs encoded from the same decode, see
+      jobs.OutputTarget) and ``target`` (maximum size and/or quality of the
+      output, see sizing.SizeTarget);
+    - ``POST /jobs/<id>/cancel``, ``/pause`` and ``/resume`` control a job;
+    - ``GET /events`` streams the job updates as JSON lines, starting with the
+      current state of the jobs. With ``?job=<id>`` (repeatable) only those
+      jobs are reported, and the stream ends once all of them are finished.
+
+    Each event line holds ``event`` ("status" or "progress") and ``job``, as
+    returned by `batch.ConversionJob.to_dict`.
+
+    Every request must carry the secret token of the running service, which
+    is written with the address to SERVICE_FILE, readable only by its owner,
+    as ``Authorization: Bearer <token>``. POST requests must be sent as
+    ``application/json`` and requests with an ``Origin`` header (sent by web
+    browsers) are refused, so web pages can't reach the API either.
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        engine: str | None = None,
+        use_cache: bool = False,
+        metrics_file=None,
+        profile_dir=None,
+        policy: str = "sjf",
+        max_high_res: int = 1,
+    ) -> None:
+        """
+        Initializes the service. Nothing runs until `serve` is awaited.
+
+        Args:
+            workers (int | None): Size of the worker pool. Defaults to
+            `batch.default_workers()`.
+            engine (str | None): The conversion engine name (see engines.ENGINES).
+            use_cache (bool): Whether to reuse and fill the output cache.
+            metrics_file (str | Path | None): JSON lines file that receives the
+            per-stage metrics of each job (see metrics.py).
+            profile_dir (str | Path | None): Directory for a cProfile dump of
+            each job.
+            policy (str): Scheduling policy (see scheduler.POLICIES).
+            max_high_res (int): High resolution jobs that may run at a time.
+        """
+        self.workers = workers or default_workers()
+        self.scheduler = JobScheduler(self.workers, policy, max_high_res, reserved=1)
+        self.engine = engine
+        self.use_cache = use_cache
+        self.metrics_file = metrics_file
+        self.profile_dir = profile_dir
+        self.address: tuple[str, int] | None = None
+        self.jobs: dict[int, ConversionJob] = {}
+        self._ids = count(1)
+        self._resume: dict[int, bool] = {}
+        self._pause_events = {}
+        self._running: dict[int, asyncio.Future] = {}
+        self._subscribers: set[asyncio.Queue] = set()
+        self._manager = None
+        self._pool = None
+        self._progress_queue = None
+        self._stopped = None
+        self._token = secrets.token_urlsafe(32)
+
+    async def serve(self, host: str = SERVICE_HOST, port: int = SERVICE_PORT):
+        """
+        Runs the service until `stop` is called. Running jobs are cancelled on
+        the way out.
+
+        Args:
+            host (str): Interface to listen on.
+            port (int): TCP port. 0 picks a free one (see `address`).
+
+        Raises:
+            OSError: If the address is already in use.
+        """
+        loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        with Manager() as manager, ProcessPoolExecutor(self.scheduler.capacity) as pool:
+            self._manager, self._pool = manager, pool
+            self._progress_queue = manager.Queue()
+            drain = threading.Thread(target=self._drain, args=(loop,), daemon=True)
+            drain.start()
+            server = await asyncio.start_server(self._handle, host, port)
+            self.address = server.sockets[0].getsockname()[:2]
+            _write_service_file(self.address, self._token)
+            logger.info("Serviço ouvindo em http://%s:%s", *self.address)
+            try:
+                async with server:
+                    await self._stopped.wait()
+            finally:
+                for job in self.jobs.values():
+                    if job.status == RUNNING:
+                        job.cancel_event.set()
+                await asyncio.gather(*self._running.values(), return_exceptions=True)
+                self._progress_queue.put(None)
+                drain.join()
+                _remove_service_file()
+
+    def stop(self):
+        if self._stopped is not None:
+            self._stopped.set()
+
+    async def submit(self, data: dict) -> ConversionJob:
+        """
+        Adds a job to the queue. The input is probed first, so the scheduler
+        knows its duration and frame size.
+
+        Args:
+            data (dict): The request body (see the class docstring).
+
+        Raises:
+            HTTPError: If the request is invalid, or another unfinished job
+            already writes to the same output.
+
+        Returns:
+            ConversionJob: The queued job.
+        """
+        try:
+            input_path = str(data["input_path"])
+            output_path = str(data["output_path"])
+            selected_format = str(data["format"])
+            filters = data.get("filters")
+            filters = FilterChain.from_dict(filters) if filters else None
+            priority = int(data.get("priority") or 0)
+            weight = float(data.get("weight") or 1.0)
+            targets = [OutputTarget.from_dict(item) for item in data.get("targets") or ()]
+            target = data.get("target")
+            target = SizeTarget.from_dict(target) if target else None
+        except (KeyError, TypeError, ValueError, ConversionError) as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"pedido inválido: {e}") from e
+        for name in [selected_format] + [target.selected_format for target in targets]:
+            if name not in (codec_name for codec_name, codec in CODECS):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, f"formato desconhecido: {name}")
+        if not Path(input_path).is_file():
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"arquivo não encontrado: {input_path}")
+        job = ConversionJob(
+            input_path,
+            output_path,
+            selected_format,
+            data.get("profile"),
+            filters,
+            priority=priority,
+            weight=weight,
+            targets=targets,
+            target=target,
+        )
+        if data.get("owner"):
+            job.owner = str(data["owner"])
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, estimate_cost, job)
+        # O recorte só pode ser conferido com o tamanho do quadro; a análise
+        # acima já deixou a entrada no cache
+        info = await loop.run_in_executor(None, probe, input_path)
+        if info is not None and info.width and info.height:
+            try:
+                for chain in [filters] + [target.filters for target in targets]:
+                    if chain is not None:
+                        chain.validate(info.width, info.height)
+            except ConversionError as e:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, f"pedido inválido: {e}") from e
+
+        # Verificado depois da análise, que cede o event loop a outros pedidos
+        outputs = {Path(path).resolve() for path in job.output_paths}
+        for other in self.jobs.values():
+            if other.status not in FINISHED and outputs.intersection(
+                Path(path).resolve() for path in other.output_paths
+            ):
+                raise HTTPError(
+                    HTTPStatus.CONFLICT, f"saída já usada pelo job {other.job_id}"
+                )
+        job.job_id = next(self._ids)
+        self.jobs[job.job_id] = job
+        self._resume[job.job_id] = bool(data.get("resume"))
+        self._publish("status", job)
+        self._dispatch()
+        return job
+
+    def cancel(self, job: ConversionJob):
+        """
+        Cancels a job. A pending job is dropped; a running one has its encoder
+        killed.
+        """
+        if job.status == PENDING:
+            self._update(job, CANCELLED)
+            self._dispatch()
+        elif job.status == RUNNING:
+            job.cancel_event.set()
+
+    def pause(self, job: ConversionJob):
+        """
+        Pauses a job. A running job has its encoder suspended; a pending one is
+        held back, so it doesn't take a worker until it is resumed.
+        """
+        if job.status in FINISHED or job.paused:
+            return
+        job.paused = True
+        if job.status == RUNNING:
+            self._pause_events[job.job_id].set()
+        self._publish("status", job)
+
+    def resume(self, job: ConversionJob):
+        if not job.paused:
+            return
+        job.paused = False
+        if job.status == RUNNING:
+            self._pause_events[job.job_id].clear()
+        self._publish("status", job)
+        self._dispatch()
+
+    def _dispatch(self):
+        # Entrega ao pool os jobs escolhidos pelo scheduler enquanto houver vaga
+        loop = asyncio.get_running_loop()
+        threads = threads_per_job(self.workers)
+        while True:
+            pending = [job for job in self.jobs.values() if job.status == PENDING]
+            running = [self.jobs[job_id] for job_id in self._running]
+            job = self.scheduler.pick(pending, running)
+            if job is None:
+                return
+            self.scheduler.started(job)
+            job.cancel_event = self._manager.Event()
+            pause_event = self._pause_events[job.job_id] = self._manager.Event()
+            future = loop.run_in_executor(
+                self._pool,
+                run_job,
+                job.selected_format,
+                job.input_path,
+                job.output_path,
+                job.profile,
+                self.engine,
+                threads,
+                self.use_cache,
+                self._resume[job.job_id],
+                self.metrics_file,
+                self.profile_dir,
+                job.filters,
+                job.cancel_event,
+                pause_event,
+                self._progress_queue,
+                job.job_id,
+                niceness_for_weight(job.weight),
+                job.targets,
+                job.target,
+            )
+            self._running[job.job_id] = future
+            future.add_done_callback(lambda future, job=job: self._finish(job, future))
+            self._update(job, RUNNING)
+
+    def _finish(self, job: ConversionJob, future: asyncio.Future):
+        del self._running[job.job_id]
+        self._pause_events.pop(job.job_id, None)
+        job.cancel_event = None
+        job.paused = False
+        error = future.exception()
+        if error is None:
+            self._update(job, DONE)
+        elif isinstance(error, ConversionCancelled):
+            self._update(job, CANCELLED)
+        else:
+            self._update(job, FAILED, str(error))
+        logger.info("Job %s: %s", job.job_id, job.status)
+        if not self._stopped.is_set():
+            self._dispatch()
+
+    def _update(self, job: ConversionJob, status: str, error: str | None = None):
+        job.status = status
+        job.error = error
+        self._publish("status", job)
+
+    def _drain(self, loop: asyncio.AbstractEventLoop):
+        # Thread que recebe o progresso dos workers e o repassa ao event loop
+        while (item := self._progress_queue.get()) is not None:
+            loop.call_soon_threadsafe(self._progress, *item)
+
+    def _progress(self, job_id: int, progress):
+        job = self.jobs.get(job_id)
+        if job is not None and job.status == RUNNING:
+            job.progress = progress
+            self._publish("progress", job)
+
+    def _publish(self, event: str, job: ConversionJob):
+        line = _event_line(event, job)
+        for subscriber in self._subscribers:
+            subscriber.put_nowait((job.job_id, line))
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            try:
+                method, url, headers, body = await _read_request(reader)
+                self._authorize(method, headers)
+                await self._route(method, url, body, writer)
+            except HTTPError as e:
+                _respond(writer, e.status, {"error": str(e)})
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _authorize(self, method: str, headers: dict):
+        # Navegadores mandam Origin em requisições entre sites; clientes locais, não
+        if "origin" in headers:
+            raise HTTPError(HTTPStatus.FORBIDDEN, "requisições de navegador não são aceitas")
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not secrets.compare_digest(
+            token.strip().encode(), self._token.encode()
+        ):
+            raise HTTPError(HTTPStatus.UNAUTHORIZED, "token ausente ou inválido")
+        content_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+        if method == "POST" and content_type != "application/json":
+            raise HTTPError(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, "use application/json")
+
+    async def _route(self, method: str, url, body: bytes, writer: asyncio.StreamWriter):
+        parts = [part for part in url.path.split("/") if part]
+        if parts == ["events"]:
+            _allow(method, "GET")
+            await self._stream(parse_qs(url.query).get("job", []), writer)
+        elif parts == ["jobs"] and method == "POST":
+            job = await self.submit(_parse_json(body))
+            _respond(writer, HTTPStatus.CREATED, job.to_dict())
+        elif parts == ["jobs"]:
+            _allow(method, "GET")
+            _respond(writer, HTTPStatus.OK, {"jobs": [job.to_dict() for job in self.jobs.values()]})
+        elif len(parts) == 2 and parts[0] == "jobs":
+            _allow(method, "GET")
+            _respond(writer, HTTPStatus.OK, self._job(parts[1]).to_dict())
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] in ("cancel", "pause", "resume"):
+            _allow(method, "POST")
+            job = self._job(parts[1])
+            getattr(self, parts[2])(job)
+            _respond(writer, HTTPStatus.OK, job.to_dict())
+        else:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"caminho desconhecido: {url.path}")
+
+    async def _stream(self, ids: list[str], writer: asyncio.StreamWriter):
+        watched = [self._job(job_id) for job_id in ids]
+        subscriber = asyncio.Queue()
+        self._subscribers.add(subscriber)
+        try:
+            writer.write(_headers(HTTPStatus.OK, "application/x-ndjson"))
+            for job in watched or list(self.jobs.values()):
+                writer.write(_event_line("status", job))
+            await writer.drain()
+            keys = {job.job_id for job in watched}
+            while not (watched and all(job.status in FINISHED for job in watched)):
+                job_id, line = await subscriber.get()
+                if not keys or job_id in keys:
+                    writer.write(line)
+                    await writer.drain()
+        finally:
+            self._subscribers.discard(subscriber)
+
+    def _job(self, job_id: str) -> ConversionJob:
+        try:
+            return self.jobs[int(job_id)]
+        except (KeyError, ValueError) as e:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"job desconhecido: {job_id}") from e
+
+
+def run_service(host: str = SERVICE_HOST, port: int = SERVICE_PORT, **options):
+    """
+    Runs a `JobService` until the process is interrupted or terminated.
+
+    Args:
+        host (str): Interface to listen on.
+        port (int): TCP port.
+        **options: Passed to `JobService`.
+    """
+    service = JobService(**options)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, service.stop)
+            except (NotImplementedError, RuntimeError):
+                # Windows: o Ctrl+C chega como KeyboardInterrupt
+                pass
+        await service.serve(host, port)
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+async def _read_request(reader: asyncio.StreamReader):
+    request_line = (await reader.readline()).decode("latin-1").split()
+    if len(request_line) != 3:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "requisição inválida")
+    method, target, _ = request_line
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError as e:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Content-Length inválido") from e
+    if length < 0:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Content-Length inválido")
+    if length > MAX_BODY:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "corpo grande demais")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), urlsplit(target), headers, body
+
+
+def _parse_json(body: bytes) -> dict:
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError as e:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"JSON inválido: {e}") from e
+    if not isinstance(data, dict):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "o corpo deve ser um objeto JSON")
+    return data
+
+
+def _allow(method: str, allowed: str):
+    if method != allowed:
+        raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"use {allowed}")
+
+
+def _headers(status: HTTPStatus, content_type: str, length: int | None = None) -> bytes:
+    lines = [f"HTTP/1.1 {status.value} {status.phrase}", f"Content-Type: {content_type}"]
+    if length is not None:
+        lines.append(f"Content-Length: {length}")
+    lines.append("Connection: close")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def _respond(writer: asyncio.StreamWriter, status: HTTPStatus, data: dict):
+    body = json.dumps(data).encode()
+    writer.write(_headers(status, "application/json", len(body)) + body)
+
+
+def _event_line(event: str, job: ConversionJob) -> bytes:
+    return json.dumps({"event": event, "job": job.to_dict()}).encode() + b"\n"
+
+
+def _write_service_file(address: tuple[str, int], token: str):
+    SERVICE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    data = {"host": address[0], "port": address[1], "pid": os.getpid(), "token": token}
+    # O token é a credencial da API: o arquivo já nasce legível só pelo dono
+    temp = SERVICE_FILE.with_suffix(".tmp")
+    temp.unlink(missing_ok=True)
+    descriptor = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+        file.write(json.dumps(data))
+    temp.replace(SERVICE_FILE)
+
+
+def _remove_service_file():
+    try:
+        if json.loads(SERVICE_FILE.read_text(encoding="utf-8")).get("pid") == os.getpid():
+            SERVICE_FILE.unlink()
+    except (OSError, ValueError):
+        pass
@@ -0,0 +1,403 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+# pylint: disable=C0115
+import logging
+import re
+import tempfile
+from dataclasses import asdict, dataclass, fields, replace
+from pathlib import Path
+
+from profiles import TWO_PASS_CODECS, EncoderProfile
+from utils import MUXERS, get_encoders
+
+logger = logging.getLogger("video_manager.sizing")
+
+# Espaço ocupado por cada contêiner: uma fração do arquivo (cabeçalhos de
+# pacote) mais bytes por segundo (índices e cabeçalhos por quadro, que pesam
+# mais quanto menor o bitrate). Medido com o ffmpeg a 25 fps, arredondado para cima
+CONTAINER_OVERHEAD = {
+    "mp4": (0.005, 1000),
+    "mov": (0.005, 1000),
+    "3gp": (0.005, 1000),
+    "webm": (0.005, 1000),
+    "avi": (0.005, 2500),
+    "asf": (0.025, 1500),
+    "flv": (0.005, 1500),
+    "mpeg": (0.015, 500),
+    "vob": (0.02, 500),
+}
+DEFAULT_OVERHEAD = (0.02, 2500)
+# Sem a primeira passada o encoder só acerta o bitrate médio aproximadamente;
+# com ela erra pouco, mas ainda erra
+SINGLE_PASS_MARGIN = 0.05
+TWO_PASS_MARGIN = 0.02
+# Teto do bitrate instantâneo e buffer do controle de taxa, em múltiplos do
+# bitrate médio: limitam os picos que estouram o tamanho
+MAXRATE_FACTOR = 1.5
+BUFSIZE_FACTOR = 2
+# Recodificações de uma saída que passou do tamanho, e a folga extra de cada uma
+SIZE_RETRIES = 2
+RETRY_MARGIN = 0.05
+# Abaixo disso o vídeo fica irreconhecível; melhor avisar do que entregar
+MIN_VIDEO_BITRATE = 64_000
+SAMPLE_COUNT = 3
+# Amostras curtas demais superestimam o tamanho: cada uma começa num keyframe
+SAMPLE_SECONDS = 4.0
+
+_SIZE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([kmg]?)(i?)b?\s*$", re.IGNORECASE)
+_UNITS = {"": 1, "k": 1, "m": 2, "g": 3}
+
+
+@dataclass
+class SizeTarget:
+    """
+    What the user wants from an output, instead of encoder settings: a maximum
+    file size, a quality level, or both (the quality, capped by the size).
+
+    `plan_profile` turns it into the encoder profile of each input, since the
+    bitrate that fits a size depends on the duration of the video.
+    """
+
+    size: int | None = None
+    quality: int | None = None
+    two_pass: bool = False
+    predict: bool = False
+
+    @property
+    def active(self) -> bool:
+        return self.size is not None or self.quality is not None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SizeTarget":
+        known = {item.name for item in fields(cls)}
+        return cls(**{k: v for k, v in data.items() if k in known})
+
+
+def parse_size(value: str) -> int:
+    """
+    Parses a file size such as ``25M``, ``25MB``, ``1.5G`` or ``700KiB``.
+    Decimal units are powers of 1000 and ``i`` units powers of 1024.
+
+    Args:
+        value (str): The size.
+
+    Raises:
+        ValueError: If the size is invalid.
+
+    Returns:
+        int: The size in bytes.
+    """
+    match = _SIZE.match(value)
+    if match is None:
+        raise ValueError(f"tamanho inválido: {value}")
+    number, unit, binary = match.groups()
+    base = 1024 if binary else 1000
+    return int(float(number) * base ** _UNITS[unit.lower()])
+
+
+def parse_bitrate(value: str | None) -> int:
+    """
+    Parses an ffmpeg bitrate such as ``128k`` or ``2M``.
+
+    Returns:
+        int: The bitrate in bits per second (0 for None).
+    """
+    if not value:
+        return 0
+    return parse_size(value)
+
+
+def container_overhead(selected_format) -> tuple[float, int]:
+    """
+    Returns the overhead of the container of a format: the fraction of the
+    file and the bytes per second it takes (see CONTAINER_OVERHEAD).
+    """
+    return CONTAINER_OVERHEAD.get(MUXERS.get(selected_format), DEFAULT_OVERHEAD)
+
+
+def video_bitrate_for_size(
+    size: int,
+    duration: float,
+    audio_bitrate: int = 0,
+    margin: float = 0.0,
+    overhead: tuple[float, int] = DEFAULT_OVERHEAD,
+) -> int:
+    """
+    Returns the average video bitrate that makes an output of `duration`
+    seconds fit in `size` bytes, after the audio and the container overhead.
+
+    Args:
+        size (int): The maximum output size, in bytes.
+        duration (float): The duration of the video, in seconds.
+        audio_bitrate (int): The audio bitrate, in bits per second.
+        margin (float): Extra fraction of the size left free, for encoders
+        that miss the average bitrate.
+        overhead (tuple[float, int]): The container overhead (see
+        `container_overhead`).
+
+    Raises:
+        ValueError: If the size is too small for a watchable video.
+
+    Returns:
+        int: The video bitrate, in bits per second.
+    """
+    fraction, per_second = overhead
+    total = (size / (1 + fraction + margin) - per_second * duration) * 8 / duration
+    video = int(total - audio_bitrate)
+    if video < MIN_VIDEO_BITRATE:
+        raise ValueError(
+            f"{size / 1e6:.1f} MB é pouco para {duration:.0f} s de vídeo "
+            f"({video // 1000} kbit/s de vídeo)"
+        )
+    return video
+
+
+def sample_starts(duration: float, count: int, seconds: float) -> list[float]:
+    """
+    Returns where the `count` samples of `seconds` begin, each one centered in
+    its share of the video.
+    """
+    step = duration / count
+    return [max(0.0, (index + 0.5) * step - seconds / 2) for index in range(count)]
+
+
+def two_pass(selected_format, target: SizeTarget) -> bool:
+    """
+    Returns whether an output is encoded in two passes: when asked for and
+    supported by the codec of the format (see FFmpegEngine.convert_two_pass).
+    """
+    return target.two_pass and get_encoders(selected_format)[0] in TWO_PASS_CODECS
+
+
+def bitrate_profile(profile: EncoderProfile, bitrate: int, passes: int) -> EncoderProfile:
+    """
+    Returns `profile` encoding at an average video `bitrate` (bits per second),
+    with the peaks capped by MAXRATE_FACTOR and BUFSIZE_FACTOR.
+    """
+    kbps = bitrate // 1000
+    return replace(
+        profile,
+        bitrate=f"{kbps}k",
+        maxrate=f"{int(kbps * MAXRATE_FACTOR)}k",
+        bufsize=f"{kbps * BUFSIZE_FACTOR}k",
+        passes=passes,
+    )
+
+
+def predict_size(
+    input_path,
+    info,
+    selected_format,
+    profile: EncoderProfile,
+    filters=None,
+    samples: int = SAMPLE_COUNT,
+    seconds: float = SAMPLE_SECONDS,
+) -> int | None:
+    """
+    Predicts the size of an output encoded with the quality settings of
+    `profile`, by encoding a few short segments spread over the video and
+    extrapolating their size to the whole duration.
+
+    The segments are seeked inputs of a single ffmpeg process (one output per
+    segment), so only about ``samples * seconds`` seconds of the input are
+    decoded and encoded. Each sample also holds its audio and container, so
+    the prediction covers the whole file, a little on the high side (every
+    sample starts with a keyframe).
+
+    Args:
+        input_path (str): The path to the input video file.
+        info (MediaInfo): The probed metadata of the input.
+        selected_format (str): The format of the output.
+        profile (EncoderProfile): The encoder profile.
+        filters (FilterChain | None): The video filters of the output.
+        samples (int): Number of segments.
+        seconds (float): Duration of each segment.
+
+    Raises:
+        ConversionError: If ffmpeg fails.
+
+    Returns:
+        int | None: The predicted size in bytes, or None for videos too short
+        to sample (encoding them whole costs about the same).
+    """
+    # Importados aqui, como em scheduler.estimate_cost: quem só precisa de
+    # SizeTarget (os jobs, a interface gráfica) não carrega o ffmpeg
+    from engines import FFmpegEngine, size_alignment  # pylint: disable=C0415
+    from probe import ffmpeg_binary  # pylint: disable=C0415
+
+    duration = info.duration if info is not None else None
+    if not duration or duration < samples * seconds * 2:
+        return None
+    starts = sample_starts(duration, samples, seconds)
+    encoder = FFmpegEngine(profile=profile)
+    filtered = filters is not None and filters.active
+    with tempfile.TemporaryDirectory(prefix="sizing-") as directory:
+        command = [ffmpeg_binary(), "-y", "-v", "error"]
+        for start in starts:
+            command += ["-ss", f"{start:.3f}", "-t", f"{seconds:g}", "-i", str(input_path)]
+        graph = []
+        if filtered:
+            align = size_alignment(selected_format)
+            for index in range(len(starts)):
+                watermark_input = 0
+                if filters.watermark:
+                    watermark_input = command.count("-i")
+                    command += ["-i", filters.watermark]
+                graph.append(
+                    filters.ffmpeg_graph(watermark_input, f"{index}:V:0", f"v{index}", align)
+                )
+            command += ["-filter_complex", ";".join(graph)]
+        outputs = []
+        for index in range(len(starts)):
+            output = Path(directory) / f"{index}.sample"
+            outputs.append(output)
+            command += ["-map", f"[v{index}]" if filtered else f"{index}:V:0"]
+            command += ["-map", f"{index}:a?"]
+            command += encoder.video_args(selected_format, graph=filtered)
+            command += encoder.audio_args(selected_format)
+            command += encoder.muxer_args(selected_format, str(output))
+        encoder.run_command(command)
+        sampled = sum(output.stat().st_size for output in outputs)
+    return int(sampled / (len(starts) * seconds) * duration)
+
+
+def plan_profile(
+    input_path, selected_format, profile, target: SizeTarget | None, filters=None
+) -> EncoderProfile:
+    """
+    Returns the encoder profile that meets a size or quality target.
+
+    A quality target replaces the CRF of the profile (read by the x264/x265
+    and libvpx codecs) and always re-encodes, even inputs that could be
+    remuxed. A size target is met with the average video bitrate computed
+    from the probed duration and the container overhead, less a margin for
+    the error of the encoder, with capped peaks (see `bitrate_profile`) and
+    two passes when asked and supported (see `two_pass`), unless the input
+    already fits and is remuxed as is, or the quality settings are predicted
+    (see `predict_size`) to fit, which keeps their quality in a single pass.
+    The prediction runs when asked for, and always with a quality target.
+
+    Args:
+        input_path (str): The path to the input video file.
+        selected_format (str): The desired format for the output video.
+        profile (EncoderProfile | str | None): The base encoder profile.
+        target (SizeTarget | None): The target. None (or an empty target)
+        returns the profile unchanged.
+        filters (FilterChain | None): The video filters of the output.
+
+    Raises:
+        ConversionError: If the profile is unknown, the duration of the input
+        can't be probed or the size is too small for it.
+
+    Returns:
+        EncoderProfile: The profile to encode the output with.
+    """
+    from engines import ConversionError  # pylint: disable=C0415
+    from probe import can_stream_copy, probe  # pylint: disable=C0415
+    from profiles import get_profile  # pylint: disable=C0415
+
+    try:
+        profile = get_profile(profile)
+    except KeyError as e:
+        raise ConversionError(f"Perfil desconhecido: {profile}") from e
+    if target is None or not target.active:
+        return profile
+    if target.quality is not None:
+        profile = replace(profile, crf=target.quality, bitrate=None, stream_copy=False)
+    if target.size is None:
+        return profile
+
+    info = probe(input_path)
+    if info is None or not info.duration:
+        raise ConversionError(f"Não foi possível obter a duração de {input_path}")
+    filtered = filters is not None and filters.active
+    copyable = not filtered and can_stream_copy(info.streams, selected_format)
+    # Sem bitrate o vídeo compatível é só copiado para o contêiner, do mesmo tamanho
+    fraction, per_second = overhead = container_overhead(selected_format)
+    room = target.size / (1 + fraction) - per_second * info.duration
+    fits = Path(input_path).stat().st_size <= room
+    if copyable and fits and profile.stream_copy:
+        logger.info("%s: já cabe em %d bytes, sem recodificar", input_path, target.size)
+        return profile
+    if target.predict or target.quality is not None:
+        predicted = predict_size(input_path, info, selected_format, profile, filters)
+        if predicted is not None and predicted <= target.size:
+            logger.info(
+                "%s: a qualidade do perfil deve gerar %d bytes, dentro de %d",
+                input_path,
+                predicted,
+                target.size,
+            )
+            # A previsão vale para o vídeo recodificado, não para o original
+            return replace(profile, stream_copy=False)
+
+    audio = parse_bitrate(profile.audio_bitrate) if info.audio_codec else 0
+    passes = 2 if two_pass(selected_format, target) else 1
+    if target.two_pass and passes == 1:
+        logger.info("%s: %s não tem duas passadas, usando uma", input_path, selected_format)
+    margin = TWO_PASS_MARGIN if passes == 2 else SINGLE_PASS_MARGIN
+    try:
+        bitrate = video_bitrate_for_size(target.size, info.duration, audio, margin, overhead)
+    except ValueError as e:
+        raise ConversionError(f"Tamanho alvo impossível: {e}") from e
+    logger.info(
+        "%s: %d kbit/s de vídeo para caber em %d bytes", input_path, bitrate // 1000, target.size
+    )
+    return bitrate_profile(profile, bitrate, passes)
+
+
+def refit_profile(
+    input_path, selected_format, profile, target: SizeTarget, size: int
+) -> EncoderProfile:
+    """
+    Returns the profile to encode again an output of `size` bytes that
+    exceeded the size target: the video bitrate (the one of the profile, or
+    the one measured from the output when it was encoded by quality or
+    remuxed) less the excess, less RETRY_MARGIN.
+
+    Args:
+        input_path (str): The path to the input video file.
+        selected_format (str): The format of the output.
+        profile (EncoderProfile | str | None): The profile of the output.
+        target (SizeTarget): The target the output missed.
+        size (int): The size of the output, in bytes.
+
+    Raises:
+        ConversionError: If the duration of the input can't be probed or the
+        bitrate gets too low.
+
+    Returns:
+        EncoderProfile: The profile to encode the output with.
+    """
+    from engines import ConversionError  # pylint: disable=C0415
+    from probe import probe  # pylint: disable=C0415
+    from profiles import get_profile  # pylint: disable=C0415
+
+    profile = get_profile(profile)
+    info = probe(input_path)
+    if info is None or not info.duration:
+        raise ConversionError(f"Não foi possível obter a duração de {input_path}")
+    audio = parse_bitrate(profile.audio_bitrate) if info.audio_codec else 0
+    if profile.bitrate is not None:
+        video = parse_bitrate(profile.bitrate)
+    else:
+        video = size * 8 / info.duration - audio
+    # O excesso vem do encoder de vídeo: áudio e contêiner não mudam
+    bitrate = int((video - (size - target.size) * 8 / info.duration) * (1 - RETRY_MARGIN))
+    if bitrate < MIN_VIDEO_BITRATE:
+        raise ConversionError(
+            f"A saída tem {size} bytes, mais que {target.size}, e menos bitrate "
+            f"ficaria abaixo de {MIN_VIDEO_BITRATE // 1000} kbit/s de vídeo"
+        )
+    logger.info(
+        "%s: %d bytes passam de %d, recodificando a %d kbit/s",
+        input_path,
+        size,
+        target.size,
+        bitrate // 1000,
+    )
+    passes = 2 if two_pass(selected_format, target) else 1
+    return replace(bitrate_profile(profile, bitrate, passes), stream_copy=False)
@@ -0,0 +1,96 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+# pylint: disable=C0115
+import importlib
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger("video_manager.startup")
+
+# Módulos da conversão, carregados em segundo plano depois que a janela
+# aparece. A interface não converte nada (o serviço converte), então o NumPy, o
+# Pillow e as engines nunca entram neste processo
+WARM_UP_MODULES = ("client", "probe")
+
+
+class StartupReport:
+    """
+    Records how long each phase of the application start takes.
+
+    Marks are taken as the start progresses; `finish` logs them, measured from
+    the creation of the process, so the interpreter start and the module
+    imports before the first mark are included.
+    """
+
+    def __init__(self, echo: bool = False) -> None:
+        """
+        Initializes the report.
+
+        Args:
+            echo (bool): Whether to also print the report to stderr.
+        """
+        self.echo = echo
+        self.marks: list[tuple[str, float]] = []
+
+    def mark(self, phase: str):
+        """
+        Records the end of a phase.
+
+        Args:
+            phase (str): The phase name.
+        """
+        self.marks.append((phase, time.time()))
+
+    def finish(self) -> dict[str, float]:
+        """
+        Logs the report on the "video_manager.startup" logger.
+
+        Returns:
+            dict[str, float]: Seconds spent in each phase, plus the total.
+        """
+        # O psutil só é importado aqui, com a janela já na tela
+        import psutil  # pylint: disable=C0415
+
+        previous = started = psutil.Process().create_time()
+        phases = {}
+        for phase, stamp in self.marks:
+            phases[phase] = stamp - previous
+            previous = stamp
+        phases["total"] = previous - started
+        line = " | ".join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in phases.items())
+        logger.info(line)
+        if self.echo:
+            print(f"Inicialização: {line}", file=sys.stderr, flush=True)
+        return phases
+
+
+def warm_up(echo: bool = False, modules=WARM_UP_MODULES) -> threading.Thread:
+    """
+    Imports the modules used by the first conversion in a background thread,
+    so the window appears first and the first conversion doesn't pay for them.
+
+    Args:
+        echo (bool): Whether to also print the time it took to stderr.
+        modules (Iterable[str]): The modules to import.
+
+    Returns:
+        threading.Thread: The (daemon) thread.
+    """
+
+    def run():
+        started = time.perf_counter()
+        for name in modules:
+            try:
+                importlib.import_module(name)
+            except ImportError as e:
+                logger.warning("Falha ao pré-carregar %s: %s", name, e)
+        elapsed = time.perf_counter() - started
+        logger.info("warm_up %.0f ms", elapsed * 1000)
+        if echo:
+            print(f"Pré-carregamento: {elapsed * 1000:.0f} ms", file=sys.stderr, flush=True)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
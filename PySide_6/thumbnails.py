@@ -0,0 +1,282 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+# pylint: disable=C0115
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from engines import ConversionError
+from jobs import collect_inputs
+from probe import ffmpeg_binary, probe
+
+THUMBNAIL_COUNT = 100
+THUMBNAIL_WIDTH = 160
+SPRITE_COLUMNS = 10
+POSTER_WIDTH = 640
+JPEG_QUALITY = 85
+# Instantes buscados por processo do ffmpeg. Cada instante é uma entrada com o
+# seu próprio -ss; agrupá-los divide o custo de iniciar o ffmpeg
+SEEKS_PER_PROCESS = 20
+
+
+@dataclass
+class Thumbnails:
+    """
+    The images generated for a video: a poster frame, a sprite sheet with the
+    sampled frames and a WebVTT index of the sheet, used by web players to
+    show the frame under the cursor while scrubbing.
+    """
+
+    input_path: str
+    poster: str
+    sprite: str
+    index: str
+    times: list[float]
+
+
+def sample_times(duration: float, count: int) -> list[float]:
+    """
+    Returns `count` timestamps evenly spread over the video, each one in the
+    middle of its interval (so neither the first nor the last frame is used).
+    """
+    step = duration / count
+    return [(index + 0.5) * step for index in range(count)]
+
+
+def thumbnail_size(width: int, height: int, target_width: int) -> tuple[int, int]:
+    """
+    Returns the size of a frame scaled to `target_width`, keeping the aspect
+    ratio with an even height.
+    """
+    return target_width, max(2, round(height * target_width / width / 2) * 2)
+
+
+def grab_frames(input_path, times, width: int, height: int) -> np.ndarray:
+    """
+    Decodes one frame near each timestamp, without decoding the video in
+    between.
+
+    Each timestamp is an input seeked before being opened (``-ss`` with
+    ``-noaccurate_seek``), so ffmpeg jumps straight to the keyframe before it,
+    and only keyframes are decoded (``-skip_frame nokey``). The first frame of
+    each input is scaled and the frames are concatenated into a single raw
+    stream. The seeked inputs start at negative timestamps, which `trim` would
+    drop, so their timestamps are reset first.
+
+    Args:
+        input_path (str): The path to the video file.
+        times (Sequence[float]): The timestamps, in seconds.
+        width (int): Width of the returned frames.
+        height (int): Height of the returned frames.
+
+    Raises:
+        ConversionError: If ffmpeg fails.
+
+    Returns:
+        np.ndarray: The RGB frames, shaped (len(times), height, width, 3). A
+        timestamp past the last keyframe repeats the previous frame.
+    """
+    frames = np.zeros((len(times), height, width, 3), np.uint8)
+    frame_size = height * width * 3
+    for start in range(0, len(times), SEEKS_PER_PROCESS):
+        chunk = times[start : start + SEEKS_PER_PROCESS]
+        command = [ffmpeg_binary(), "-v", "error"]
+        for time in chunk:
+            command += ["-skip_frame", "nokey", "-ss", f"{time:.3f}", "-noaccurate_seek"]
+            command += ["-i", str(input_path)]
+        graph = [
+            f"[{index}:V:0]setpts=PTS-STARTPTS,trim=end_frame=1,"
+            f"scale={width}:{height},setsar=1[f{index}]"
+            for index in range(len(chunk))
+        ]
+        inputs = "".join(f"[f{index}]" for index in range(len(chunk)))
+        graph.append(f"{inputs}concat=n={len(chunk)}:v=1:a=0,format=rgb24[out]")
+        command += ["-filter_complex", ";".join(graph), "-map", "[out]"]
+        command += ["-fps_mode", "passthrough", "-frames:v", str(len(chunk))]
+        command += ["-f", "rawvideo", "-"]
+        result = subprocess.run(command, capture_output=True, check=False)
+        received = len(result.stdout) // frame_size
+        if result.returncode != 0 or not received:
+            lines = result.stderr.decode(errors="replace").strip().splitlines()
+            raise ConversionError(lines[-1] if lines else f"Falha ao ler {input_path}")
+        view = frames[start : start + len(chunk)]
+        view[:received] = np.frombuffer(
+            result.stdout, np.uint8, received * frame_size
+        ).reshape(received, height, width, 3)
+        view[received:] = view[received - 1]
+    return frames
+
+
+def tile(frames: np.ndarray, columns: int) -> np.ndarray:
+    """
+    Tiles frames into a sprite sheet, row by row. Missing tiles of the last
+    row are black.
+
+    Args:
+        frames (np.ndarray): The frames, shaped (count, height, width, 3).
+        columns (int): Tiles per row.
+
+    Returns:
+        np.ndarray: The sheet, shaped (rows * height, columns * width, 3).
+    """
+    count, height, width, channels = frames.shape
+    columns = min(columns, count)
+    rows = -(-count // columns)
+    tiles = np.zeros((rows * columns, height, width, channels), np.uint8)
+    tiles[:count] = frames
+    tiles = tiles.reshape(rows, columns, height, width, channels).swapaxes(1, 2)
+    return tiles.reshape(rows * height, columns * width, channels)
+
+
+def pick_poster(frames: np.ndarray) -> int:
+    """
+    Chooses the frame with the most detail (the highest brightness variance of
+    a subsample), which skips black and fade frames.
+
+    Returns:
+        int: The index of the frame.
+    """
+    luma = frames[:, ::4, ::4].mean(axis=3)
+    return int(luma.reshape(len(frames), -1).var(axis=1).argmax())
+
+
+def write_index(path, sprite_name: str, times, duration: float, size, columns: int):
+    """
+    Writes the WebVTT index of a sprite sheet: one cue per tile, covering the
+    interval around its timestamp.
+    """
+    width, height = size
+    step = duration / len(times)
+    lines = ["WEBVTT", ""]
+    for index in range(len(times)):
+        x, y = index % columns * width, index // columns * height
+        lines.append(f"{_vtt_time(index * step)} --> {_vtt_time((index + 1) * step)}")
+        lines.append(f"{sprite_name}#xywh={x},{y},{width},{height}")
+        lines.append("")
+    Path(path).write_text("\n".join(lines), encoding="utf-8")
+
+
+def generate_thumbnails(
+    input_path,
+    output_dir,
+    count: int = THUMBNAIL_COUNT,
+    width: int = THUMBNAIL_WIDTH,
+    columns: int = SPRITE_COLUMNS,
+    poster_width: int = POSTER_WIDTH,
+    name: str | None = None,
+) -> Thumbnails:
+    """
+    Generates the poster, the sprite sheet and its index for a video, saved in
+    `output_dir` as ``<name>.poster.jpg``, ``<name>.sprite.jpg`` and
+    ``<name>.sprite.vtt``.
+
+    Args:
+        input_path (str): The path to the video file.
+        output_dir (str): The directory of the images.
+        count (int): Frames sampled for the sprite sheet.
+        width (int): Width of each tile.
+        columns (int): Tiles per row of the sheet.
+        poster_width (int): Width of the poster.
+        name (str | None): The base name of the files. Defaults to the name of
+        the video without its extension (see `thumbnail_names`).
+
+    Raises:
+        ConversionError: If the video can't be read.
+
+    Returns:
+        Thumbnails: The generated files.
+    """
+    # O Pillow só é necessário aqui, como em frames.FrameFilter
+    from PIL import Image  # pylint: disable=C0415
+
+    info = probe(input_path)
+    if info is None or not info.duration or not info.width or not info.height:
+        raise ConversionError(f"Não foi possível ler o vídeo: {input_path}")
+    times = sample_times(info.duration, count)
+    size = thumbnail_size(info.width, info.height, width)
+    frames = grab_frames(input_path, times, *size)
+
+    output = Path(output_dir) / (name or Path(input_path).stem)
+    sprite = output.with_name(f"{output.name}.sprite.jpg")
+    Image.fromarray(tile(frames, columns)).save(sprite, quality=JPEG_QUALITY)
+    index = output.with_name(f"{output.name}.sprite.vtt")
+    write_index(index, sprite.name, times, info.duration, size, min(columns, count))
+
+    poster_time = times[pick_poster(frames)]
+    poster_size = thumbnail_size(info.width, info.height, min(poster_width, info.width))
+    poster_frame = grab_frames(input_path, [poster_time], *poster_size)[0]
+    poster = output.with_name(f"{output.name}.poster.jpg")
+    Image.fromarray(poster_frame).save(poster, quality=JPEG_QUALITY)
+    return Thumbnails(str(input_path), str(poster), str(sprite), str(index), times)
+
+
+def thumbnail_names(inputs) -> dict[str, str]:
+    """
+    Returns the base name of the thumbnails of each video: its name without
+    the extension, plus a numeric suffix when another video of the list
+    already took it (``clip.avi`` and ``clip.mkv`` become ``clip`` and
+    ``clip_1``), as `jobs.output_path_for` does for outputs.
+
+    Args:
+        inputs (Iterable[str]): The paths to the video files.
+
+    Returns:
+        dict[str, str]: The base name of each video.
+    """
+    names = {}
+    taken = set()
+    for input_path in inputs:
+        stem = Path(input_path).stem
+        name = stem
+        counter = 1
+        while name in taken:
+            name = f"{stem}_{counter}"
+            counter += 1
+        taken.add(name)
+        names[input_path] = name
+    return names
+
+
+def generate_many(paths, output_dir, workers: int | None = None, **options):
+    """
+    Generates the thumbnails of every video found in `paths` (see
+    `jobs.collect_inputs`), several videos at a time.
+
+    The work happens in the ffmpeg processes and in NumPy and Pillow, which
+    release the GIL, so a pool of threads keeps the cores busy. Videos with
+    the same name get distinct files (see `thumbnail_names`).
+
+    Args:
+        paths (Iterable[str]): Files and/or directories.
+        output_dir (str): The directory of the images.
+        workers (int | None): Videos processed at a time. Defaults to the
+        number of cores.
+        **options: Passed to `generate_thumbnails`.
+
+    Yields:
+        tuple[str, Thumbnails | ConversionError]: Each video and its result, in
+        the order they finish.
+    """
+    names = thumbnail_names(collect_inputs(paths))
+    with ThreadPoolExecutor(workers or os.cpu_count() or 1) as pool:
+        futures = {
+            pool.submit(
+                generate_thumbnails, input_path, output_dir, name=name, **options
+            ): input_path
+            for input_path, name in names.items()
+        }
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except ConversionError as e:
+                yield futures[future], e
+
+
+def _vtt_time(seconds: float) -> str:
+    milliseconds = round(seconds * 1000)
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    return f"{hours:02d}:{minutes:02d}:{milliseconds / 1000:06.3f}"
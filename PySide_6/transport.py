@@ -0,0 +1,314 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+# pylint: disable=C0115
+import multiprocessing
+import queue
+import subprocess
+import threading
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+from engines import ConversionCancelled, ConversionError
+from frames import FILTER_BATCH, FRAME_BUFFERS, FrameReader
+
+# Intervalo, em segundos, em que os estágios bloqueados conferem se devem parar
+POLL_INTERVAL = 0.2
+
+
+class FrameRing:
+    """
+    Ring of fixed-shape frame batches in shared memory, passed between
+    processes without copying or pickling the frames.
+
+    The ring holds `slots` batches of `batch` frames in one
+    `multiprocessing.shared_memory` block. Only slot numbers travel between
+    processes, over two queues: a producer takes a free slot (blocking while
+    all of them are in use, which is the backpressure), writes into it and
+    publishes it with the number of frames written; the consumer reads the
+    slot and releases it back to the producer.
+    """
+
+    def __init__(self, shape, slots: int = FRAME_BUFFERS, batch: int = 1, context=None):
+        """
+        Creates the ring. Its owner must `close` it, which also frees the
+        shared memory.
+
+        Args:
+            shape (tuple[int, int, int]): Shape of a frame (height, width, 3).
+            slots (int): Number of batches in the ring (at least 2).
+            batch (int): Frames per batch.
+            context (multiprocessing.context.BaseContext | None): The
+            multiprocessing context of the processes that use the ring.
+        """
+        context = context or multiprocessing.get_context()
+        self.shape = (batch,) + tuple(shape)
+        self.slots = max(2, slots)
+        size = int(np.prod(self.shape)) * self.slots
+        self.memory = shared_memory.SharedMemory(create=True, size=size)
+        self.free = context.Queue()
+        self.filled = context.Queue()
+        for slot in range(self.slots):
+            self.free.put(slot)
+        self._array = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_array"] = None
+        return state
+
+    @property
+    def array(self) -> np.ndarray:
+        if self._array is None:
+            shape = (self.slots,) + self.shape
+            self._array = np.ndarray(shape, np.uint8, buffer=self.memory.buf)
+        return self._array
+
+    def slot(self, index: int) -> np.ndarray:
+        return self.array[index]
+
+    def acquire(self, stop) -> int | None:
+        """
+        Takes a free slot, waiting while every slot is in use.
+
+        Args:
+            stop (multiprocessing.Event): Ends the wait.
+
+        Returns:
+            int | None: The slot, or None if `stop` was set.
+        """
+        while not stop.is_set():
+            try:
+                return self.free.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return None
+
+    def publish(self, index: int, count: int):
+        self.filled.put((index, count))
+
+    def finish(self):
+        """
+        Tells the consumer that no more batches will be published.
+        """
+        self.filled.put(None)
+
+    def receive(self, stop):
+        """
+        Takes the next published batch.
+
+        Args:
+            stop (multiprocessing.Event): Ends the wait.
+
+        Returns:
+            tuple[int, int] | None: The slot and its number of frames, or None
+            at the end of the stream or if `stop` was set.
+        """
+        while not stop.is_set():
+            try:
+                return self.filled.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return None
+
+    def release(self, index: int):
+        self.free.put(index)
+
+    def close(self):
+        self._array = None
+        self.memory.close()
+        self.memory.unlink()
+
+
+class FramePipeline:
+    """
+    Decodes a video and, optionally, filters its frames in separate processes
+    linked by `FrameRing`s, so decoding, the Python filters and the encoder
+    (fed by the caller) run in parallel on different cores.
+
+    The decode process reads ffmpeg's raw output straight into the slots of
+    the first ring; the filter process (only with active filters) writes the
+    filtered batches into a second ring. `batches` yields views of the last
+    ring, which the caller can write to the encoder without copying them.
+    """
+
+    def __init__(self, input_path, info, filters=None, buffers: int | None = None) -> None:
+        """
+        Initializes the pipeline. Nothing runs until it is iterated.
+
+        Args:
+            input_path (str): The path to the input video file.
+            info (MediaInfo): The probed metadata of the input.
+            filters (FilterChain | None): Video filters (see filters.py).
+            buffers (int | None): Frames buffered between two stages. Defaults
+            to frames.FRAME_BUFFERS.
+        """
+        self.input_path = input_path
+        self.info = info
+        self.filters = filters if filters is not None and filters.active else None
+        self.buffers = buffers or FRAME_BUFFERS
+        self.batch = FILTER_BATCH if self.filters is not None else 1
+        self.output_size = (info.width, info.height)
+        self.output_rate = info.rate
+        self.capacity = self.batch
+        if self.filters is not None:
+            self.output_size = self.filters.output_size(info.width, info.height)
+            if self.filters.fps:
+                self.output_rate = f"{self.filters.fps:g}"
+                # Aumentar a taxa de quadros gera mais frames do que entram
+                ratio = self.filters.fps / info.fps
+                self.capacity = int(self.batch * max(ratio, 1.0)) + 1
+
+    def batches(self, control=None):
+        """
+        Runs the stages, yielding the frame batches.
+
+        Args:
+            control (ConversionControl | None): Cancels the pipeline. The
+            stages also wait, through backpressure, while the consumer is
+            paused.
+
+        Raises:
+            ConversionCancelled: If the conversion is cancelled.
+            ConversionError: If a stage fails.
+
+        Yields:
+            numpy.ndarray: (frames, height, width, 3) uint8 views of shared
+            memory, valid until the next batch is requested.
+        """
+        context = multiprocessing.get_context()
+        stop = context.Event()
+        errors = context.Queue()
+        slots = max(2, self.buffers // self.batch)
+        shape = (self.info.height, self.info.width, 3)
+        decoded = FrameRing(shape, slots, self.batch, context)
+        rings = [decoded]
+        reader = FrameReader(self.input_path, self.info.width, self.info.height, self.info.rate)
+        processes = [
+            context.Process(
+                target=_decode_stage,
+                args=(reader.command(), decoded, stop, errors),
+                daemon=True,
+            )
+        ]
+        if self.filters is not None:
+            width, height = self.output_size
+            filtered = FrameRing((height, width, 3), slots, self.capacity, context)
+            rings.append(filtered)
+            processes.append(
+                context.Process(
+                    target=_filter_stage,
+                    args=(self.filters, self.info, self.batch, decoded, filtered, stop, errors),
+                    daemon=True,
+                )
+            )
+        output = rings[-1]
+        try:
+            for process in processes:
+                process.start()
+            previous = None
+            while True:
+                item = _next_batch(output, processes, control)
+                if previous is not None:
+                    output.release(previous)
+                    previous = None
+                if item is None:
+                    break
+                index, count = item
+                yield output.slot(index)[:count]
+                previous = index
+            for process in processes:
+                process.join()
+            if not errors.empty():
+                raise ConversionError(errors.get())
+        finally:
+            stop.set()
+            for process in processes:
+                process.join(timeout=POLL_INTERVAL * 5)
+                if process.is_alive():
+                    process.kill()
+                    process.join()
+            for ring in rings:
+                ring.close()
+
+
+def _next_batch(ring: FrameRing, processes, control):
+    while True:
+        if control is not None and control.cancelled:
+            raise ConversionCancelled("Conversão cancelada")
+        try:
+            return ring.filled.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            pass
+        # Um estágio morto (por um sinal, por exemplo) nunca publicaria o fim
+        if not all(process.is_alive() for process in processes) and ring.filled.empty():
+            raise ConversionError("Um estágio do processamento de frames terminou sem concluir")
+
+
+def _decode_stage(command, ring: FrameRing, stop, errors):
+    try:
+        _decode(command, ring, stop, errors)
+    except Exception as e:  # pylint: disable=W0718
+        errors.put(f"Falha ao decodificar: {e}")
+    finally:
+        ring.finish()
+
+
+def _decode(command, ring: FrameRing, stop, errors):
+    stderr = deque(maxlen=20)
+    with subprocess.Popen(
+        command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        bufsize=0,
+    ) as process:
+        # Lido em paralelo, como no FrameReader: com o pipe de stderr cheio o
+        # ffmpeg pararia de escrever os frames
+        drain = threading.Thread(target=lambda: stderr.extend(process.stderr), daemon=True)
+        drain.start()
+        try:
+            frame_bytes = ring.slot(0)[0].nbytes
+            while (index := ring.acquire(stop)) is not None:
+                view = memoryview(ring.slot(index)).cast("B")
+                offset = 0
+                while offset < len(view) and (read := process.stdout.readinto(view[offset:])):
+                    offset += read
+                count = offset // frame_bytes
+                if count:
+                    ring.publish(index, count)
+                else:
+                    ring.release(index)
+                if offset < len(view):
+                    break
+        finally:
+            if stop.is_set() and process.poll() is None:
+                process.kill()
+            returncode = process.wait()
+            drain.join()
+    if returncode != 0 and not stop.is_set():
+        lines = [line.decode(errors="replace").strip() for line in stderr]
+        lines = [line for line in lines if line]
+        errors.put(lines[-1] if lines else "ffmpeg falhou")
+
+
+def _filter_stage(chain, info, batch, source: FrameRing, target: FrameRing, stop, errors):
+    try:
+        frame_filter = chain.compile(info.width, info.height, info.fps, batch)
+        while (item := source.receive(stop)) is not None:
+            index, count = item
+            output = target.acquire(stop)
+            if output is None:
+                break
+            # O filtro escreve direto no slot de saída
+            frames = frame_filter.apply(source.slot(index)[:count], target.slot(output))
+            source.release(index)
+            if not len(frames):
+                target.release(output)
+                continue
+            target.publish(output, len(frames))
+    except Exception as e:  # pylint: disable=W0718
+        errors.put(f"Falha ao filtrar os frames: {e}")
+        stop.set()
+    finally:
+        target.finish()
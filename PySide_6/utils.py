@@ -1,4 +1,17 @@
+import os
 import re
+from pathlib import Path
+
+# Diretório das configurações e caches do usuário
+CONFIG_DIR = Path(
+    os.environ.get("VIDEO_MANAGER_HOME", Path.home() / ".video_manager")
+)
+
+# Endereço padrão do serviço de conversão; o serviço em execução grava o
+# endereço real em SERVICE_FILE
+SERVICE_FILE = CONFIG_DIR / "service.json"
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
 
 NUM_OR_DOT_REGEX = re.compile(r"^[0-9.]$")
 CODECS = (
@@ -16,6 +29,110 @@ CODECS = (
     ("3GPP", "h263p"),
 )
 
+# Extensões reconhecidas como vídeo ao varrer diretórios
+VIDEO_EXTENSIONS = (
+    ".webm",
+    ".mp4",
+    ".avi",
+    ".mkv",
+    ".mov",
+    ".mpeg1",
+    ".mpeg2",
+    ".mpeg4",
+    ".mpg",
+    ".wmv",
+    ".mpegps",
+    ".flv",
+    ".3gpp",
+)
+
+# Muxer do ffmpeg usado para cada formato de saída
+MUXERS = {
+    "MP4": "mp4",
+    "WEBM": "webm",
+    "MOV": "mov",
+    "MPEG-1": "mpeg",
+    "MPEG-2": "vob",
+    "MPG": "mpeg",
+    "MPEGPS": "mpeg",
+    "MPEG4": "mp4",
+    "AVI": "avi",
+    "WMV": "asf",
+    "FLV": "flv",
+    "3GPP": "3gp",
+}
+
+# Encoders do ffmpeg (vídeo, áudio) usados para cada formato de saída; os
+# nomes de CODECS nem sempre são encoders (o "mov" é só o container) e sem o
+# áudio explícito o 3GP cai no AMR, que não aceita o bitrate dos perfis
+ENCODERS = {
+    "MP4": ("libx264", "aac"),
+    "WEBM": ("libvpx", "libopus"),
+    "MOV": ("libx264", "aac"),
+    "MPEG-1": ("mpeg1video", "mp2"),
+    "MPEG-2": ("mpeg2video", "mp2"),
+    "MPG": ("mpeg2video", "mp2"),
+    "MPEGPS": ("mpeg2video", "mp2"),
+    "MPEG4": ("mpeg4", "aac"),
+    "AVI": ("msmpeg4", "libmp3lame"),
+    "WMV": ("wmv2", "wmav2"),
+    "FLV": ("flv", "libmp3lame"),
+    "3GPP": ("libx264", "aac"),
+}
+
+# Codecs (nomes do ffprobe) de vídeo e áudio que cada formato aceita sem
+# recodificação, ou seja, que podem ser copiados direto para o container
+STREAM_COPY_CODECS = {
+    "MP4": (("h264", "hevc", "mpeg4", "av1"), ("aac", "mp3", "ac3", "alac", "opus")),
+    "WEBM": (("vp8", "vp9", "av1"), ("vorbis", "opus")),
+    "MOV": (
+        ("h264", "hevc", "mpeg4", "prores", "mjpeg"),
+        ("aac", "mp3", "alac", "pcm_s16le"),
+    ),
+    "MPEG-1": (("mpeg1video",), ("mp2", "mp3")),
+    "MPEG-2": (("mpeg2video", "mpeg1video"), ("mp2", "mp3", "ac3")),
+    "MPG": (("mpeg2video", "mpeg1video"), ("mp2", "mp3", "ac3")),
+    "MPEGPS": (("mpeg2video", "mpeg1video"), ("mp2", "mp3", "ac3")),
+    "MPEG4": (("mpeg4", "h264"), ("aac", "mp3")),
+    "AVI": (
+        ("msmpeg4v3", "mpeg4", "h264", "mjpeg"),
+        ("mp3", "ac3", "pcm_s16le"),
+    ),
+    "WMV": (("wmv1", "wmv2"), ("wmav1", "wmav2")),
+    "FLV": (("flv1", "h264"), ("mp3", "aac")),
+    "3GPP": (("h263", "h264", "mpeg4"), ("aac", "amr_nb")),
+}
+
+
+def get_codec(selected_format: str) -> str | None:
+    """
+    Returns the codec for a given format.
+
+    Args:
+        selected_format (str): The format name (first item of a CODECS entry).
+
+    Returns:
+        str | None: The corresponding codec, or None for an unknown format.
+    """
+    for extension, codec in CODECS:
+        if selected_format == extension:
+            return codec
+    return None
+
+
+def get_encoders(selected_format: str) -> tuple[str, str] | None:
+    """
+    Returns the ffmpeg video and audio encoders for a given format.
+
+    Args:
+        selected_format (str): The format name (first item of a CODECS entry).
+
+    Returns:
+        tuple[str, str] | None: The video and audio encoders, or None for an
+        unknown format.
+    """
+    return ENCODERS.get(selected_format)
+
 
 def is_num_or_dot(string: str) -> bool:
     """
@@ -3,13 +3,21 @@
 import sys
 
 from main_window import MainWindow
+from PySide6.QtCore import QTimer
 from PySide6.QtWidgets import QApplication
+from startup import StartupReport, warm_up
 from views import ButtonLayout, _setup_theme
 
 if __name__ == "__main__":
+    # Com --startup-report o tempo de cada etapa da abertura é exibido
+    report = StartupReport(echo="--startup-report" in sys.argv)
+    report.mark("imports")
+
     # Iniciando aplicação
     app = QApplication(sys.argv)
+    report.mark("qapplication")
     _setup_theme()
+    report.mark("theme")
     window = MainWindow()
 
     # Adicionando labels
@@ -18,6 +26,15 @@ if __name__ == "__main__":
 
     # Ajustando o tamanho da janela
     window.adjust_fixed_size()
+    report.mark("window")
 
     window.show()
+
+    def started():
+        # Primeira volta do event loop: a janela já está na tela
+        report.mark("show")
+        report.finish()
+        warm_up(report.echo)
+
+    QTimer.singleShot(0, started)
     app.exec()
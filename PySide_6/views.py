@@ -2,11 +2,14 @@
 # pylint: disable=W0612
 # pylint: disable=C0116
 # pylint: disable=C0115
+from pathlib import Path
 from typing import TYPE_CHECKING
 
 import qdarktheme
-from conveter import ConverterThread
+from jobs import CANCELLED, FAILED, FINISHED
+from conveter import BatchConverterThread, ConverterThread
 from messages import MsgBox
+from profiles import default_profile_name, load_profiles, set_default_profile
 from PySide6.QtCore import Slot
 from PySide6.QtWidgets import (
     QComboBox,
@@ -123,10 +126,16 @@ class ButtonLayout(QVBoxLayout):
         # self.convert = Converter(window)
         self.msg = MsgBox(window)
         self.convert_thread: ConverterThread | None = None
+        self.batch_thread = BatchConverterThread()
+        self.batch_thread.job_updated.connect(self.handle_batch_job_updated)
+        self.batch_thread.finished.connect(self.handle_batch_finished)
+        self.batch_thread.jobs_submitted.connect(self.handle_batch_submitted)
+        self.batch_thread.submit_failed.connect(self.handle_batch_submit_failed)
         self.status_bar = InfoStatusBar(window)
 
         self._make_layout()
         self.selected_format = self.combo.currentText()
+        self.selected_profile = self.profile_combo.currentText()
 
     def _make_layout(self):
         """
@@ -139,6 +148,13 @@ class ButtonLayout(QVBoxLayout):
         self.combo = QComboBox(self.window)
         items = [i for i, codec in CODECS]
         self.combo.addItems(items)
+        self.combo.currentTextChanged.connect(self._select_format)
+
+        # Perfis do encoder, lembrando o último escolhido
+        self.profile_combo = QComboBox(self.window)
+        self.profile_combo.addItems(list(load_profiles()))
+        self.profile_combo.setCurrentText(default_profile_name())
+        self.profile_combo.currentTextChanged.connect(self._select_profile)
 
         # Campo de entrada de texto
         self.input_file_field = QLineEdit(self.window)
@@ -146,6 +162,8 @@ class ButtonLayout(QVBoxLayout):
 
         # Botão
         self.button = Button("Converter", self.window)
+        self.cancel_button = Button("Cancelar", self.window)
+        self.pause_button = Button("Pausar", self.window)
         self.select_input_folder_button = Button("Selecione seu vídeo", self.window)
         self.select_output_folder_button = Button(
             "Selecione onde quer salvar seu vídeo", self.window
@@ -153,11 +171,15 @@ class ButtonLayout(QVBoxLayout):
 
         # Criando Slots
         slot_convert = self._make_slot(self._start_convert)
+        slot_cancel = self._make_slot(self._cancel_convert)
+        slot_pause = self._make_slot(self._toggle_pause)
         slot_select_input_folder = self._make_slot(self._select_input_folder)
         slot_select_output_folder = self._make_slot(self._select_output_folder)
 
         # Conectando os eventos
         self._connect_button_clicked(self.button, slot_convert)
+        self._connect_button_clicked(self.cancel_button, slot_cancel)
+        self._connect_button_clicked(self.pause_button, slot_pause)
         self._connect_button_clicked(
             self.select_input_folder_button, slot_select_input_folder
         )
@@ -167,6 +189,7 @@ class ButtonLayout(QVBoxLayout):
 
         # Label
         self.label_format = QLabel("Selecione o formato de saída:")
+        self.label_profile = QLabel("Selecione o perfil de conversão:")
         self.label_video_dir = QLabel("Selecione o diretório:")
         self.label_output_file = QLabel("Selecione o diretório:")
 
@@ -176,10 +199,33 @@ class ButtonLayout(QVBoxLayout):
         self.addWidget(self.input_file_field)
         self.addWidget(self.label_format)
         self.addWidget(self.combo)
+        self.addWidget(self.label_profile)
+        self.addWidget(self.profile_combo)
         self.addWidget(self.label_output_file)
         self.addWidget(self.select_output_folder_button)
         self.addWidget(self.output_file_field)
         self.addWidget(self.button)
+        self.addWidget(self.pause_button)
+        self.addWidget(self.cancel_button)
+
+    @Slot(str)
+    def _select_format(self, selected_format):
+        self.selected_format = selected_format
+
+    @Slot(str)
+    def _select_profile(self, profile):
+        """
+        Uses the chosen encoder profile in the next conversions and saves it as the
+        default one.
+
+        Parameters:
+            profile (str): The profile name.
+
+        Returns:
+            None
+        """
+        self.selected_profile = profile
+        set_default_profile(profile)
 
     def _connect_button_clicked(self, button: Button, slot):
         """
@@ -231,6 +277,12 @@ class ButtonLayout(QVBoxLayout):
         Finally, a status message is displayed on the status bar indicating that the conversion is
         in progress.
 
+        When several inputs are selected (separated by ";"), or the input or output is a directory,
+        the videos are queued in the batch thread instead. Both threads submit their jobs to the
+        shared job service (see service.py), which converts them in a single pool of worker
+        processes for the whole machine. Inputs submitted while a batch is running join the same
+        batch.
+
         Parameters:
         - None
 
@@ -244,25 +296,136 @@ class ButtonLayout(QVBoxLayout):
         if not output_path:
             return
 
+        input_paths = [path for path in input_path.split(";") if path]
+        if (
+            len(input_paths) > 1
+            or Path(input_paths[0]).is_dir()
+            or Path(output_path).is_dir()
+        ):
+            self._start_batch(input_paths, output_path)
+            return
+
         if self.convert_thread is not None and self.convert_thread.isRunning():
             self.msg.show_error("Conversão em andamento")
             return
         self.convert_thread = ConverterThread(
-            self.window, self.selected_format, input_path, output_path
+            self.selected_format, input_path, output_path, self.selected_profile
         )
         self.convert_thread.finished.connect(self.handle_conversion_finished)
         self.convert_thread.error.connect(self.handle_conversion_error)
+        self.convert_thread.progress.connect(self.handle_conversion_progress)
+        self.convert_thread.cancelled.connect(self.handle_conversion_cancelled)
         self.convert_thread.start()
         self.window.status_bar.showMessage("Conversão em andamento...")
 
+    def _running_threads(self):
+        threads = [self.batch_thread] if self.batch_thread.isRunning() else []
+        if self.convert_thread is not None and self.convert_thread.isRunning():
+            threads.append(self.convert_thread)
+        return threads
+
+    @Slot()
+    def _cancel_convert(self):
+        """
+        Cancels the running conversion and every job of the batch.
+
+        The encoders are killed and their partial outputs removed; the threads
+        report the cancellation through their signals.
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        """
+        for thread in self._running_threads():
+            thread.cancel()
+        self.window.status_bar.showMessage("Cancelando...")
+
+    @Slot()
+    def _toggle_pause(self):
+        """
+        Pauses the running conversions (suspending their encoders) or resumes them.
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        """
+        threads = self._running_threads()
+        if not threads:
+            return
+        if self.pause_button.text() == "Pausar":
+            for thread in threads:
+                thread.pause()
+            self.pause_button.setText("Continuar")
+            self.window.status_bar.showMessage("Conversão pausada")
+            return
+        for thread in threads:
+            thread.resume()
+        self.pause_button.setText("Pausar")
+        self.window.status_bar.showMessage("Conversão em andamento...")
+
+    def _start_batch(self, input_paths, output_path):
+        """
+        Queues the inputs in the batch thread, which submits them in the
+        background (see `handle_batch_submitted`).
+
+        Parameters:
+            input_paths (list[str]): Files and/or directories to convert.
+            output_path (str): The output file or directory.
+
+        Returns:
+            None
+        """
+        if len(input_paths) > 1 and not Path(output_path).is_dir():
+            self.msg.show_error("Selecione um diretório de saída para vários vídeos")
+            return
+        self.batch_thread.submit(
+            input_paths, output_path, self.selected_format, self.selected_profile
+        )
+        self.window.status_bar.showMessage("Enviando os vídeos para conversão...")
+
+    def handle_batch_submitted(self, jobs):
+        """
+        Starts following the jobs just queued by the batch thread.
+
+        :param jobs: The queued jobs. Empty if no video was found.
+        :type jobs: list[ConversionJob]
+        """
+        if not jobs:
+            self.msg.show_error("Nenhum vídeo encontrado")
+            return
+        if not self.batch_thread.isRunning():
+            self.batch_thread.start()
+        self._show_batch_status()
+
+    def handle_batch_submit_failed(self, error):
+        """
+        Reports that the batch couldn't be sent to the job service.
+
+        :param error: The error message.
+        :type error: str
+        """
+        self.msg.show_error(f"Não foi possível enviar a conversão: {error}")
+
+    def _show_batch_status(self):
+        jobs = self.batch_thread.jobs
+        finished = sum(job.status in FINISHED for job in jobs)
+        self.window.status_bar.showMessage(
+            f"Conversão em andamento: {finished} de {len(jobs)} vídeos"
+        )
+
     @Slot()
     def _select_input_folder(self):
         """
         Slot function to select an input folder.
 
-        This function opens a file dialog to allow the user to select a video file for conversion.
-        The dialog options are set to read-only and the file filters are set to include various video formats.
-        The selected folder path is then set as the text of the input file field.
+        This function opens a file dialog to allow the user to select one or more video files for
+        conversion. The dialog options are set to read-only and the file filters are set to include
+        various video formats. The selected paths are then set as the text of the input file field,
+        separated by ";".
 
         Parameters:
             None
@@ -277,15 +440,15 @@ class ButtonLayout(QVBoxLayout):
             ;AVI Files (*.avi);;MKV Files (*.mkv);;MOV Files (*.mov);;MPEG-1 Files (*.mpeg1);\
             ;MPEG-2 Files (*.mpeg2);;MPEG-4 Files (*.mpeg4);;MPG Files (*.mpg);;WMV Files (*.wmv);\
             ;MPEGPS Files (*.mpegps);;FLV Files (*.flv);;3GPP Files (*.3gpp);;All Files (*);;"
-        selected_folder, _ = QFileDialog.getOpenFileName(
+        selected_files, _ = QFileDialog.getOpenFileNames(
             self.window,
             "Selecione seu vídeo para conversão",
             filter=filters,
             options=options,
         )
-        if not selected_folder:
+        if not selected_files:
             return
-        self.input_file_field.setText(selected_folder)
+        self.input_file_field.setText(";".join(selected_files))
 
     @Slot()
     def _select_output_folder(self):
@@ -318,6 +481,24 @@ class ButtonLayout(QVBoxLayout):
         self.window.status_bar.showMessage("Conversão concluída")
         self.msg.show_info(f"Conversão concluída.\nSalvo em: {output_path}")
 
+    def handle_conversion_progress(self, progress):
+        """
+        Shows the progress of the running conversion in the status bar.
+
+        :param progress: The progress event emitted by the conversion thread.
+        :type progress: Progress
+        """
+        self.window.status_bar.showMessage(
+            f"Conversão em andamento: {progress.describe()}"
+        )
+
+    def handle_conversion_cancelled(self):
+        """
+        Handles the cancellation of the conversion requested by the user.
+        """
+        self.pause_button.setText("Pausar")
+        self.window.status_bar.showMessage("Conversão cancelada")
+
     def handle_conversion_error(self, error_message):
         """
         Handles a conversion error by displaying an error message in the status bar and showing
@@ -328,3 +509,36 @@ class ButtonLayout(QVBoxLayout):
         """
         self.window.status_bar.showMessage("Conversão cancelada")
         self.msg.show_error(f"Conversão cancelada: {error_message}")
+
+    def handle_batch_job_updated(self, job):
+        """
+        Updates the status bar when a job of the batch changes status.
+
+        :param job: The job that changed.
+        :type job: ConversionJob
+        """
+        self._show_batch_status()
+
+    def handle_batch_finished(self):
+        """
+        Handles the end of the batch thread. Jobs queued after it stopped following
+        the batch restart the thread; otherwise a summary of the batch is shown.
+        """
+        if self.batch_thread.has_pending():
+            self.batch_thread.start()
+            return
+        jobs = self.batch_thread.jobs
+        failed = [job for job in jobs if job.status == FAILED]
+        cancelled = [job for job in jobs if job.status == CANCELLED]
+        self.batch_thread.clear_finished()
+        self.pause_button.setText("Pausar")
+        if len(cancelled) == len(jobs):
+            self.window.status_bar.showMessage("Conversão cancelada")
+            return
+        self.window.status_bar.showMessage("Conversão concluída")
+        if failed:
+            details = "\n".join(f"{job.input_path}: {job.error}" for job in failed)
+            self.msg.show_error(f"{len(failed)} de {len(jobs)} conversões falharam:\n{details}")
+            return
+        converted = len(jobs) - len(cancelled)
+        self.msg.show_info(f"Conversão concluída.\n{converted} vídeos convertidos")
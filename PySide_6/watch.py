@@ -0,0 +1,504 @@
+# pylint: disable=C0103
+# pylint: disable=C0116
+# pylint: disable=C0115
+import ctypes
+import ctypes.util
+import errno
+import json
+import logging
+import os
+import select
+import sqlite3
+import struct
+import sys
+import time
+from contextlib import closing
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+
+from jobs import DONE, FINISHED, output_path_for
+from utils import CODECS, CONFIG_DIR, VIDEO_EXTENSIONS
+
+WATCH_FILE = CONFIG_DIR / "watch.json"
+SEEN_FILE = CONFIG_DIR / "watch_seen.sqlite3"
+
+logger = logging.getLogger("video_manager.watch")
+
+
+@dataclass
+class WatchFolder:
+    """
+    A monitored directory: new videos dropped in it are converted to
+    `selected_format` and saved in `output_dir`.
+    """
+
+    path: str
+    selected_format: str
+    output_dir: str
+    profile: str | None = None
+    recursive: bool = False
+
+    def __post_init__(self):
+        if self.selected_format not in (name for name, codec in CODECS):
+            raise ValueError(f"formato desconhecido: {self.selected_format}")
+        self.path = str(Path(self.path).resolve())
+        self.output_dir = str(Path(self.output_dir).resolve())
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "WatchFolder":
+        known = {item.name for item in fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in known})
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def load_watch_folders(path=WATCH_FILE) -> list[WatchFolder]:
+    """
+    Reads the monitored directories from a JSON file like
+    ``{"folders": [{"path": ..., "selected_format": "MP4", "output_dir": ...}]}``.
+
+    Args:
+        path (str | Path): The JSON file.
+
+    Raises:
+        ValueError: If the file is malformed or names an unknown format.
+
+    Returns:
+        list[WatchFolder]: The directories. Empty when the file doesn't exist.
+    """
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return []
+    try:
+        return [WatchFolder.from_dict(item) for item in data["folders"]]
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"configuração inválida em {path}: {e}") from e
+
+
+def save_watch_folders(folders, path=WATCH_FILE):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    data = {"folders": [folder.to_dict() for folder in folders]}
+    Path(path).write_text(json.dumps(data, indent=2), encoding="utf-8")
+
+
+class SeenFiles:
+    """
+    Persistent record of the inputs already converted, so restarting the
+    watcher (or touching a folder) doesn't convert them again, and of the ones
+    submitted whose job hasn't finished yet (with the job id), which count as
+    seen until their job ends. A file counts as the same input while it keeps
+    its path, size and modification time.
+    """
+
+    def __init__(self, path=SEEN_FILE) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS seen ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+                "output_path TEXT, submitted REAL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS seen_output ON seen (output_path)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS pending ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+                "output_path TEXT, job_id INTEGER)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def contains(self, path: str, stat: os.stat_result) -> bool:
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT 1 FROM seen WHERE path = ? AND size = ? AND mtime_ns = ? "
+                "UNION ALL "
+                "SELECT 1 FROM pending WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (path, stat.st_size, stat.st_mtime_ns) * 2,
+            ).fetchone()
+        return row is not None
+
+    def produced(self, path: str) -> bool:
+        """
+        Whether a file is the output of a submitted input, which happens when
+        a folder saves its conversions inside itself.
+        """
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT 1 FROM seen WHERE output_path = ? "
+                "UNION ALL SELECT 1 FROM pending WHERE output_path = ?",
+                (path, path),
+            ).fetchone()
+        return row is not None
+
+    def add(self, path: str, stat: os.stat_result, output_path: str):
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO seen VALUES (?, ?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, output_path, time.time()),
+            )
+
+    def add_pending(self, path: str, stat: os.stat_result, output_path: str, job_id: int):
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO pending VALUES (?, ?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, output_path, job_id),
+            )
+
+    def pending(self) -> list[tuple[str, str, int]]:
+        """
+        Returns the submitted inputs whose job hasn't finished, as (path,
+        output path, job id).
+        """
+        with closing(self._connect()) as connection:
+            return connection.execute(
+                "SELECT path, output_path, job_id FROM pending"
+            ).fetchall()
+
+    def finish(self, path: str, done: bool):
+        """
+        Ends the wait for the job of a submitted input: a converted input is
+        recorded as seen, any other is forgotten, to be submitted again once
+        it changes (or the watcher restarts).
+        """
+        with closing(self._connect()) as connection, connection:
+            if done:
+                connection.execute(
+                    "INSERT OR REPLACE INTO seen "
+                    "SELECT path, size, mtime_ns, output_path, ? FROM pending WHERE path = ?",
+                    (time.time(), path),
+                )
+            connection.execute("DELETE FROM pending WHERE path = ?", (path,))
+
+
+class Inotify:
+    """
+    Minimal binding of Linux's inotify (through ctypes), reporting the
+    directories whose entries changed.
+    """
+
+    IN_MODIFY = 0x2
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE_SELF = 0x400
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ISDIR = 0x40000000
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self) -> None:
+        """
+        Raises:
+            OSError: If inotify isn't available.
+        """
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify só existe no Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falhou")
+        self._directories: dict[int, str] = {}
+
+    def add(self, directory: str):
+        """
+        Watches a directory (not its subdirectories).
+
+        Raises:
+            OSError: If the watch can't be added, e.g. when the per-user limit
+            (fs.inotify.max_user_watches) is reached.
+        """
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch falhou em {directory}")
+        self._directories[wd] = directory
+
+    def read(self, timeout: float):
+        """
+        Waits up to `timeout` seconds for events.
+
+        Returns:
+            tuple[list[tuple[str, str, int]], bool]: The events, as (directory,
+            name, mask), and whether the kernel queue overflowed (events were
+            lost).
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return [], False
+        events, overflow = [], False
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return [], False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                overflow = True
+            elif mask & self.IN_IGNORED:
+                self._directories.pop(wd, None)
+            elif wd in self._directories:
+                events.append((self._directories[wd], name, mask))
+        return events, overflow
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """
+    Watches directories for new videos and submits them once they are
+    completely written.
+
+    New files are noticed through inotify where available; otherwise (or for
+    directories inotify can't watch, like some network shares) the watcher
+    polls the modification time of each directory and only lists the ones
+    that changed, so thousands of files aren't rescanned on every tick. A new
+    file becomes a candidate, and is submitted once its size and modification
+    time stayed the same for `settle` seconds. Inputs recorded in `SeenFiles`
+    are skipped.
+
+    With `jobs`, a submitted input is only recorded as seen once its job is
+    done: until then it waits in `SeenFiles.pending`, and an input whose job
+    failed, was cancelled or was lost (the service restarted) is forgotten.
+    """
+
+    def __init__(
+        self,
+        folders: list[WatchFolder],
+        submit,
+        settle: float = 5.0,
+        interval: float = 2.0,
+        seen: SeenFiles | None = None,
+        use_inotify: bool = True,
+        jobs=None,
+    ) -> None:
+        """
+        Initializes the watcher. Nothing is scanned until `start` is called.
+
+        Args:
+            folders (list[WatchFolder]): The monitored directories.
+            submit (Callable[[WatchFolder, str, str], int | None]): Called
+            with the folder, the input and the output path of each new video;
+            returns the id of its job (see `jobs`). It may raise to have the
+            file retried on the next tick.
+            settle (float): Seconds a file must stay unchanged to be submitted.
+            interval (float): Seconds between two ticks.
+            seen (SeenFiles | None): The record of submitted inputs.
+            use_inotify (bool): Whether to use inotify when available.
+            jobs (Callable[[], Iterable[ConversionJob]] | None): Returns the
+            jobs of the service, to follow the submitted ones. None records
+            the inputs as seen once `submit` returns.
+        """
+        self.folders = folders
+        self.submit = submit
+        self.settle = settle
+        self.interval = interval
+        self.seen = seen or SeenFiles()
+        self.jobs = jobs
+        self.inotify = None
+        if use_inotify:
+            try:
+                self.inotify = Inotify()
+            except OSError as e:
+                logger.info("inotify indisponível, usando varredura: %s", e)
+        self._owners: dict[str, WatchFolder] = {}
+        self._polled: dict[str, int | None] = {}
+        self._entries: dict[str, set[str]] = {}
+        self._candidates: dict[str, tuple[int, int, float]] = {}
+        self._taken: set[str] = set()
+
+    def start(self):
+        """
+        Scans the directories once, picking up the videos already in them.
+        """
+        # Saídas de jobs de uma execução anterior que ainda não terminaram
+        self._taken.update(output_path for _, output_path, _ in self.seen.pending())
+        for folder in self.folders:
+            Path(folder.output_dir).mkdir(parents=True, exist_ok=True)
+            self._add_directory(folder, folder.path)
+
+    def run(self, stop=None):
+        """
+        Watches until `stop` is set.
+
+        Args:
+            stop (threading.Event | None): Ends the loop. None runs forever.
+        """
+        self.start()
+        try:
+            while stop is None or not stop.is_set():
+                self.tick()
+        finally:
+            if self.inotify is not None:
+                self.inotify.close()
+
+    def tick(self) -> list[str]:
+        """
+        Waits for changes (up to `interval` seconds), then submits the
+        candidates that settled and checks the jobs of the submitted ones.
+
+        Returns:
+            list[str]: The inputs submitted in this tick.
+        """
+        if self.inotify is not None:
+            events, overflow = self.inotify.read(self.interval)
+            if overflow:
+                # Eventos perdidos: confere de novo todos os diretórios
+                for directory in list(self._entries):
+                    self._scan(directory)
+            for directory, name, mask in events:
+                self._on_event(directory, name, mask)
+        else:
+            time.sleep(self.interval)
+        for directory, mtime in list(self._polled.items()):
+            current = _mtime(directory)
+            if current != mtime:
+                self._polled[directory] = current
+                self._scan(directory)
+        self._reconcile()
+        return self._settle()
+
+    def _add_directory(self, folder: WatchFolder, directory: str):
+        if self._is_output(directory) or directory in self._entries:
+            return
+        self._owners[directory] = folder
+        self._entries[directory] = set()
+        watched = False
+        if self.inotify is not None:
+            try:
+                self.inotify.add(directory)
+                watched = True
+            except OSError as e:
+                logger.warning("%s; o diretório será varrido periodicamente", e)
+        if not watched:
+            self._polled[directory] = _mtime(directory)
+        self._scan(directory)
+
+    def _scan(self, directory: str):
+        # Lista só este diretório, repassando as entradas novas
+        folder = self._owners[directory]
+        try:
+            names = set(os.listdir(directory))
+        except OSError:
+            return
+        for name in names - self._entries[directory]:
+            self._consider(folder, os.path.join(directory, name))
+        self._entries[directory] = names
+
+    def _on_event(self, directory: str, name: str, mask: int):
+        folder = self._owners.get(directory)
+        if folder is None or not name:
+            return
+        path = os.path.join(directory, name)
+        self._entries[directory].add(name)
+        if mask & Inotify.IN_ISDIR:
+            if folder.recursive and mask & (Inotify.IN_CREATE | Inotify.IN_MOVED_TO):
+                self._add_directory(folder, path)
+        else:
+            self._consider(folder, path)
+
+    def _consider(self, folder: WatchFolder, path: str):
+        if os.path.basename(path).startswith("."):
+            return
+        if os.path.isdir(path):
+            if folder.recursive:
+                self._add_directory(folder, path)
+            return
+        if not path.lower().endswith(VIDEO_EXTENSIONS) or path in self._candidates:
+            return
+        if path in self._taken:
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        # Descarta já aqui as entradas convertidas antes, para não acompanhar
+        # milhares de arquivos antigos a cada ciclo
+        if self.seen.contains(path, stat):
+            return
+        self._candidates[path] = (stat.st_size, stat.st_mtime_ns, time.monotonic())
+
+    def _settle(self) -> list[str]:
+        submitted = []
+        now = time.monotonic()
+        for path, (size, mtime, since) in list(self._candidates.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self._candidates[path]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime):
+                # Ainda sendo escrito (ou visto agora): recomeça a espera
+                self._candidates[path] = (stat.st_size, stat.st_mtime_ns, now)
+                continue
+            if now - since < self.settle or stat.st_size == 0:
+                continue
+            del self._candidates[path]
+            if self.seen.contains(path, stat) or self.seen.produced(path):
+                continue
+            folder = self._owners[os.path.dirname(path)]
+            output_path = output_path_for(
+                path, folder.output_dir, folder.selected_format, self._taken
+            )
+            try:
+                job_id = self.submit(folder, path, output_path)
+            except Exception as e:  # pylint: disable=W0718
+                logger.warning("Falha ao enviar %s, nova tentativa em breve: %s", path, e)
+                self._candidates[path] = (stat.st_size, stat.st_mtime_ns, now)
+                continue
+            self._taken.add(output_path)
+            if self.jobs is None:
+                self.seen.add(path, stat, output_path)
+            else:
+                self.seen.add_pending(path, stat, output_path, job_id)
+            submitted.append(path)
+        return submitted
+
+    def _reconcile(self):
+        pending = self.seen.pending() if self.jobs is not None else []
+        if not pending:
+            return
+        try:
+            jobs = {job.job_id: job for job in self.jobs()}
+        except Exception as e:  # pylint: disable=W0718
+            logger.warning("Falha ao consultar os jobs, nova tentativa em breve: %s", e)
+            return
+        for path, output_path, job_id in pending:
+            job = jobs.get(job_id)
+            # Depois de reiniciar, o serviço reaproveita os ids
+            if job is None or (job.input_path, job.output_path) != (path, output_path):
+                logger.warning("Job de %s perdido, enviando de novo", path)
+                self.seen.finish(path, False)
+                self._taken.discard(output_path)
+                folder = self._owners.get(os.path.dirname(path))
+                if folder is not None:
+                    self._consider(folder, path)
+            elif job.status in FINISHED:
+                self.seen.finish(path, job.status == DONE)
+                if job.status != DONE:
+                    logger.warning("%s não foi convertido (%s): %s", path, job.status, job.error)
+                    self._taken.discard(output_path)
+
+    def _is_output(self, directory: str) -> bool:
+        # Não vigia as pastas de saída, senão as conversões voltariam à fila
+        path = Path(directory)
+        return any(
+            path == Path(folder.output_dir) or Path(folder.output_dir) in path.parents
+            for folder in self.folders
+            if Path(folder.output_dir) != Path(folder.path)
+        )
+
+
+def _mtime(directory: str) -> int | None:
+    try:
+        return os.stat(directory).st_mtime_ns
+    except OSError:
+        return None
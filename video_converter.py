@@ -1,8 +1,9 @@
 import sys
 import subprocess
-from io import StringIO
+import threading
+from collections import deque
 
-from moviepy.editor import VideoFileClip
+from PySide6.QtCore import QTimer
 from PySide6.QtWidgets import (
     QApplication,
     QFileDialog,
@@ -14,6 +15,61 @@ from PySide6.QtWidgets import (
     QWidget,
 )
 
+# Linhas do log do ffmpeg guardadas (e exibidas) no máximo
+MAX_LOG_LINES = 2000
+# Intervalo, em milissegundos, entre duas atualizações do log na janela
+LOG_UPDATE_MS = 200
+
+
+def ffmpeg_executable():
+    try:
+        import imageio_ffmpeg
+    except ImportError:
+        return "ffmpeg"
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+class LogBuffer:
+    """
+    Bounded ring buffer of log lines, written by a reader thread and drained
+    by the GUI. When the GUI falls behind, the oldest lines are dropped.
+    """
+
+    def __init__(self, max_lines=MAX_LOG_LINES):
+        self.lines = deque(maxlen=max_lines)
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def append(self, line):
+        with self.lock:
+            if len(self.lines) == self.lines.maxlen:
+                self.dropped += 1
+            self.lines.append(line)
+
+    def drain(self):
+        """
+        Takes the lines written since the last call.
+
+        Returns:
+            tuple[list[str], int]: The lines and how many were dropped before
+            them.
+        """
+        with self.lock:
+            lines, dropped = list(self.lines), self.dropped
+            self.lines.clear()
+            self.dropped = 0
+        return lines, dropped
+
+
+def read_log(stream, buffer):
+    # O ffmpeg separa as linhas de progresso com \r; em modo texto elas
+    # também viram linhas
+    for line in stream:
+        line = line.rstrip()
+        if line:
+            buffer.append(line)
+    stream.close()
+
 
 class WebMToMP4Converter:
     def __init__(self):
@@ -43,8 +99,19 @@ class WebMToMP4Converter:
 
         self.text_output = QPlainTextEdit()
         self.text_output.setReadOnly(True)
+        self.text_output.setMaximumBlockCount(MAX_LOG_LINES)
         self.layout.addWidget(self.text_output)
 
+        self.input_file = ""
+        self.output_file = ""
+        self.process = None
+        self.reader = None
+        self.log_buffer = LogBuffer()
+        self.log_timer = QTimer()
+        self.log_timer.setInterval(LOG_UPDATE_MS)
+        self.log_timer.timeout.connect(self.update_log)
+        self.app.aboutToQuit.connect(self.stop_conversion)
+
         self.central_widget.setLayout(self.layout)
         self.window.setCentralWidget(self.central_widget)
 
@@ -75,23 +142,67 @@ class WebMToMP4Converter:
         )
 
     def convert_webm_to_mp4(self):
+        if not self.input_file or not self.output_file:
+            self.label_output.setText("Selecione os arquivos de entrada e de saída.")
+            return
+        command = [
+            ffmpeg_executable(),
+            "-hide_banner",
+            "-y",
+            "-i",
+            self.input_file,
+            "-c:v",
+            "libx264",
+            "-c:a",
+            "aac",
+            self.output_file,
+        ]
         try:
-            sys.stdout = StringIO()  # Redireciona a saída padrão para um buffer
-            video_clip = VideoFileClip(self.input_file)
-            video_clip.write_videofile(self.output_file, codec="libx264")
-            sys.stdout = sys.__stdout__  # Restaura a saída padrão
-            command = ["ffmpeg", "-i", self.input_file, self.output_file]
-            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-
-            for line in process.stdout:
-                self.text_output.append(line)
-            process.wait()
-            sys.stdout = sys.__stdout__  # Restaura a saída padrão
-
-            self.label_output.setText(f"Conversão concluída: {self.output_file}")
-        except Exception as e:
+            self.process = subprocess.Popen(
+                command,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                text=True,
+                errors="replace",
+            )
+        except OSError as e:
             self.label_output.setText(f"Ocorreu um erro durante a conversão: {str(e)}")
-
+            return
+        # O log é lido em outra thread; a janela só o exibe a cada LOG_UPDATE_MS
+        self.text_output.clear()
+        self.reader = threading.Thread(
+            target=read_log, args=(self.process.stderr, self.log_buffer), daemon=True
+        )
+        self.reader.start()
+        self.convert_button.setEnabled(False)
+        self.label_output.setText("Convertendo...")
+        self.log_timer.start()
+
+    def update_log(self):
+        # Confere o fim antes de esvaziar o buffer, para não perder as últimas linhas
+        finished = self.process.poll() is not None and not self.reader.is_alive()
+        lines, dropped = self.log_buffer.drain()
+        if dropped:
+            lines.insert(0, f"... {dropped} linhas omitidas")
+        if lines:
+            self.text_output.appendPlainText("\n".join(lines))
+        if not finished:
+            return
+        self.log_timer.stop()
+        if self.process.returncode == 0:
+            self.label_output.setText(f"Conversão concluída: {self.output_file}")
+        else:
+            self.label_output.setText(
+                f"Ocorreu um erro durante a conversão (código {self.process.returncode})"
+            )
+        self.process = None
+        self.convert_button.setEnabled(True)
+
+    def stop_conversion(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait()
 
 if __name__ == "__main__":
     converter = WebMToMP4Converter()